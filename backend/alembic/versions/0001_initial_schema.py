@@ -0,0 +1,455 @@
+"""initial schema
+
+The tables the old startup create_all made, and nothing newer: databases
+created that way are stamped instead (`alembic stamp 0001`) and get every
+later table from the following revisions.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# JSONB on Postgres (same as the models), plain JSON elsewhere
+JSONB_TYPE = sa.JSON().with_variant(postgresql.JSONB(), "postgresql")
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('organizations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=150), nullable=False),
+    sa.Column('org_number', sa.String(length=50), nullable=True),
+    sa.Column('email', sa.String(length=255), nullable=True),
+    sa.Column('phone', sa.String(length=50), nullable=True),
+    sa.Column('address', sa.String(length=255), nullable=True),
+    sa.Column('city', sa.String(length=120), nullable=True),
+    sa.Column('country', sa.String(length=120), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('org_number')
+    )
+    op.create_index(op.f('ix_organizations_id'), 'organizations', ['id'], unique=False)
+    op.create_index(op.f('ix_organizations_name'), 'organizations', ['name'], unique=True)
+
+    op.create_table('roles',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('is_admin', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('groups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('organization_id', 'name', name='uq_groups_org_name')
+    )
+    op.create_index(op.f('ix_groups_id'), 'groups', ['id'], unique=False)
+    op.create_index(op.f('ix_groups_name'), 'groups', ['name'], unique=False)
+    op.create_index(op.f('ix_groups_organization_id'), 'groups', ['organization_id'], unique=False)
+
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('hashed_password', sa.String(length=255), nullable=False),
+    sa.Column('name', sa.String(length=150), nullable=False),
+    sa.Column('tel', sa.String(length=50), nullable=True),
+    sa.Column('address', sa.String(length=255), nullable=True),
+    sa.Column('city', sa.String(length=120), nullable=True),
+    sa.Column('country', sa.String(length=120), nullable=True),
+    sa.Column('role_id', sa.Integer(), nullable=False),
+    sa.Column('organization_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+    sa.ForeignKeyConstraint(['role_id'], ['roles.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    op.create_index(op.f('ix_users_organization_id'), 'users', ['organization_id'], unique=False)
+    op.create_index(op.f('ix_users_role_id'), 'users', ['role_id'], unique=False)
+
+    op.create_table('group_members',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('group_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('group_id', 'user_id', name='uq_group_members_group_user')
+    )
+    op.create_index(op.f('ix_group_members_group_id'), 'group_members', ['group_id'], unique=False)
+    op.create_index(op.f('ix_group_members_user_id'), 'group_members', ['user_id'], unique=False)
+
+    op.create_table('projects',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=150), nullable=False),
+    sa.Column('description', sa.String(length=255), nullable=True),
+    sa.Column('organization_id', sa.Integer(), nullable=True),
+    sa.Column('owner_user_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+    sa.ForeignKeyConstraint(['owner_user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_projects_id'), 'projects', ['id'], unique=False)
+    op.create_index(op.f('ix_projects_name'), 'projects', ['name'], unique=False)
+    op.create_index(op.f('ix_projects_organization_id'), 'projects', ['organization_id'], unique=False)
+    op.create_index(op.f('ix_projects_owner_user_id'), 'projects', ['owner_user_id'], unique=False)
+
+    op.create_table('tokens',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('token', sa.String(length=255), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id'),
+    sa.UniqueConstraint('token')
+    )
+    op.create_index(op.f('ix_tokens_user_id'), 'tokens', ['user_id'], unique=False)
+
+    op.create_table('project_group_members',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('group_id', sa.Integer(), nullable=False),
+    sa.Column('access_level', sa.String(length=20), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('project_id', 'group_id', name='uq_project_group_members_project_group')
+    )
+    op.create_index(op.f('ix_project_group_members_group_id'), 'project_group_members', ['group_id'], unique=False)
+    op.create_index(op.f('ix_project_group_members_project_id'), 'project_group_members', ['project_id'], unique=False)
+
+    op.create_table('project_members',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('access_level', sa.String(length=20), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('project_id', 'user_id', name='uq_project_members_project_user')
+    )
+    op.create_index(op.f('ix_project_members_project_id'), 'project_members', ['project_id'], unique=False)
+    op.create_index(op.f('ix_project_members_user_id'), 'project_members', ['user_id'], unique=False)
+
+    op.create_table('requirements',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('created_by_user_id', sa.Integer(), nullable=True),
+    sa.Column('title', sa.String(length=255), nullable=False),
+    sa.Column('description', sa.Text(), nullable=False),
+    sa.Column('acceptance_criteria', sa.Text(), nullable=True),
+    sa.Column('source', sa.String(length=50), nullable=False),
+    sa.Column('external_id', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['created_by_user_id'], ['users.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_requirements_created_by_user_id'), 'requirements', ['created_by_user_id'], unique=False)
+    op.create_index(op.f('ix_requirements_external_id'), 'requirements', ['external_id'], unique=False)
+    op.create_index(op.f('ix_requirements_id'), 'requirements', ['id'], unique=False)
+    op.create_index(op.f('ix_requirements_project_id'), 'requirements', ['project_id'], unique=False)
+
+    op.create_table('test_runs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=True),
+    sa.Column('triggered_by', sa.String(length=20), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_test_runs_id'), 'test_runs', ['id'], unique=False)
+    op.create_index(op.f('ix_test_runs_project_id'), 'test_runs', ['project_id'], unique=False)
+
+    op.create_table('classify_requirements',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('requirement_id', sa.Integer(), nullable=False),
+    sa.Column('category', sa.String(length=100), nullable=False),
+    sa.Column('risk_level', sa.String(length=20), nullable=False),
+    sa.Column('confidence', sa.Float(), nullable=True),
+    sa.Column('summary', sa.Text(), nullable=True),
+    sa.Column('reasoning', sa.Text(), nullable=True),
+    sa.Column('recommendations', sa.Text(), nullable=True),
+    sa.Column('raw_json', JSONB_TYPE, nullable=True),
+    sa.Column('model_name', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.CheckConstraint("risk_level IN ('low','medium','high','critical')", name='ck_classify_requirements_risk_level'),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['requirement_id'], ['requirements.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_classify_req_project_created', 'classify_requirements', ['project_id', 'created_at'], unique=False)
+    op.create_index('ix_classify_req_requirement_created', 'classify_requirements', ['requirement_id', 'created_at'], unique=False)
+    op.create_index(op.f('ix_classify_requirements_created_at'), 'classify_requirements', ['created_at'], unique=False)
+    op.create_index(op.f('ix_classify_requirements_project_id'), 'classify_requirements', ['project_id'], unique=False)
+    op.create_index(op.f('ix_classify_requirements_requirement_id'), 'classify_requirements', ['requirement_id'], unique=False)
+
+    op.create_table('requirement_analyses',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('requirement_id', sa.Integer(), nullable=False),
+    sa.Column('created_by_user_id', sa.Integer(), nullable=True),
+    sa.Column('summary', sa.Text(), nullable=True),
+    sa.Column('category', sa.String(length=100), nullable=True),
+    sa.Column('risk_level', sa.String(length=50), nullable=True),
+    sa.Column('recommendations', sa.Text(), nullable=True),
+    sa.Column('raw_json', JSONB_TYPE, nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['created_by_user_id'], ['users.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['requirement_id'], ['requirements.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_requirement_analyses_created_by_user_id'), 'requirement_analyses', ['created_by_user_id'], unique=False)
+    op.create_index(op.f('ix_requirement_analyses_id'), 'requirement_analyses', ['id'], unique=False)
+    op.create_index(op.f('ix_requirement_analyses_requirement_id'), 'requirement_analyses', ['requirement_id'], unique=False)
+
+    op.create_table('test_cases',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('requirement_id', sa.Integer(), nullable=True),
+    sa.Column('title', sa.String(length=255), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('preconditions', sa.Text(), nullable=True),
+    sa.Column('steps', sa.Text(), nullable=True),
+    sa.Column('expected_result', sa.Text(), nullable=True),
+    sa.Column('priority', sa.String(length=20), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['requirement_id'], ['requirements.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('project_id', 'title', name='uq_test_cases_project_title')
+    )
+    op.create_index(op.f('ix_test_cases_id'), 'test_cases', ['id'], unique=False)
+    op.create_index(op.f('ix_test_cases_project_id'), 'test_cases', ['project_id'], unique=False)
+    op.create_index(op.f('ix_test_cases_requirement_id'), 'test_cases', ['requirement_id'], unique=False)
+    op.create_index(op.f('ix_test_cases_title'), 'test_cases', ['title'], unique=False)
+
+    op.create_table('test_executions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('test_run_id', sa.Integer(), nullable=False),
+    sa.Column('test_case_id', sa.Integer(), nullable=False),
+    sa.Column('executed_by_user_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('result', sa.String(length=20), server_default='pending', nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('environment_json', JSONB_TYPE, nullable=True),
+    sa.Column('build_number', sa.String(length=50), nullable=True),
+    sa.Column('git_sha', sa.String(length=64), nullable=True),
+    sa.Column('branch', sa.String(length=100), nullable=True),
+    sa.Column('ci_run_id', sa.String(length=100), nullable=True),
+    sa.Column('job_url', sa.Text(), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('artifacts', JSONB_TYPE, nullable=True),
+    sa.Column('attempt', sa.Integer(), server_default='1', nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['executed_by_user_id'], ['users.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['test_case_id'], ['test_cases.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['test_run_id'], ['test_runs.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('test_run_id', 'test_case_id', 'attempt', name='uq_exec_run_case_attempt')
+    )
+    op.create_index('ix_exec_project_created', 'test_executions', ['project_id', 'created_at'], unique=False)
+    op.create_index('ix_exec_run_case', 'test_executions', ['test_run_id', 'test_case_id'], unique=False)
+    op.create_index(op.f('ix_test_executions_ci_run_id'), 'test_executions', ['ci_run_id'], unique=False)
+    op.create_index(op.f('ix_test_executions_executed_by_user_id'), 'test_executions', ['executed_by_user_id'], unique=False)
+    op.create_index(op.f('ix_test_executions_id'), 'test_executions', ['id'], unique=False)
+    op.create_index(op.f('ix_test_executions_project_id'), 'test_executions', ['project_id'], unique=False)
+    op.create_index(op.f('ix_test_executions_test_case_id'), 'test_executions', ['test_case_id'], unique=False)
+    op.create_index(op.f('ix_test_executions_test_run_id'), 'test_executions', ['test_run_id'], unique=False)
+
+    op.create_table('bug_reports',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('requirement_id', sa.Integer(), nullable=True),
+    sa.Column('test_case_id', sa.Integer(), nullable=True),
+    sa.Column('test_execution_id', sa.Integer(), nullable=True),
+    sa.Column('reported_by_user_id', sa.Integer(), nullable=True),
+    sa.Column('title', sa.String(length=255), nullable=False),
+    sa.Column('description', sa.Text(), nullable=False),
+    sa.Column('steps_to_reproduce', sa.Text(), nullable=True),
+    sa.Column('expected_result', sa.Text(), nullable=True),
+    sa.Column('actual_result', sa.Text(), nullable=True),
+    sa.Column('severity', sa.String(length=20), nullable=False),
+    sa.Column('priority', sa.String(length=20), nullable=False),
+    sa.Column('status', sa.String(length=30), nullable=False),
+    sa.Column('environment', sa.String(length=100), nullable=True),
+    sa.Column('ai_report_json', JSONB_TYPE, nullable=True),
+    sa.Column('ai_report_raw', sa.Text(), nullable=True),
+    sa.Column('ai_reported_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['reported_by_user_id'], ['users.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['requirement_id'], ['requirements.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['test_case_id'], ['test_cases.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['test_execution_id'], ['test_executions.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_bug_reports_id'), 'bug_reports', ['id'], unique=False)
+    op.create_index(op.f('ix_bug_reports_project_id'), 'bug_reports', ['project_id'], unique=False)
+    op.create_index(op.f('ix_bug_reports_reported_by_user_id'), 'bug_reports', ['reported_by_user_id'], unique=False)
+    op.create_index(op.f('ix_bug_reports_requirement_id'), 'bug_reports', ['requirement_id'], unique=False)
+    op.create_index(op.f('ix_bug_reports_test_case_id'), 'bug_reports', ['test_case_id'], unique=False)
+    op.create_index(op.f('ix_bug_reports_test_execution_id'), 'bug_reports', ['test_execution_id'], unique=False)
+
+    op.create_table('bug_retests',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('bug_id', sa.Integer(), nullable=False),
+    sa.Column('test_execution_id', sa.Integer(), nullable=False),
+    sa.Column('result', sa.String(length=20), nullable=False),
+    sa.Column('created_by_user_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['bug_id'], ['bug_reports.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['created_by_user_id'], ['users.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['test_execution_id'], ['test_executions.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_bug_retests_bug_id'), 'bug_retests', ['bug_id'], unique=False)
+    op.create_index(op.f('ix_bug_retests_created_at'), 'bug_retests', ['created_at'], unique=False)
+    op.create_index(op.f('ix_bug_retests_created_by_user_id'), 'bug_retests', ['created_by_user_id'], unique=False)
+    op.create_index(op.f('ix_bug_retests_id'), 'bug_retests', ['id'], unique=False)
+    op.create_index(op.f('ix_bug_retests_test_execution_id'), 'bug_retests', ['test_execution_id'], unique=False)
+
+    op.create_table('bug_status_history',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('bug_id', sa.Integer(), nullable=False),
+    sa.Column('from_status', sa.String(length=30), nullable=True),
+    sa.Column('to_status', sa.String(length=30), nullable=False),
+    sa.Column('changed_by_user_id', sa.Integer(), nullable=True),
+    sa.Column('comment', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['bug_id'], ['bug_reports.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['changed_by_user_id'], ['users.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_bug_status_history_bug_id'), 'bug_status_history', ['bug_id'], unique=False)
+    op.create_index(op.f('ix_bug_status_history_changed_by_user_id'), 'bug_status_history', ['changed_by_user_id'], unique=False)
+    op.create_index(op.f('ix_bug_status_history_created_at'), 'bug_status_history', ['created_at'], unique=False)
+    op.create_index(op.f('ix_bug_status_history_id'), 'bug_status_history', ['id'], unique=False)
+
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_bug_status_history_id'), table_name='bug_status_history')
+    op.drop_index(op.f('ix_bug_status_history_created_at'), table_name='bug_status_history')
+    op.drop_index(op.f('ix_bug_status_history_changed_by_user_id'), table_name='bug_status_history')
+    op.drop_index(op.f('ix_bug_status_history_bug_id'), table_name='bug_status_history')
+
+    op.drop_table('bug_status_history')
+    op.drop_index(op.f('ix_bug_retests_test_execution_id'), table_name='bug_retests')
+    op.drop_index(op.f('ix_bug_retests_id'), table_name='bug_retests')
+    op.drop_index(op.f('ix_bug_retests_created_by_user_id'), table_name='bug_retests')
+    op.drop_index(op.f('ix_bug_retests_created_at'), table_name='bug_retests')
+    op.drop_index(op.f('ix_bug_retests_bug_id'), table_name='bug_retests')
+
+    op.drop_table('bug_retests')
+    op.drop_index(op.f('ix_bug_reports_test_execution_id'), table_name='bug_reports')
+    op.drop_index(op.f('ix_bug_reports_test_case_id'), table_name='bug_reports')
+    op.drop_index(op.f('ix_bug_reports_requirement_id'), table_name='bug_reports')
+    op.drop_index(op.f('ix_bug_reports_reported_by_user_id'), table_name='bug_reports')
+    op.drop_index(op.f('ix_bug_reports_project_id'), table_name='bug_reports')
+    op.drop_index(op.f('ix_bug_reports_id'), table_name='bug_reports')
+
+    op.drop_table('bug_reports')
+    op.drop_index(op.f('ix_test_executions_test_run_id'), table_name='test_executions')
+    op.drop_index(op.f('ix_test_executions_test_case_id'), table_name='test_executions')
+    op.drop_index(op.f('ix_test_executions_project_id'), table_name='test_executions')
+    op.drop_index(op.f('ix_test_executions_id'), table_name='test_executions')
+    op.drop_index(op.f('ix_test_executions_executed_by_user_id'), table_name='test_executions')
+    op.drop_index(op.f('ix_test_executions_ci_run_id'), table_name='test_executions')
+    op.drop_index('ix_exec_run_case', table_name='test_executions')
+    op.drop_index('ix_exec_project_created', table_name='test_executions')
+
+    op.drop_table('test_executions')
+    op.drop_index(op.f('ix_test_cases_title'), table_name='test_cases')
+    op.drop_index(op.f('ix_test_cases_requirement_id'), table_name='test_cases')
+    op.drop_index(op.f('ix_test_cases_project_id'), table_name='test_cases')
+    op.drop_index(op.f('ix_test_cases_id'), table_name='test_cases')
+
+    op.drop_table('test_cases')
+    op.drop_index(op.f('ix_requirement_analyses_requirement_id'), table_name='requirement_analyses')
+    op.drop_index(op.f('ix_requirement_analyses_id'), table_name='requirement_analyses')
+    op.drop_index(op.f('ix_requirement_analyses_created_by_user_id'), table_name='requirement_analyses')
+
+    op.drop_table('requirement_analyses')
+    op.drop_index(op.f('ix_classify_requirements_requirement_id'), table_name='classify_requirements')
+    op.drop_index(op.f('ix_classify_requirements_project_id'), table_name='classify_requirements')
+    op.drop_index(op.f('ix_classify_requirements_created_at'), table_name='classify_requirements')
+    op.drop_index('ix_classify_req_requirement_created', table_name='classify_requirements')
+    op.drop_index('ix_classify_req_project_created', table_name='classify_requirements')
+
+    op.drop_table('classify_requirements')
+    op.drop_index(op.f('ix_test_runs_project_id'), table_name='test_runs')
+    op.drop_index(op.f('ix_test_runs_id'), table_name='test_runs')
+
+    op.drop_table('test_runs')
+    op.drop_index(op.f('ix_requirements_project_id'), table_name='requirements')
+    op.drop_index(op.f('ix_requirements_id'), table_name='requirements')
+    op.drop_index(op.f('ix_requirements_external_id'), table_name='requirements')
+    op.drop_index(op.f('ix_requirements_created_by_user_id'), table_name='requirements')
+
+    op.drop_table('requirements')
+    op.drop_index(op.f('ix_project_members_user_id'), table_name='project_members')
+    op.drop_index(op.f('ix_project_members_project_id'), table_name='project_members')
+
+    op.drop_table('project_members')
+    op.drop_index(op.f('ix_project_group_members_project_id'), table_name='project_group_members')
+    op.drop_index(op.f('ix_project_group_members_group_id'), table_name='project_group_members')
+
+    op.drop_table('project_group_members')
+    op.drop_index(op.f('ix_tokens_user_id'), table_name='tokens')
+
+    op.drop_table('tokens')
+    op.drop_index(op.f('ix_projects_owner_user_id'), table_name='projects')
+    op.drop_index(op.f('ix_projects_organization_id'), table_name='projects')
+    op.drop_index(op.f('ix_projects_name'), table_name='projects')
+    op.drop_index(op.f('ix_projects_id'), table_name='projects')
+
+    op.drop_table('projects')
+    op.drop_index(op.f('ix_group_members_user_id'), table_name='group_members')
+    op.drop_index(op.f('ix_group_members_group_id'), table_name='group_members')
+
+    op.drop_table('group_members')
+    op.drop_index(op.f('ix_users_role_id'), table_name='users')
+    op.drop_index(op.f('ix_users_organization_id'), table_name='users')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+
+    op.drop_table('users')
+    op.drop_index(op.f('ix_groups_organization_id'), table_name='groups')
+    op.drop_index(op.f('ix_groups_name'), table_name='groups')
+    op.drop_index(op.f('ix_groups_id'), table_name='groups')
+
+    op.drop_table('groups')
+    op.drop_table('roles')
+    op.drop_index(op.f('ix_organizations_name'), table_name='organizations')
+    op.drop_index(op.f('ix_organizations_id'), table_name='organizations')
+
+    op.drop_table('organizations')
@@ -0,0 +1,54 @@
+"""test_case_stats
+
+Per-test-case execution statistics (app.test_case_stats_utils), kept up to
+date as executions finish. Projects with executions from before this table
+are backfilled with POST /api/projects/{project_id}/test_stats/rebuild.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 09:02:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# JSONB on Postgres (same as the models), plain JSON elsewhere
+JSONB_TYPE = sa.JSON().with_variant(postgresql.JSONB(), "postgresql")
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('test_case_stats',
+    sa.Column('test_case_id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('run_count', sa.Integer(), nullable=False),
+    sa.Column('fail_count', sa.Integer(), nullable=False),
+    sa.Column('failure_ewma', sa.Float(), nullable=True),
+    sa.Column('last_run_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_result', sa.String(length=20), nullable=True),
+    sa.Column('recent_durations', JSONB_TYPE, nullable=True),
+    sa.Column('median_duration_seconds', sa.Float(), nullable=True),
+    sa.Column('p95_duration_seconds', sa.Float(), nullable=True),
+    sa.Column('duration_ewma_seconds', sa.Float(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['test_case_id'], ['test_cases.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('test_case_id')
+    )
+    op.create_index(op.f('ix_test_case_stats_project_id'), 'test_case_stats', ['project_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_test_case_stats_project_id'), table_name='test_case_stats')
+    op.drop_table('test_case_stats')
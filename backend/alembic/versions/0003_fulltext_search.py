@@ -0,0 +1,49 @@
+"""full-text search columns and indexes
+
+Postgres: generated, weighted search_tsv columns with GIN indexes.
+SQLite: external-content FTS5 tables kept in sync by triggers.
+The statements come from app.fulltext and are idempotent, so databases that
+already got them from the old startup code upgrade cleanly.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 09:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.fulltext import SOURCES, fulltext_ddl
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    for stmt in fulltext_ddl(dialect):
+        op.execute(stmt)
+
+    if dialect == "sqlite":
+        # index rows that existed before the FTS tables
+        for src in SOURCES.values():
+            op.execute(f"INSERT INTO {src.fts_table}({src.fts_table}) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    for src in SOURCES.values():
+        if dialect == "postgresql":
+            op.execute(f"DROP INDEX IF EXISTS ix_{src.table}_search_tsv")
+            op.execute(f"ALTER TABLE {src.table} DROP COLUMN IF EXISTS search_tsv")
+        elif dialect == "sqlite":
+            for suffix in ("ai", "ad", "au"):
+                op.execute(f"DROP TRIGGER IF EXISTS {src.fts_table}_{suffix}")
+            op.execute(f"DROP TABLE IF EXISTS {src.fts_table}")
@@ -1,6 +1,15 @@
 """ASGI package entrypoint for the backend API."""
 
-from .main import app as api
+# Load .env before any submodule reads the environment
+from . import config  # noqa: F401
 
-# Backwards-compatible alias for common Uvicorn targets.
-app = api
+
+def __getattr__(name):
+    # `app.main` (and with it every router) is only imported when the ASGI
+    # app itself is requested, e.g. `uvicorn app:app`. Importing `app.db`,
+    # `app.models` etc. from scripts or Alembic stays cheap.
+    if name in ("app", "api"):
+        from .main import app as api
+
+        return api
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,26 +1,29 @@
+import asyncio
+import copy
 import json
-import os
+import threading
 import time
 from typing import Any, Optional, Tuple
 from fastapi import HTTPException
-from openai import OpenAI
-import openai as _openai_pkg
-from dotenv import load_dotenv, find_dotenv
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models import Requirement, ClassifyRequirement
 from app.classify_requirement_service import normalize
-
-# Load environment variables from a .env file located in this folder or parent folders
-dotenv_path = find_dotenv()
-if dotenv_path:
-  load_dotenv(dotenv_path)
-else:
-  load_dotenv()
-
-MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
+from app.singleflight import SingleFlight, make_key
+from app.ai_throttle import upstream_limiter, upstream_breaker, estimate_tokens
+from app.ai_output import (
+    OUTPUT_SCHEMAS, output_stats, parse_ai_json, repair_json, validate_output, response_format,
+    fragment_paths, get_fragment, set_fragment, prompt_fix_fragment,
+)
+from app.config import get_settings
+from app.metrics import observe_llm_call, track_llm
+from app.ml_routing import local_decision, routing_stats
+from app.distilled import predict_level
+from app.training_data import training_text
+
+MODEL = get_settings().openai_model
 
 RISK_LEVELS = {"low", "medium", "high", "critical"}
 
@@ -40,13 +43,6 @@ Rules:
 - If requirement is unclear, include assumptions and open_questions, but still produce best-effort test cases.
 """
 
-def _try_parse_json(text: str) -> Optional[Any]:
-    text = text.strip()
-    try:
-        return json.loads(text)
-    except Exception:
-        return None
-
 def build_prompt(req: Requirement, include_recommendations: bool) -> str:
   return f"""
 You are a senior QA analyst.
@@ -66,17 +62,109 @@ Requirement description: {req.description}
 Acceptance criteria: {req.acceptance_criteria or ""}
 """.strip()
 
-def call_ai_json(user_prompt: str) -> Tuple[str, Optional[Any]]:
+_clients: dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def get_openai_client(api_key: str) -> Any:
+    """
+    One OpenAI client per API key, created on first use and reused, so calls
+    share its HTTP connection pool. The SDK import itself is deferred too:
+    it is the slowest import in the app and mock/ML-only paths never need it.
+    """
+    client = _clients.get(api_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(api_key)
+            if client is None:
+                from openai import OpenAI
+
+                client = OpenAI(api_key=api_key)
+                _clients[api_key] = client
+    return client
+
+
+def _ask_fragment(api_key: str, prompt: str) -> Optional[Any]:
+    """One short completion for a fragment re-ask; None (never raises) when it cannot be had."""
+    if not upstream_breaker.allow():
+        return None
+    if not upstream_limiter.acquire(estimate_tokens(SYSTEM_BASE, prompt)):
+        upstream_breaker.release_trial()
+        return None
+    fmt = response_format(None, get_settings().ai_response_format)
+    call_started = time.perf_counter()
+    try:
+        raw_resp = get_openai_client(api_key).chat.completions.with_raw_response.create(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_BASE},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=0.0,
+            **({"response_format": fmt} if fmt else {}),
+        )
+        upstream_limiter.update_from_headers(raw_resp.headers)
+        resp = raw_resp.parse()
+    except Exception as e:
+        observe_llm_call("error", time.perf_counter() - call_started)
+        upstream_breaker.record_failure()
+        print(f"[AI] fragment re-ask failed: {e}")
+        return None
+    observe_llm_call("ok", time.perf_counter() - call_started)
+    upstream_breaker.record_success()
+    parsed = repair_json(resp.choices[0].message.content or "")
+    return parsed.get("value") if isinstance(parsed, dict) else None
+
+
+def _validated_output(kind: Optional[str], user_prompt: str, api_key: str, parsed: Any) -> Any:
+    """
+    Validate against the prompt's schema (app.ai_output); invalid fragments are
+    re-asked for on their own and spliced in. Still invalid -> returned as parsed.
+    """
+    if kind not in OUTPUT_SCHEMAS or not isinstance(parsed, dict):
+        return parsed
+    clean, errors = validate_output(kind, parsed)
+    if not errors:
+        output_stats["valid"] += 1
+        return clean
+
+    try:
+        for _ in range(get_settings().ai_fragment_reasks):
+            for path, errs in fragment_paths(errors).items():
+                if not path:
+                    continue
+                print(f"[AI] {kind}: re-asking for {'.'.join(map(str, path))} ({errs[0].get('msg')})")
+                fragment = get_fragment(parsed, path)
+                value = _ask_fragment(api_key, prompt_fix_fragment(kind, user_prompt, path, fragment, errs))
+                if value is not None:
+                    set_fragment(parsed, path, value)
+            clean, errors = validate_output(kind, parsed)
+            if not errors:
+                output_stats["reask_fixed"] += 1
+                return clean
+    except Exception as e:
+        # An answer shaped unlike the schema must not cost the completion itself
+        print(f"[AI] {kind}: fragment repair failed: {e}")
+
+    output_stats["invalid"] += 1
+    print(f"[AI] {kind}: output still invalid ({len(errors)} errors), returned as is")
+    return parsed
+
+
+def call_ai_json(user_prompt: str, kind: Optional[str] = None) -> Tuple[str, Optional[Any]]:
     """
     Returns (raw_text, parsed_json_or_none)
+
+    `kind` names the prompt's output schema (app.ai_output.OUTPUT_SCHEMAS):
+    it is sent as response_format, and the answer is validated and repaired.
     """
-    api_key = os.getenv("OPENAI_API_KEY", "").strip()
+    settings = get_settings()
+    api_key = settings.openai_api_key
     # Determine fallback early so we can return a safe mock if no API key is present
-    fallback_to_mock = os.getenv("AI_FALLBACK_TO_MOCK", "1").lower() in ("1", "true", "yes")
+    fallback_to_mock = settings.ai_fallback_to_mock
 
     # Development mock mode: if AI_MOCK is set, return a canned response
-    ai_mock = os.getenv("AI_MOCK", "").lower()
-    if ai_mock in ("1", "true", "yes"):
+    if settings.ai_mock:
       print("[AI] AI_MOCK enabled — returning mocked response")
       lower = user_prompt.lower()
       if "create high-quality test cases" in lower or "test cases" in lower:
@@ -126,28 +214,65 @@ def call_ai_json(user_prompt: str) -> Tuple[str, Optional[Any]]:
       raise HTTPException(status_code=500, detail="OPENAI_API_KEY appears to be a placeholder. Set a valid key in environment or backend/.env")
 
     # Retry/backoff and fallback configuration
-    max_retries = int(os.getenv("OPENAI_RETRY_COUNT", "2"))
-    backoff_base = float(os.getenv("OPENAI_RETRY_BACKOFF", "1"))
-    # Fallback to a local mock response by default to avoid returning 5xx for quota/rate issues.
-    # Set AI_FALLBACK_TO_MOCK=0/false to disable.
-    fallback_to_mock = os.getenv("AI_FALLBACK_TO_MOCK", "1").lower() in ("1", "true", "yes")
+    max_retries = settings.openai_retry_count
+    backoff_base = settings.openai_retry_backoff
+
+    fmt = response_format(kind, settings.ai_response_format)
 
     attempt = 0
+    admitted = False
     while True:
+      # Circuit open -> don't even try the upstream, short-circuit to the mock fallback.
+      # Checked once per call: our own 429 retries (possibly the half-open trial) go on
+      if not admitted and not upstream_breaker.allow():
+        if fallback_to_mock:
+          print("[AI] Circuit breaker open — returning mocked response")
+          parsed = {
+            "mock": True,
+            "reason": "circuit_open",
+            "message": "OpenAI upstream is failing repeatedly; returning a safe mock response until it recovers.",
+            "prompt_preview": user_prompt[:200],
+          }
+          return json.dumps(parsed, ensure_ascii=False), parsed
+        raise HTTPException(status_code=503, detail="OpenAI upstream temporarily unavailable (circuit open)")
+      admitted = True
+
+      # Shared token bucket: wait for our turn instead of firing immediately
+      if not upstream_limiter.acquire(estimate_tokens(SYSTEM_BASE, user_prompt)):
+        # Never reached the upstream: no outcome to record, but a half-open trial must be handed back
+        upstream_breaker.release_trial()
+        if fallback_to_mock:
+          print("[AI] Rate limiter queue too long — returning mocked response")
+          parsed = {
+            "mock": True,
+            "reason": "rate_limit",
+            "message": "OpenAI rate limit budget exhausted; returning a safe mock response. Set AI_FALLBACK_TO_MOCK=0 to disable.",
+            "prompt_preview": user_prompt[:200],
+            "retries": attempt,
+          }
+          return json.dumps(parsed, ensure_ascii=False), parsed
+        raise HTTPException(status_code=503, detail="OpenAI rate limit budget exhausted, try again later")
+
+      call_started = time.perf_counter()
       try:
-        client = OpenAI(api_key=api_key)
-        resp = client.chat.completions.create(
+        client = get_openai_client(api_key)
+        raw_resp = client.chat.completions.with_raw_response.create(
           model=MODEL,
           messages=[
             {"role": "system", "content": SYSTEM_BASE},
             {"role": "user", "content": user_prompt},
           ],
           temperature=0.2,
+          **({"response_format": fmt} if fmt else {}),
         )
+        upstream_limiter.update_from_headers(raw_resp.headers)
+        resp = raw_resp.parse()
+        observe_llm_call("ok", time.perf_counter() - call_started)
+        upstream_breaker.record_success()
         raw = resp.choices[0].message.content or ""
-        parsed = _try_parse_json(raw)
-        return raw, parsed
+        break
       except Exception as e:
+        observe_llm_call("error", time.perf_counter() - call_started)
         error_msg = f"OpenAI call failed: {str(e)}"
         print(f"[AI ERROR] {error_msg}")
         import traceback
@@ -155,9 +280,12 @@ def call_ai_json(user_prompt: str) -> Tuple[str, Optional[Any]]:
 
         ex_name = e.__class__.__name__
         lower_msg = str(e).lower()
+        err_response = getattr(e, "response", None)
+        err_headers = getattr(err_response, "headers", None)
 
         # Permanent quota exhaustion -> don't retry
         if "insufficient_quota" in lower_msg or ("quota" in lower_msg and "insufficient_quota" in lower_msg):
+          upstream_breaker.record_failure()
           if fallback_to_mock:
             print("[AI] Insufficient quota — falling back to mock response (AI_FALLBACK_TO_MOCK enabled by default)")
             parsed = {
@@ -169,15 +297,15 @@ def call_ai_json(user_prompt: str) -> Tuple[str, Optional[Any]]:
             return json.dumps(parsed, ensure_ascii=False), parsed
           raise HTTPException(status_code=503, detail="OpenAI quota/rate limit error: " + error_msg) from e
 
-        # Transient rate-limit -> retry with exponential backoff
+        # Transient rate-limit -> pause the SHARED limiter and retry behind it
         if ex_name == "RateLimitError" or "rate limit" in lower_msg:
           if attempt < max_retries:
-            sleep = backoff_base * (2 ** attempt)
-            print(f"[AI] Rate limit detected; retrying in {sleep}s (attempt {attempt+1}/{max_retries})")
-            time.sleep(sleep)
+            pause = upstream_limiter.backoff(err_headers, backoff_base * (2 ** attempt))
+            print(f"[AI] Rate limit detected; all callers paused for {pause:.2f}s (attempt {attempt+1}/{max_retries})")
             attempt += 1
             continue
           # exhausted retries
+          upstream_breaker.record_failure()
           if fallback_to_mock:
             print("[AI] Rate limit persists — falling back to mock response (AI_FALLBACK_TO_MOCK enabled by default)")
             parsed = {
@@ -191,6 +319,7 @@ def call_ai_json(user_prompt: str) -> Tuple[str, Optional[Any]]:
           raise HTTPException(status_code=503, detail="OpenAI quota/rate limit error: " + error_msg) from e
 
         # Other upstream errors -> optionally fallback or return 502
+        upstream_breaker.record_failure()
         if fallback_to_mock:
           print("[AI] Upstream error — falling back to mock response (AI_FALLBACK_TO_MOCK enabled by default)")
           parsed = {
@@ -204,8 +333,36 @@ def call_ai_json(user_prompt: str) -> Tuple[str, Optional[Any]]:
 
         raise HTTPException(status_code=502, detail=error_msg) from e
 
-def run_ai_json(user_prompt: str) -> Tuple[Optional[Any], str]:
-    raw, parsed = call_ai_json(user_prompt)
+    # Outside the upstream try: the completion is paid for, local parsing is never an upstream failure
+    parsed, repaired = parse_ai_json(raw)
+    if repaired:
+      print(f"[AI] repaired malformed JSON locally ({len(raw)} chars)")
+    return raw, _validated_output(kind, user_prompt, api_key, parsed)
+
+# Identical prompts that are in flight at the same time share one upstream call
+_ai_inflight = SingleFlight()
+
+
+async def acall_ai_json(user_prompt: str, kind: Optional[str] = None) -> Tuple[str, Optional[Any]]:
+    """
+    Async version of call_ai_json for route handlers.
+
+    Runs the blocking OpenAI call in a worker thread (so the event loop keeps
+    serving other requests) and coalesces concurrent identical prompts, e.g.
+    several testers clicking "analyze" on the same requirement at once.
+    """
+    key = make_key(MODEL, SYSTEM_BASE, user_prompt, kind)
+    with track_llm():
+        raw, parsed = await _ai_inflight.do(key, lambda: asyncio.to_thread(call_ai_json, user_prompt, kind))
+    # every caller gets its own copy so nobody mutates a shared result
+    return raw, copy.deepcopy(parsed)
+
+def run_ai_json(user_prompt: str, kind: Optional[str] = None) -> Tuple[Optional[Any], str]:
+    raw, parsed = call_ai_json(user_prompt, kind)
+    return parsed, MODEL
+
+async def arun_ai_json(user_prompt: str, kind: Optional[str] = None) -> Tuple[Optional[Any], str]:
+    raw, parsed = await acall_ai_json(user_prompt, kind)
     return parsed, MODEL
 
 def prompt_testcases(requirement: str) -> str:
@@ -270,11 +427,24 @@ Return JSON with:
 }}
 """
 
-def prompt_regression(change_description: str, changed_components: Optional[list[str]]) -> str:
+def prompt_regression(
+    change_description: str,
+    changed_components: Optional[list[str]],
+    selected_tests: Optional[list[str]] = None,
+) -> str:
     components_text = ""
     if changed_components:
         components_text = "CHANGED_COMPONENTS:\n" + "\n".join(f"- {c}" for c in changed_components)
 
+    selected_text = ""
+    if selected_tests is not None:
+        # Tests were already picked from execution history; the model explains, not selects
+        selected_text = (
+            "SELECTED_TESTS (chosen from the project's test inventory and history, "
+            "use these names in recommended_tests):\n"
+            + ("\n".join(f"- {t}" for t in selected_tests) or "- (none)")
+        )
+
     return f"""
 You are selecting regression tests based on changes.
 
@@ -283,6 +453,8 @@ CHANGE_DESCRIPTION:
 
 {components_text}
 
+{selected_text}
+
 Return JSON with:
 {{
   "regression_plan": [
@@ -398,21 +570,68 @@ async def generate_classification_and_store(
     if latest:
       return latest
 
+  row = await classify_requirement(req, include_recommendations)
+  db.add(row)
+  await db.commit()
+  await db.refresh(row)
+  return row
+
+
+async def classify_requirement(req: Requirement, include_recommendations: bool) -> ClassifyRequirement:
+  """
+  Classification of `req` as an unsaved row (local model or LLM, see app.ml_routing).
+
+  Does not touch the session, so it can run concurrently with other stages
+  (app.analysis_pipeline) and be persisted in the caller's transaction.
+  """
+  routing = get_settings().ml_routing_mode
+  decision = risk = None
+  text = training_text(req.title, req.description)
+  if routing != "off":
+    decision = await local_decision(text)
+  local_ok = routing == "on" and decision is not None and decision.confident and not include_recommendations
+  if local_ok:
+    # Without a distilled risk model risk keeps normalize()'s default; an unsure one escalates to the LLM
+    risk = predict_level("risk", text)
+    local_ok = risk is None or risk.confident
+  if local_ok:
+    routing_stats.record_decision("local")
+    raw_json = decision.raw_json()
+    raw_json["risk"] = risk.as_dict() if risk is not None else None
+    return ClassifyRequirement(
+      project_id=req.project_id,
+      requirement_id=req.id,
+      category=decision.category,
+      risk_level=risk.label if risk is not None else "medium",
+      confidence=decision.confidence,
+      summary=None,
+      reasoning=f"Local classifier ({decision.label}, confidence {decision.confidence:.2f})",
+      recommendations=None,
+      raw_json=raw_json,
+      model_name=decision.model_name,
+    )
+  if routing != "off":
+    routing_stats.record_decision(
+      "llm_required" if include_recommendations else "llm_risk" if risk is not None else "llm"
+    )
+
   prompt = build_prompt(req, include_recommendations)
 
   # ✅ Use YOUR existing AI function here.
   # Replace this import/call with whatever you already use to call AI.
-  from app.ai import run_ai_json  # <-- adjust to your project
-  parsed_json, model_name = run_ai_json(prompt)
+  parsed_json, model_name = await arun_ai_json(prompt, kind="classification")
 
   if not isinstance(parsed_json, dict):
     raise HTTPException(status_code=502, detail="AI returned invalid JSON")
 
   clean = normalize(parsed_json)
+  if not parsed_json.get("mock"):
+    # Mocked answers say nothing about the local model's agreement with the LLM
+    routing_stats.record_comparison(decision, clean["category"])
 
-  row = ClassifyRequirement(
-    project_id=project_id,
-    requirement_id=requirement_id,
+  return ClassifyRequirement(
+    project_id=req.project_id,
+    requirement_id=req.id,
     category=clean["category"],
     risk_level=clean["risk_level"],
     confidence=clean["confidence"],
@@ -422,10 +641,6 @@ async def generate_classification_and_store(
     raw_json=parsed_json,
     model_name=model_name,
   )
-  db.add(row)
-  await db.commit()
-  await db.refresh(row)
-  return row
 
 def prompt_bug_triage(title: str, description: str, steps: str | None, expected: str | None, actual: str | None) -> str:
     return f"""
@@ -0,0 +1,363 @@
+"""
+Structured LLM output: JSON schema per prompt, local repair, fragment re-asks
+
+call_ai_json used to json.loads the completion and return None on any
+malformed output - the caller answered 502 (or stored junk) and the user
+retried, paying for a whole new generation. Now, per prompt kind:
+
+    1. request      the prompt's JSON schema goes out as response_format
+                    (AI_RESPONSE_FORMAT=json_schema; json_object / off for
+                    models without structured outputs)
+    2. repair       tolerant local parse: code fences, text around the JSON,
+                    trailing commas, truncated output (open strings, arrays
+                    and objects are closed)
+    3. validate     the prompt's Pydantic model; enum values are matched
+                    case-insensitively and keep the prompt's spelling
+    4. re-ask       only the invalid fragments (one test case, one risk, one
+                    field) go back to the model with the validation errors,
+                    and the answers are spliced in (AI_FRAGMENT_REASKS rounds)
+
+Outcomes are counted on GET /metrics (ai_output_total{result}).
+
+Usage example:
+    from app.ai_output import parse_ai_json, validate_output
+
+    parsed, repaired = parse_ai_json(raw_completion)
+    clean, errors = validate_output("bug_triage", parsed)
+"""
+
+import json
+import re
+from collections import Counter
+from typing import Annotated, Any, Optional, get_args, get_origin
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, TypeAdapter, ValidationError
+
+# parsed | repaired | unparseable | valid | invalid | reask_fixed | reask_failed -> n
+output_stats: Counter = Counter()
+
+
+# =========================
+# REPAIR
+# =========================
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.S)
+
+
+def _scan(text: str) -> tuple[str, list[str], bool]:
+    """
+    Drop trailing commas and report what is still open at the end:
+    (cleaned text, stack of unclosed "{" / "[", inside a string?).
+    """
+    out: list[str] = []
+    stack: list[str] = []
+    in_string = escaped = False
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            # ",}" / ",]": the comma goes, whitespace after it is harmless
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if stack:
+                stack.pop()
+        out.append(ch)
+    return "".join(out), stack, in_string
+
+
+def _close_truncated(text: str, stack: list[str], in_string: bool) -> str:
+    if in_string:
+        text += '"'
+    text = text.rstrip()
+    # A dangling separator or key ("a": / "a", / "a") cannot be completed: cut back to the last value
+    while text and (text[-1] in ",:" or (stack and stack[-1] == "{" and re.search(r'[{,]\s*"[^"]*"$', text))):
+        if text[-1] in ",:":
+            text = text[:-1].rstrip()
+        else:
+            text = re.sub(r'\s*"[^"]*"$', "", text).rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    return text + "".join("}" if opener == "{" else "]" for opener in reversed(stack))
+
+
+def repair_json(text: str) -> Optional[Any]:
+    """Best-effort parse of a completion that is almost JSON; None if nothing usable is left."""
+    fenced = _FENCE_RE.search(text)
+    # A stray closing fence ({...} ```) captures nothing useful: keep the original text then
+    if fenced and ("{" in fenced.group(1) or "[" in fenced.group(1)):
+        text = fenced.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return None
+    text = text[min(starts):]
+
+    cleaned, stack, in_string = _scan(text)
+    for candidate in (cleaned, _close_truncated(cleaned, stack, in_string)):
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            pass
+    # Text after the JSON ("Hope this helps!"): parse the first complete value only
+    try:
+        return json.JSONDecoder().raw_decode(cleaned)[0]
+    except ValueError:
+        return None
+
+
+def parse_ai_json(raw: str) -> tuple[Optional[Any], bool]:
+    """(parsed, repaired?) for a completion."""
+    try:
+        parsed = json.loads(raw.strip())
+        output_stats["parsed"] += 1
+        return parsed, False
+    except ValueError:
+        pass
+    parsed = repair_json(raw)
+    output_stats["repaired" if parsed is not None else "unparseable"] += 1
+    return parsed, parsed is not None
+
+
+# =========================
+# SCHEMAS (one per prompt in app.ai)
+# =========================
+def one_of(*allowed: str):
+    """Enum matched case-insensitively; the value keeps the prompt's spelling."""
+    canonical = {a.lower(): a for a in allowed}
+
+    def check(value: Any) -> str:
+        key = str(value).strip().lower()
+        if key not in canonical:
+            raise ValueError(f"must be one of {', '.join(allowed)}")
+        return canonical[key]
+
+    return Annotated[str, BeforeValidator(check), Field(json_schema_extra={"enum": list(allowed)})]
+
+
+Level = one_of("low", "medium", "high", "critical")
+Priority = one_of("High", "Medium", "Low")
+BugSeverity = one_of("Critical", "High", "Medium", "Low")
+OverallStatus = one_of("Green", "Yellow", "Red")
+CaseStatus = one_of("active", "draft", "inactive", "deprecated")
+CaseType = one_of("Functional", "Negative", "Boundary", "Regression", "Security", "Performance")
+Category = one_of("functional", "security", "performance", "usability", "reliability", "other")
+
+
+class _Output(BaseModel):
+    # Extra keys are kept as they came: the prompts ask for more than callers read
+    model_config = ConfigDict(extra="allow")
+
+
+class _TestCase(_Output):
+    title: str
+    description: Optional[str] = None
+    preconditions: list[str] = []
+    steps: list[str] = Field(min_length=1)
+    expected_result: str
+    priority: Level = "medium"
+    status: CaseStatus = "active"
+    type: CaseType = "Functional"
+
+
+class TestCasesOutput(_Output):
+    test_cases: list[_TestCase] = Field(min_length=1)
+    notes: list[str] = []
+    open_questions: list[str] = []
+    assumptions: list[str] = []
+
+
+class _Risk(_Output):
+    risk: str
+    severity: Priority
+    why_it_matters: Optional[str] = None
+    test_ideas: list[str] = []
+
+
+class RiskOutput(_Output):
+    risks: list[_Risk]
+    open_questions: list[str] = []
+    assumptions: list[str] = []
+
+
+class _RegressionArea(_Output):
+    area: str
+    recommended_tests: list[str] = []
+    priority: Priority
+    rationale: Optional[str] = None
+
+
+class RegressionOutput(_Output):
+    regression_plan: list[_RegressionArea]
+    tests_to_consider_skipping: list[str] = []
+    assumptions: list[str] = []
+
+
+class _TopBug(_Output):
+    title: str
+    severity: BugSeverity
+    impact: Optional[str] = None
+    suggested_next_action: Optional[str] = None
+
+
+class SummaryOutput(_Output):
+    overall_status: OverallStatus
+    highlights: list[str] = []
+    risks_blockers: list[str] = []
+    metrics: dict[str, Any] = {}
+    top_bugs: list[_TopBug] = []
+    next_steps: list[str] = []
+    assumptions: list[str] = []
+
+
+class _AnalysisRisk(_Output):
+    risk: str
+    severity: Level
+    why_it_matters: Optional[str] = None
+    mitigation_or_tests: list[str] = []
+
+
+class RequirementAnalysisOutput(_Output):
+    summary: str
+    actors: list[str] = []
+    in_scope: list[str] = []
+    out_of_scope: list[str] = []
+    assumptions: list[str] = []
+    open_questions: list[str] = []
+    acceptance_criteria_suggested: list[str] = []
+    risks: list[_AnalysisRisk] = []
+    edge_cases: list[str] = []
+    data_validation_rules: list[str] = []
+    security_privacy: list[str] = []
+
+
+class ClassificationOutput(_Output):
+    category: Category
+    risk_level: Level
+    confidence: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+    summary: Optional[str] = None
+    reasoning: Optional[str] = None
+    recommendations: Optional[str] = None
+
+
+class BugTriageOutput(_Output):
+    severity: Level
+    priority: Level
+    status: Optional[str] = None
+    suggested_root_causes: list[str] = []
+    suggested_next_steps: list[str] = []
+    duplicate_search_terms: list[str] = []
+    assumptions: list[str] = []
+
+
+OUTPUT_SCHEMAS: dict[str, type[BaseModel]] = {
+    "testcases": TestCasesOutput,
+    "risk": RiskOutput,
+    "regression": RegressionOutput,
+    "summary": SummaryOutput,
+    "requirement_analysis": RequirementAnalysisOutput,
+    "classification": ClassificationOutput,
+    "bug_triage": BugTriageOutput,
+}
+
+
+def response_format(kind: Optional[str], mode: str) -> Optional[dict]:
+    """OpenAI response_format for a prompt kind (AI_RESPONSE_FORMAT)."""
+    if mode == "off":
+        return None
+    if mode == "json_object" or kind not in OUTPUT_SCHEMAS:
+        return {"type": "json_object"}
+    # strict=False: strict mode needs every key required and no extra keys
+    schema = OUTPUT_SCHEMAS[kind].model_json_schema()
+    return {"type": "json_schema", "json_schema": {"name": kind, "schema": schema, "strict": False}}
+
+
+# =========================
+# VALIDATION / FRAGMENTS
+# =========================
+def validate_output(kind: str, parsed: Any) -> tuple[Any, list[dict]]:
+    """(normalized output, pydantic errors); the input comes back unchanged when invalid."""
+    try:
+        model = OUTPUT_SCHEMAS[kind].model_validate(parsed)
+    except ValidationError as e:
+        return parsed, e.errors(include_url=False, include_context=False)
+    return model.model_dump(mode="json", exclude_unset=True), []
+
+
+def fragment_paths(errors: list[dict]) -> dict[tuple, list[dict]]:
+    """
+    Group errors by the smallest piece worth re-asking for: one list item
+    ("test_cases", 2) or one top-level field ("summary",).
+    """
+    paths: dict[tuple, list[dict]] = {}
+    for err in errors:
+        loc = tuple(err.get("loc") or ())
+        path = loc[:2] if len(loc) >= 2 and isinstance(loc[1], int) else loc[:1]
+        paths.setdefault(path, []).append(err)
+    return paths
+
+
+def get_fragment(parsed: Any, path: tuple) -> Any:
+    value = parsed
+    for key in path:
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return value
+
+
+def set_fragment(parsed: dict, path: tuple, value: Any) -> None:
+    target = parsed
+    for key in path[:-1]:
+        target = target[key]
+    if isinstance(target, list) and isinstance(path[-1], int) and path[-1] >= len(target):
+        target.append(value)
+    else:
+        target[path[-1]] = value
+
+
+def fragment_schema(kind: str, path: tuple) -> dict:
+    """JSON schema of the value at `path` (a top-level field, or one item of a top-level list)."""
+    field = OUTPUT_SCHEMAS[kind].model_fields.get(path[0]) if path else None
+    if field is None:
+        return OUTPUT_SCHEMAS[kind].model_json_schema()
+    annotation = field.annotation
+    if len(path) > 1 and get_origin(annotation) is list:
+        annotation = get_args(annotation)[0]
+    return TypeAdapter(annotation).json_schema()
+
+
+def prompt_fix_fragment(kind: str, user_prompt: str, path: tuple, fragment: Any, errors: list[dict]) -> str:
+    where = "".join(f"[{p}]" if isinstance(p, int) else f".{p}" for p in path) or "(root)"
+    problems = "\n".join(
+        f"- {'.'.join(str(p) for p in err.get('loc', ())[len(path):]) or 'value'}: {err.get('msg')}"
+        for err in errors
+    )
+    return f"""
+Your previous JSON answer to the request below was valid except for ONE part: {where}.
+
+PROBLEMS:
+{problems}
+
+CURRENT VALUE:
+{json.dumps(fragment, ensure_ascii=False)}
+
+REQUIRED SCHEMA FOR THIS PART:
+{json.dumps(fragment_schema(kind, path), ensure_ascii=False)}
+
+Return JSON only: {{"value": <the corrected value for {where}>}}
+
+ORIGINAL REQUEST (for context):
+{user_prompt}
+""".strip()
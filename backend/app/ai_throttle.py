@@ -0,0 +1,274 @@
+"""
+Shared throttling for the OpenAI upstream (rate limiter + circuit breaker)
+
+All calls made by `call_ai_json` go through ONE process-wide limiter and ONE
+circuit breaker, so a rate-limit event slows every caller down together
+instead of each request retrying (and hammering the API) on its own.
+
+Usage example:
+    from app.ai_throttle import upstream_limiter, upstream_breaker
+
+    if not upstream_breaker.allow():
+        ...  # short-circuit to the mock fallback
+
+    upstream_limiter.acquire(estimated_tokens=1200)
+    raw = client.chat.completions.with_raw_response.create(...)
+    upstream_limiter.update_from_headers(raw.headers)
+    upstream_breaker.record_success()
+"""
+
+import re
+import threading
+import time
+from typing import Mapping, Optional
+
+from .config import get_settings
+
+
+# OpenAI reports reset times like "1s", "6m0s", "120ms" or "2h3m4.5s"
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parse an `x-ratelimit-reset-*` / `retry-after` header value into seconds.
+
+    Returns None when the value is missing or not understood.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    total = 0.0
+    matched = False
+    for amount, unit in _DURATION_PART.findall(value):
+        total += float(amount) * _UNIT_SECONDS[unit]
+        matched = True
+    return total if matched else None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    `capacity` is the burst size, `refill_per_second` the steady-state rate.
+    Both can be changed at runtime when the provider tells us its real limits.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.tokens = float(capacity)
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+            self._updated = now
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """
+        Take `amount` tokens and return how long the caller must wait before
+        using them (0.0 = go now). The reservation is made immediately, so
+        concurrent callers queue up behind each other instead of all waking
+        up at the same moment.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            amount = min(amount, self.capacity)
+            self.tokens -= amount
+
+            wait = max(0.0, self.blocked_until - now)
+            if self.tokens < 0 and self.refill_per_second > 0:
+                wait = max(wait, -self.tokens / self.refill_per_second)
+            return wait
+
+    def refund(self, amount: float = 1.0) -> None:
+        """Give back a reservation that was not used (the caller gave up instead of waiting)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+    def sync(self, limit: Optional[float], remaining: Optional[float], reset_seconds: Optional[float], window_seconds: float) -> None:
+        """Align the bucket with what the provider reported in its response headers."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if limit and limit > 0:
+                self.capacity = float(limit)
+                self.refill_per_second = float(limit) / window_seconds
+            if remaining is not None:
+                # Never hand out more than the provider says is left
+                self.tokens = min(self.tokens, float(remaining))
+                if remaining <= 0 and reset_seconds:
+                    self.blocked_until = max(self.blocked_until, now + reset_seconds)
+
+    def pause(self, seconds: float) -> None:
+        """Empty the bucket and block everyone for `seconds` (used after a 429)."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.tokens, 0.0)
+            self._updated = now
+            self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class UpstreamLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets driven by the
+    `x-ratelimit-*` headers returned by the OpenAI API.
+    """
+
+    WINDOW_SECONDS = 60.0
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, max_wait_seconds: float):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / self.WINDOW_SECONDS)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / self.WINDOW_SECONDS)
+        self.max_wait_seconds = max_wait_seconds
+
+    def acquire(self, estimated_tokens: int = 1) -> bool:
+        """
+        Block until one request and `estimated_tokens` tokens are available.
+
+        Returns False (without sleeping) if the wait would exceed
+        `max_wait_seconds`, so the caller can degrade instead of hanging.
+        """
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        if wait > self.max_wait_seconds:
+            # Rejected callers must not keep the buckets in debt, or everyone after them waits longer
+            self.requests.refund(1)
+            self.tokens.refund(estimated_tokens)
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def update_from_headers(self, headers: Optional[Mapping[str, str]]) -> None:
+        if not headers:
+            return
+
+        def _num(name: str) -> Optional[float]:
+            try:
+                return float(headers.get(name))
+            except (TypeError, ValueError):
+                return None
+
+        self.requests.sync(
+            _num("x-ratelimit-limit-requests"),
+            _num("x-ratelimit-remaining-requests"),
+            parse_reset_duration(headers.get("x-ratelimit-reset-requests")),
+            self.WINDOW_SECONDS,
+        )
+        self.tokens.sync(
+            _num("x-ratelimit-limit-tokens"),
+            _num("x-ratelimit-remaining-tokens"),
+            parse_reset_duration(headers.get("x-ratelimit-reset-tokens")),
+            self.WINDOW_SECONDS,
+        )
+
+    def backoff(self, headers: Optional[Mapping[str, str]], fallback_seconds: float) -> float:
+        """
+        Pause ALL callers after a rate-limit error. Uses `retry-after` /
+        reset headers when present, otherwise `fallback_seconds`.
+        """
+        seconds = None
+        if headers:
+            seconds = (
+                parse_reset_duration(headers.get("retry-after"))
+                or parse_reset_duration(headers.get("x-ratelimit-reset-requests"))
+                or parse_reset_duration(headers.get("x-ratelimit-reset-tokens"))
+            )
+        seconds = seconds or fallback_seconds
+        self.requests.pause(seconds)
+        return seconds
+
+
+class CircuitBreaker:
+    """
+    closed    -> calls go through; consecutive failures are counted
+    open      -> calls are rejected until `reset_timeout` has passed
+    half_open -> exactly one trial call is let through; success closes, failure re-opens
+
+    A trial that ends without reaching the upstream (limiter rejection) must
+    call release_trial(), otherwise the breaker stays half open for good.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_owner: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._trial_owner = threading.get_ident()
+                return True
+            return False
+
+    def release_trial(self) -> None:
+        """Hand back this thread's half-open trial without recording an outcome."""
+        with self._lock:
+            if self.state == "half_open" and self._trial_owner == threading.get_ident():
+                self._trial_in_flight = False
+                self._trial_owner = None
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+            self._trial_owner = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"[AI] Circuit breaker OPEN after {self.failures} consecutive upstream failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+                self._trial_owner = None
+
+
+def estimate_tokens(*texts: str, completion_budget: int = 1500) -> int:
+    """Rough token estimate (~4 chars per token) used to reserve TPM budget up front."""
+    return sum(len(t or "") for t in texts) // 4 + completion_budget
+
+
+_settings = get_settings()
+
+upstream_limiter = UpstreamLimiter(
+    requests_per_minute=_settings.openai_rpm_limit,
+    tokens_per_minute=_settings.openai_tpm_limit,
+    max_wait_seconds=_settings.openai_max_queue_wait,
+)
+
+upstream_breaker = CircuitBreaker(
+    failure_threshold=_settings.ai_circuit_failure_threshold,
+    reset_timeout=_settings.ai_circuit_reset_seconds,
+)
@@ -0,0 +1,181 @@
+"""
+Concurrent requirement analysis pipeline
+
+Analyzing a requirement used to be three round trips in a row: the LLM
+analysis, then the ML category prediction (create_requirement_analysis), and
+the LLM classification as a separate call. The stages do not depend on each
+other, so the pipeline starts them together:
+
+    ml               category from the local classifier (app.inference)
+    analysis         prompt_requirement_analysis: summary, risks, acceptance criteria
+    classification   category / risk / confidence (app.ai.classify_requirement,
+                     local model first when ML_ROUTING_MODE=on)
+
+Every stage has its own timeout (PIPELINE_ML_TIMEOUT_SECONDS /
+PIPELINE_LLM_TIMEOUT_SECONDS, or per request). A stage that times out or
+fails is reported in `stages` and the others still count: the response is
+partial instead of an error, and latency is the slowest stage, not the sum.
+
+A timeout only stops the pipeline from WAITING. The LLM call itself runs in a
+worker thread behind the single-flight (app.singleflight), which cannot be
+cancelled: it finishes in the background, still spends its rate-limit budget,
+and its answer is dropped (or served to an identical request that joined it).
+The ML stage relies on inference_service.warm_up() at startup; a cold worker
+pool would not answer within PIPELINE_ML_TIMEOUT_SECONDS.
+What did finish is stored in ONE transaction - a RequirementAnalysis and a
+ClassifyRequirement row, or neither.
+
+Stages never touch the database session; only the final commit does.
+
+Usage example:
+    from app.analysis_pipeline import run_pipeline
+
+    result = await run_pipeline(req, include_recommendations=False)
+    analysis, classification = build_rows(req, user.id, result)
+    db.add_all([row for row in (analysis, classification) if row is not None])
+    await db.commit()
+    print(result.stage_report())   # {"ml": {"status": "ok", "seconds": 0.004, "error": None}, ...}
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from .config import get_settings
+from .models import ClassifyRequirement, Requirement, RequirementAnalysis
+
+SEVERITY_ORDER = {"low": 1, "medium": 2, "high": 3, "critical": 4}
+
+
+@dataclass
+class StageResult:
+    name: str
+    status: str                 # ok | timeout | error
+    seconds: float
+    value: Any = None
+    error: Optional[str] = None
+    exception: Optional[BaseException] = None
+
+
+@dataclass
+class PipelineResult:
+    stages: dict[str, StageResult] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    def ok(self, name: str) -> bool:
+        stage = self.stages.get(name)
+        return stage is not None and stage.status == "ok"
+
+    def value(self, name: str) -> Any:
+        return self.stages[name].value if self.ok(name) else None
+
+    @property
+    def partial(self) -> bool:
+        return not all(stage.status == "ok" for stage in self.stages.values())
+
+    def stage_report(self) -> dict[str, dict]:
+        return {
+            name: {"status": s.status, "seconds": round(s.seconds, 4), "error": s.error}
+            for name, s in self.stages.items()
+        }
+
+
+def analysis_fields(parsed: Any) -> dict[str, Optional[str]]:
+    """summary / risk_level / recommendations from a prompt_requirement_analysis answer."""
+    if not isinstance(parsed, dict):
+        return {"summary": None, "risk_level": None, "recommendations": None}
+
+    # Risk level = highest severity among the listed risks
+    max_sev, max_score = None, 0
+    for r in parsed.get("risks") or []:
+        sev = str((r or {}).get("severity")).lower()
+        if SEVERITY_ORDER.get(sev, 0) > max_score:
+            max_sev, max_score = sev, SEVERITY_ORDER[sev]
+
+    # Recommendations from acceptance criteria suggestions (fallback to open questions)
+    rec_list = parsed.get("acceptance_criteria_suggested") or parsed.get("open_questions") or []
+    recommendations = "\n".join(f"- {item}" for item in rec_list if item) if rec_list else None
+    return {"summary": parsed.get("summary"), "risk_level": max_sev, "recommendations": recommendations}
+
+
+async def run_stage(name: str, fn: Callable[[], Awaitable[Any]], timeout: float) -> StageResult:
+    # On timeout the awaitable is cancelled, but work it handed to a thread keeps running
+    started = time.perf_counter()
+    try:
+        value = await asyncio.wait_for(fn(), timeout)
+    except asyncio.TimeoutError:
+        return StageResult(name, "timeout", time.perf_counter() - started, error=f"timed out after {timeout:g}s")
+    except Exception as e:
+        detail = getattr(e, "detail", None) or str(e) or type(e).__name__
+        return StageResult(name, "error", time.perf_counter() - started, error=str(detail), exception=e)
+    return StageResult(name, "ok", time.perf_counter() - started, value=value)
+
+
+async def run_stages(stages: dict[str, tuple[Callable[[], Awaitable[Any]], float]]) -> PipelineResult:
+    """Run {name: (fn, timeout)} concurrently; never raises, failures are per stage."""
+    started = time.perf_counter()
+    results = await asyncio.gather(*(run_stage(name, fn, timeout) for name, (fn, timeout) in stages.items()))
+    result = PipelineResult({r.name: r for r in results}, time.perf_counter() - started)
+    print(
+        f"[PIPELINE] {result.seconds:.2f}s "
+        + " ".join(f"{r.name}={r.status}:{r.seconds:.2f}s" for r in results)
+    )
+    return result
+
+
+def stage_timeouts(overrides: Optional[dict[str, float]] = None) -> dict[str, float]:
+    settings = get_settings()
+    timeouts = {
+        "ml": settings.pipeline_ml_timeout_seconds,
+        "analysis": settings.pipeline_llm_timeout_seconds,
+        "classification": settings.pipeline_llm_timeout_seconds,
+    }
+    # Requests may shorten a stage, never wait longer than the server allows
+    timeouts.update({k: min(max(v, 0.0), timeouts[k]) for k, v in (overrides or {}).items() if k in timeouts})
+    return timeouts
+
+
+async def run_pipeline(
+    req: Requirement,
+    include_recommendations: bool = False,
+    timeouts: Optional[dict[str, float]] = None,
+) -> PipelineResult:
+    from .ai import acall_ai_json, classify_requirement, prompt_requirement_analysis
+    from .inference import inference_service
+
+    text = req.description or req.title
+    limits = stage_timeouts(timeouts)
+    analysis_prompt = prompt_requirement_analysis(text)
+
+    return await run_stages({
+        "ml": (lambda: inference_service.predict(text), limits["ml"]),
+        "analysis": (lambda: acall_ai_json(analysis_prompt, kind="requirement_analysis"), limits["analysis"]),
+        "classification": (lambda: classify_requirement(req, include_recommendations), limits["classification"]),
+    })
+
+
+def build_rows(
+    req: Requirement, user_id: int, result: PipelineResult
+) -> tuple[Optional[RequirementAnalysis], Optional[ClassifyRequirement]]:
+    """Unsaved rows for whatever finished; the caller adds both and commits once."""
+    analysis = None
+    if result.ok("analysis") or result.ok("ml"):
+        raw, parsed = result.value("analysis") or (None, None)
+        fields = analysis_fields(parsed)
+        prediction = result.value("ml")
+        if result.ok("analysis"):
+            raw_json = parsed if isinstance(parsed, dict) else {"raw_text": raw}
+        else:
+            # Never NULL: raw_json IS NULL marks user-entered analyses (training labels)
+            raw_json = {"partial": True, "stages": result.stage_report()}
+        analysis = RequirementAnalysis(
+            requirement_id=req.id,
+            created_by_user_id=user_id,
+            summary=fields["summary"],
+            category=prediction[0] if prediction else None,
+            risk_level=fields["risk_level"],
+            recommendations=fields["recommendations"],
+            raw_json=raw_json,
+        )
+    return analysis, result.value("classification")
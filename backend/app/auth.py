@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from datetime import timezone
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
 from sqlalchemy.orm import selectinload
@@ -28,7 +29,11 @@ async def get_current_user(
     if not token_row:
         _unauthorized("Token not found")
 
-    if token_row.expires_at <= utc_now():
+    expires_at = token_row.expires_at
+    if expires_at.tzinfo is None:
+        # SQLite hands back naive datetimes; tokens are always stored in UTC
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    if expires_at <= utc_now():
         await db.execute(delete(Token).where(Token.token == token_value))
         await db.commit()
         _unauthorized("Token expired")
@@ -4,16 +4,58 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
 from typing import Any, Optional
 
-from .db import get_db
+from .db import get_db, get_read_db
 from .models import BugReport
 from .schemas import BugReportCreateIn, BugReportUpdateIn, BugReportOut, AIOut, BugReportAIReportIn, BugStatusChangeIn
 from .auth import get_current_user
 from .permissions import ensure_project_access
-from .ai import call_ai_json, prompt_bug_triage
+from .ai import acall_ai_json, prompt_bug_triage
 from .bug_status_history_utils import record_status_change
+from .config import get_settings
+from .distilled import bug_text, normalize_level, predict_level
 
 router = APIRouter(prefix="/api/bug_reports", tags=["bug_reports"])
 
+
+async def _triage_on_create(payload: BugReportCreateIn) -> tuple[dict, Optional[dict], Optional[str]]:
+    """
+    Severity / priority suggestions for a new bug: {field: suggestion}, plus the
+    LLM triage (parsed, raw) when it was needed.
+
+    The distilled local models answer first; with BUG_TRIAGE_ON_CREATE=auto the
+    LLM triage only runs when one of them is unsure (or not trained yet). The
+    triage is best-effort: if the LLM fails or only a mock answered, the bug is
+    created with the local / reporter's levels and no AI report.
+    """
+    text = bug_text(
+        payload.title, payload.description, payload.steps_to_reproduce, payload.expected_result, payload.actual_result
+    )
+    local = {field: predict_level(f"bug_{field}", text) for field in ("severity", "priority")}
+    suggestions = {field: pred.as_dict() for field, pred in local.items() if pred is not None}
+
+    parsed = raw = None
+    if get_settings().bug_triage_on_create == "auto" and not all(p is not None and p.confident for p in local.values()):
+        try:
+            raw, parsed = await acall_ai_json(prompt_bug_triage(
+                payload.title,
+                payload.description,
+                payload.steps_to_reproduce,
+                payload.expected_result,
+                payload.actual_result,
+            ), kind="bug_triage")
+        except Exception as exc:
+            # HTTPException (circuit open, rate limit, upstream error) included: a bug report must not be lost to it
+            print(f"[AI] Bug triage on create failed, keeping local levels: {exc}")
+            return suggestions, None, None
+        if not isinstance(parsed, dict) or parsed.get("mock"):
+            return suggestions, None, None
+        for field, pred in local.items():
+            level = normalize_level(parsed.get(field))
+            if level and (pred is None or not pred.confident):
+                suggestions[field] = {"source": "llm", "label": level, "confident": True}
+    return suggestions, parsed, raw
+
+
 @router.post("")
 async def create_bug(
     payload: BugReportCreateIn,
@@ -22,6 +64,17 @@ async def create_bug(
 ):
     await ensure_project_access(db, payload.project_id, user.id, allow_view=False)
 
+    suggestions, ai_parsed, ai_raw = {}, None, None
+    if get_settings().bug_triage_on_create != "off":
+        suggestions, ai_parsed, ai_raw = await _triage_on_create(payload)
+    # A confident suggestion fills in what the reporter left at the default
+    levels = {
+        field: suggestions[field]["label"]
+        if field not in payload.model_fields_set and suggestions.get(field, {}).get("confident")
+        else getattr(payload, field)
+        for field in ("severity", "priority")
+    }
+
     bug = BugReport(
         project_id=payload.project_id,
         requirement_id=payload.requirement_id,
@@ -35,11 +88,15 @@ async def create_bug(
         expected_result=payload.expected_result,
         actual_result=payload.actual_result,
 
-        severity=payload.severity,
-        priority=payload.priority,
+        severity=levels["severity"],
+        priority=levels["priority"],
         status=payload.status,
         environment=payload.environment,
     )
+    if ai_parsed is not None:
+        bug.ai_report_json = ai_parsed
+        bug.ai_report_raw = ai_raw
+        bug.ai_reported_at = datetime.utcnow()
     db.add(bug)
     await db.commit()
     await db.refresh(bug)
@@ -64,6 +121,7 @@ async def create_bug(
         "ai_reported_at": bug.ai_reported_at.isoformat() if bug.ai_reported_at else None,
         "created_at": bug.created_at.isoformat() if bug.created_at else None,
         "updated_at": bug.updated_at.isoformat() if bug.updated_at else None,
+        "triage_suggestions": suggestions,
     }
 
 
@@ -75,7 +133,7 @@ async def list_bugs(
     status: Optional[str] = None,
     severity: Optional[str] = None,
     limit: int = 200,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: Any = Depends(get_current_user),
 ):
     """List bug reports for a project."""
@@ -146,7 +204,7 @@ async def bug_ai_report_from_payload(
         payload.expected_result,
         payload.actual_result,
     )
-    raw, parsed = call_ai_json(prompt)
+    raw, parsed = await acall_ai_json(prompt, kind="bug_triage")
 
     bug = BugReport(
         project_id=payload.project_id,
@@ -334,7 +392,7 @@ async def bug_ai_report(
         bug.expected_result,
         bug.actual_result,
     )
-    raw, parsed = call_ai_json(prompt)
+    raw, parsed = await acall_ai_json(prompt, kind="bug_triage")
 
     bug.ai_report_json = parsed
     bug.ai_report_raw = raw
@@ -22,7 +22,7 @@ Usage example:
     db.commit()
 """
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from datetime import datetime
 from .models import BugStatusHistory
 
@@ -104,6 +104,8 @@ def get_bug_status_timeline(db: Session, bug_id: int) -> list[BugStatusHistory]:
     """
     return (
         db.query(BugStatusHistory)
+        # format_status_timeline reads every entry's user: load them in the same query
+        .options(joinedload(BugStatusHistory.changed_by_user))
         .filter(BugStatusHistory.bug_id == bug_id)
         .order_by(BugStatusHistory.created_at)
         .all()
@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, and_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db import get_db
+from app.db import get_db, get_read_db
 from app.auth import get_current_user
 from app.models import ClassifyRequirement, Requirement
 from app.schemas import (
@@ -81,7 +81,7 @@ async def latest_per_requirement(
     limit: int = Query(default=200, ge=1, le=1000),
     risk_level: str | None = Query(default=None),
     category: str | None = Query(default=None),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user=Depends(get_current_user),
 ):
     # latest created_at per requirement
@@ -143,7 +143,7 @@ async def latest_per_requirement(
 @router.get("/dashboard/risk_counts", response_model=DashboardRiskCountsOut)
 async def dashboard_risk_counts(
     project_id: int = Query(...),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user=Depends(get_current_user),
 ):
     # latest per requirement
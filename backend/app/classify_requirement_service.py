@@ -76,7 +76,7 @@ def generate_classification_and_store(
     # ✅ Use YOUR existing AI function here.
     # Replace this import/call with whatever you already use to call AI.
     from app.ai import run_ai_json  # <-- adjust to your project
-    parsed_json, model_name = run_ai_json(prompt)
+    parsed_json, model_name = run_ai_json(prompt, kind="classification")
 
     if not isinstance(parsed_json, dict):
         raise HTTPException(status_code=502, detail="AI returned invalid JSON")
@@ -0,0 +1,265 @@
+"""
+Configuration: .env loading and typed settings
+
+The .env file is read ONCE, when the `app` package is first imported, so
+every module that reads the environment sees the same values, whichever of
+them happens to be imported first.
+
+Lookup order:
+    1. backend/.env   values here override the process environment (this is
+                      how the app has always behaved for local development)
+    2. the nearest .env found from the working directory upwards, which
+       does NOT override variables already set in the environment
+
+All settings are parsed and validated once into a frozen `Settings` object
+(get_settings()). Code reads attributes instead of calling os.getenv on
+hot paths, and a bad value (DB_POOL_SIZE=abc) fails at startup, not on the
+first request that happens to read it.
+
+Usage example:
+    from app.config import get_settings
+
+    settings = get_settings()
+    engine = create_async_engine(settings.database_url, pool_size=settings.db_pool_size)
+"""
+
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Literal, Optional
+
+from dotenv import find_dotenv, load_dotenv
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+_env_file: Optional[Path] = None
+_loaded = False
+
+
+def load_env() -> Optional[Path]:
+    """Load the .env file (idempotent). Returns the file used, if any."""
+    global _env_file, _loaded
+    if _loaded:
+        return _env_file
+
+    backend_env = BACKEND_DIR / ".env"
+    if backend_env.exists():
+        load_dotenv(backend_env, override=True)
+        _env_file = backend_env
+    else:
+        found = find_dotenv(usecwd=True)
+        if found:
+            load_dotenv(found, override=False)
+            _env_file = Path(found)
+
+    _loaded = True
+    return _env_file
+
+
+def env_file() -> Optional[Path]:
+    return _env_file
+
+
+load_env()
+
+
+# =========================
+# TYPED SETTINGS
+# =========================
+def _env_str(name: str, default: str) -> str:
+    return os.getenv(name, default).strip()
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    try:
+        return int(raw) if raw else default
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {raw!r}")
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name, "").strip()
+    try:
+        return float(raw) if raw else default
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {raw!r}")
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name, "").strip().lower()
+    if not raw:
+        return default
+    return raw in ("1", "true", "yes", "on")
+
+
+PrePing = Literal["always", "idle", "never"]
+
+
+@dataclass(frozen=True)
+class Settings:
+    # ---- database ----
+    # No credentials in code: set DATABASE_URL (URL-encode special chars, % -> %25)
+    database_url: str = field(repr=False)
+    # Optional read replica for read-heavy endpoints (get_read_db); empty = use the primary
+    database_read_url: str = field(repr=False)
+    # Route get_read_db to the replica at all; read-your-writes only holds with ONE worker (see app.db)
+    db_read_routing: bool
+    # After a client's own write, its reads go to the primary for this long (replication lag)
+    db_read_sticky_seconds: float
+    db_echo: bool
+    db_pool_size: int
+    db_max_overflow: int
+    db_pool_timeout: float        # seconds to wait for a free connection
+    db_pool_recycle: int          # seconds; replace connections older than this (-1 = never)
+    # always: ping on every checkout (one extra round trip per request)
+    # idle:   ping only connections idle longer than db_pre_ping_idle_seconds
+    # never:  rely on pool_recycle and retry-on-disconnect
+    db_pre_ping: PrePing
+    db_pre_ping_idle_seconds: float
+    db_query_cache_size: int      # SQLAlchemy compiled-statement cache (per engine)
+    # asyncpg only; set both to 0 behind pgbouncer in transaction mode
+    db_prepared_statement_cache_size: int   # SQLAlchemy asyncpg dialect cache
+    db_statement_cache_size: int            # asyncpg's own per-connection cache
+
+    # ---- schema ----
+    schema_mode: str
+
+    # ---- OpenAI ----
+    openai_api_key: str = field(repr=False)
+    openai_model: str
+    ai_mock: bool
+    ai_fallback_to_mock: bool
+    openai_retry_count: int
+    openai_retry_backoff: float
+    openai_rpm_limit: float
+    openai_tpm_limit: float
+    openai_max_queue_wait: float
+    ai_circuit_failure_threshold: int
+    ai_circuit_reset_seconds: float
+    # json_schema: per-prompt schema (app.ai_output), json_object: any JSON, off: plain text
+    ai_response_format: str
+    ai_fragment_reasks: int       # rounds re-asking the model for invalid fragments only (0 = off)
+
+    # ---- observability ----
+    metrics_server_timing: bool   # add a Server-Timing header to every response
+    metrics_token: str = field(repr=False)   # if set, GET /metrics requires "Bearer <token>"
+    slow_query_ms: float          # log statements slower than this (0 = off)
+    n_plus_one_threshold: int     # log requests running one statement shape more often (0 = off)
+
+    # ---- local ML inference (app.inference) ----
+    # auto: memory-mapped flat model when exported (app.flat_model), else joblib
+    ml_model_format: str
+    inference_workers: int        # processes running prediction batches (0 = one thread in-process)
+    inference_max_batch: int      # texts per predict_proba call
+    inference_max_wait_ms: float  # how long the first queued text waits for company
+    prediction_cache_size: int    # cached category predictions (app.prediction_cache, 0 = off)
+    prediction_cache_ttl_seconds: float
+    # off: LLM only, shadow: LLM answers + local agreement logged, on: confident local predictions skip the LLM
+    ml_routing_mode: str
+    ml_routing_threshold: float   # local confidence needed to skip the LLM (app.ml_routing)
+    distilled_min_confidence: float   # risk / bug severity models (app.distilled): below = ask the LLM
+    # off: no suggestion, suggest: local severity/priority on create, auto: + LLM triage when the local model is unsure
+    bug_triage_on_create: str
+
+    # ---- analysis pipeline (app.analysis_pipeline) ----
+    pipeline_ml_timeout_seconds: float
+    pipeline_llm_timeout_seconds: float   # per LLM stage; a stage past it is reported, not waited for
+
+    # ---- search / planning ----
+    search_index_dir: str
+    search_embed_dim: int
+    embedding_model_path: str
+    regression_history_limit: int
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        settings = cls(
+            database_url=_env_str(
+                "DATABASE_URL", "postgresql+asyncpg://postgres@localhost:5432/noor_ai_assistant"
+            ),
+            database_read_url=_env_str("DATABASE_READ_URL", ""),
+            db_read_routing=_env_bool("DB_READ_ROUTING", False),
+            db_read_sticky_seconds=_env_float("DB_READ_STICKY_SECONDS", 10.0),
+            db_echo=_env_bool("DB_ECHO", False),
+            db_pool_size=_env_int("DB_POOL_SIZE", 5),
+            db_max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+            db_pool_timeout=_env_float("DB_POOL_TIMEOUT", 30.0),
+            db_pool_recycle=_env_int("DB_POOL_RECYCLE", 1800),
+            db_pre_ping=_env_str("DB_PRE_PING", "idle").lower(),  # type: ignore[arg-type]
+            db_pre_ping_idle_seconds=_env_float("DB_PRE_PING_IDLE_SECONDS", 60.0),
+            db_query_cache_size=_env_int("DB_QUERY_CACHE_SIZE", 1000),
+            db_prepared_statement_cache_size=_env_int("DB_PREPARED_STATEMENT_CACHE_SIZE", 256),
+            db_statement_cache_size=_env_int("DB_STATEMENT_CACHE_SIZE", 256),
+            schema_mode=_env_str("SCHEMA_MODE", "verify").lower(),
+            openai_api_key=_env_str("OPENAI_API_KEY", ""),
+            openai_model=_env_str("OPENAI_MODEL", "gpt-4.1-mini"),
+            ai_mock=_env_bool("AI_MOCK", False),
+            # Fallback to a local mock response by default to avoid returning 5xx for quota/rate issues
+            ai_fallback_to_mock=_env_bool("AI_FALLBACK_TO_MOCK", True),
+            openai_retry_count=_env_int("OPENAI_RETRY_COUNT", 2),
+            openai_retry_backoff=_env_float("OPENAI_RETRY_BACKOFF", 1.0),
+            openai_rpm_limit=_env_float("OPENAI_RPM_LIMIT", 500.0),
+            openai_tpm_limit=_env_float("OPENAI_TPM_LIMIT", 200000.0),
+            openai_max_queue_wait=_env_float("OPENAI_MAX_QUEUE_WAIT", 30.0),
+            ai_circuit_failure_threshold=_env_int("AI_CIRCUIT_FAILURE_THRESHOLD", 5),
+            ai_circuit_reset_seconds=_env_float("AI_CIRCUIT_RESET_SECONDS", 30.0),
+            ai_response_format=_env_str("AI_RESPONSE_FORMAT", "json_schema").lower(),
+            ai_fragment_reasks=_env_int("AI_FRAGMENT_REASKS", 1),
+            metrics_server_timing=_env_bool("METRICS_SERVER_TIMING", False),
+            metrics_token=_env_str("METRICS_TOKEN", ""),
+            slow_query_ms=_env_float("SLOW_QUERY_MS", 500.0),
+            n_plus_one_threshold=_env_int("N_PLUS_ONE_THRESHOLD", 10),
+            ml_model_format=_env_str("ML_MODEL_FORMAT", "auto").lower(),
+            # One core: a process pool only adds IPC; leave a core for the event loop otherwise
+            inference_workers=_env_int("INFERENCE_WORKERS", max(0, min(4, (os.cpu_count() or 1) - 1))),
+            inference_max_batch=_env_int("INFERENCE_MAX_BATCH", 64),
+            inference_max_wait_ms=_env_float("INFERENCE_MAX_WAIT_MS", 5.0),
+            prediction_cache_size=_env_int("PREDICTION_CACHE_SIZE", 10000),
+            prediction_cache_ttl_seconds=_env_float("PREDICTION_CACHE_TTL_SECONDS", 3600.0),
+            ml_routing_mode=_env_str("ML_ROUTING_MODE", "shadow").lower(),
+            ml_routing_threshold=_env_float("ML_ROUTING_THRESHOLD", 0.85),
+            distilled_min_confidence=_env_float("DISTILLED_MIN_CONFIDENCE", 0.7),
+            bug_triage_on_create=_env_str("BUG_TRIAGE_ON_CREATE", "suggest").lower(),
+            pipeline_ml_timeout_seconds=_env_float("PIPELINE_ML_TIMEOUT_SECONDS", 2.0),
+            pipeline_llm_timeout_seconds=_env_float("PIPELINE_LLM_TIMEOUT_SECONDS", 60.0),
+            search_index_dir=_env_str("SEARCH_INDEX_DIR", "data/search_index"),
+            search_embed_dim=_env_int("SEARCH_EMBED_DIM", 256),
+            embedding_model_path=_env_str("EMBEDDING_MODEL_PATH", ""),
+            regression_history_limit=_env_int("REGRESSION_HISTORY_LIMIT", 20000),
+        )
+        settings.validate()
+        return settings
+
+    def validate(self) -> None:
+        if self.db_pre_ping not in ("always", "idle", "never"):
+            raise ValueError(f"DB_PRE_PING must be always, idle or never, got {self.db_pre_ping!r}")
+        if self.db_pool_size < 1 or self.db_max_overflow < 0:
+            raise ValueError("DB_POOL_SIZE must be >= 1 and DB_MAX_OVERFLOW >= 0")
+        if self.ml_model_format not in ("auto", "flat", "joblib"):
+            raise ValueError(f"ML_MODEL_FORMAT must be auto, flat or joblib, got {self.ml_model_format!r}")
+        if self.inference_workers < 0 or self.inference_max_batch < 1:
+            raise ValueError("INFERENCE_WORKERS must be >= 0 and INFERENCE_MAX_BATCH >= 1")
+        if self.prediction_cache_size < 0 or self.prediction_cache_ttl_seconds <= 0:
+            raise ValueError("PREDICTION_CACHE_SIZE must be >= 0 and PREDICTION_CACHE_TTL_SECONDS > 0")
+        if self.pipeline_ml_timeout_seconds <= 0 or self.pipeline_llm_timeout_seconds <= 0:
+            raise ValueError("PIPELINE_ML_TIMEOUT_SECONDS and PIPELINE_LLM_TIMEOUT_SECONDS must be > 0")
+        if self.ai_response_format not in ("json_schema", "json_object", "off"):
+            raise ValueError(f"AI_RESPONSE_FORMAT must be json_schema, json_object or off, got {self.ai_response_format!r}")
+        if self.ai_fragment_reasks < 0:
+            raise ValueError("AI_FRAGMENT_REASKS must be >= 0")
+        if self.ml_routing_mode not in ("off", "shadow", "on"):
+            raise ValueError(f"ML_ROUTING_MODE must be off, shadow or on, got {self.ml_routing_mode!r}")
+        if not 0.0 <= self.ml_routing_threshold <= 1.0:
+            raise ValueError("ML_ROUTING_THRESHOLD must be between 0 and 1")
+        if not 0.0 <= self.distilled_min_confidence <= 1.0:
+            raise ValueError("DISTILLED_MIN_CONFIDENCE must be between 0 and 1")
+        if self.bug_triage_on_create not in ("off", "suggest", "auto"):
+            raise ValueError(f"BUG_TRIAGE_ON_CREATE must be off, suggest or auto, got {self.bug_triage_on_create!r}")
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Parsed once per process. Tests can call get_settings.cache_clear() after changing env."""
+    return Settings.from_env()
@@ -0,0 +1,272 @@
+"""
+Local risk-level and bug-severity models distilled from LLM judgments
+
+Every LLM answer we store is a label:
+
+    risk           ClassifyRequirement.risk_level, RequirementAnalysis.risk_level
+                   (requirement text -> low|medium|high|critical)
+    bug_severity   BugReport.ai_report_json["severity"]  (bug text -> level)
+    bug_priority   BugReport.ai_report_json["priority"]
+
+Mocked answers and rows written by the local models themselves are skipped;
+risk levels users entered on a requirement analysis win over LLM ones.
+
+Each task is a TF-IDF + SGD (log loss) model exported in the flat format
+(app.flat_model) under models/distilled/<task>/, so serving is an in-process
+vocabulary lookup and one small dot product per text - tens of microseconds,
+no process pool and no LLM round trip. A stable 10% of rows (same hash as
+app.training_data) is held out; <task>_report.json records holdout accuracy
+and how many predictions clear DISTILLED_MIN_CONFIDENCE.
+
+Predictions below DISTILLED_MIN_CONFIDENCE are "unsure": callers fall back
+to the LLM (bug triage on create, ML-routed classifications).
+
+Train (or retrain) from the database:
+    cd backend
+    python retrain.py distill                       # all tasks
+    python retrain.py distill --task bug_severity
+
+Usage example:
+    from app.distilled import predict_level, bug_text
+
+    pred = predict_level("bug_severity", bug_text(title, description, actual_result=actual))
+    if pred is not None and pred.confident:
+        severity = pred.label
+"""
+
+import json
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .config import get_settings
+from .models import BugReport, ClassifyRequirement, RequirementAnalysis
+from .training_data import LOCAL_MODEL_PREFIX, LabeledText, is_holdout, stream_labeled_texts
+
+DISTILLED_DIR = Path("models") / "distilled"
+LEVELS = ("low", "medium", "high", "critical")
+TASKS = ("risk", "bug_severity", "bug_priority")
+
+# Small on purpose: the models answer in-process on every bug create
+VECTORIZER_PARAMS = dict(ngram_range=(1, 2), min_df=2, max_features=50000, sublinear_tf=True)
+
+
+@dataclass
+class LevelPrediction:
+    task: str
+    label: str
+    confidence: float
+    probabilities: dict[str, float]
+    confident: bool
+
+    def as_dict(self) -> dict:
+        return {
+            "source": "local",
+            "label": self.label,
+            "confidence": self.confidence,
+            "probabilities": self.probabilities,
+            "confident": self.confident,
+        }
+
+
+def normalize_level(value: Any) -> Optional[str]:
+    level = str(value or "").strip().lower()
+    return level if level in LEVELS else None
+
+
+def bug_text(
+    title: Optional[str],
+    description: Optional[str],
+    steps: Optional[str] = None,
+    expected: Optional[str] = None,
+    actual_result: Optional[str] = None,
+) -> str:
+    # Same fields prompt_bug_triage shows the LLM
+    return "\n".join(part for part in (title, description, steps, expected, actual_result) if part)
+
+
+# =========================
+# LABELS
+# =========================
+def _is_mock(raw_json: Any) -> bool:
+    return isinstance(raw_json, dict) and bool(raw_json.get("mock"))
+
+
+async def _risk_labels(engine: AsyncEngine, chunk_size: int) -> dict[int, tuple[str, str]]:
+    labels: dict[int, tuple[str, str]] = {}
+    async with engine.connect() as conn:
+        stmt = (
+            select(ClassifyRequirement.requirement_id, ClassifyRequirement.risk_level, ClassifyRequirement.raw_json)
+            .where(
+                (ClassifyRequirement.model_name.is_(None))
+                | ~ClassifyRequirement.model_name.startswith(LOCAL_MODEL_PREFIX)
+            )
+            .order_by(ClassifyRequirement.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        result = await conn.stream(stmt)
+        async for rows in result.partitions():
+            for req_id, risk_level, raw_json in rows:
+                # normalize() stores "medium" when the LLM gave no risk: not a judgment
+                if _is_mock(raw_json) or not isinstance(raw_json, dict) or not normalize_level(raw_json.get("risk_level")):
+                    continue
+                labels[req_id] = (normalize_level(risk_level), "llm")
+
+        stmt = (
+            select(RequirementAnalysis.requirement_id, RequirementAnalysis.risk_level, RequirementAnalysis.raw_json)
+            .where(RequirementAnalysis.risk_level.is_not(None))
+            .order_by(RequirementAnalysis.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        result = await conn.stream(stmt)
+        async for rows in result.partitions():
+            for req_id, risk_level, raw_json in rows:
+                level = normalize_level(risk_level)
+                if not level or _is_mock(raw_json):
+                    continue
+                source = "human" if raw_json is None else "llm"
+                if source == "human" or labels.get(req_id, ("", ""))[1] != "human":
+                    labels[req_id] = (level, source)
+    return labels
+
+
+async def _bug_rows(engine: AsyncEngine, field: str, chunk_size: int) -> list[LabeledText]:
+    rows_out = []
+    async with engine.connect() as conn:
+        stmt = (
+            select(
+                BugReport.id, BugReport.title, BugReport.description, BugReport.steps_to_reproduce,
+                BugReport.expected_result, BugReport.actual_result, BugReport.ai_report_json,
+            )
+            .where(BugReport.ai_report_json.is_not(None))
+            .order_by(BugReport.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        result = await conn.stream(stmt)
+        async for rows in result.partitions():
+            for bug_id, title, description, steps, expected, actual, report in rows:
+                if not isinstance(report, dict) or _is_mock(report):
+                    continue
+                level = normalize_level(report.get(field))
+                text = bug_text(title, description, steps, expected, actual)
+                if level and text:
+                    # LabeledText.requirement_id carries the bug id (holdout hash only)
+                    rows_out.append(LabeledText(bug_id, text, level, "llm"))
+    return rows_out
+
+
+async def collect_task_rows(engine: AsyncEngine, task: str, chunk_size: int = 5000) -> list[LabeledText]:
+    """Every labeled text for `task` (holdout rows included; split with is_holdout)."""
+    if task == "risk":
+        labels = await _risk_labels(engine, chunk_size)
+        rows = []
+        async for chunk in stream_labeled_texts(engine, labels, chunk_size=chunk_size, holdout=None):
+            rows.extend(chunk)
+        return rows
+    if task in ("bug_severity", "bug_priority"):
+        return await _bug_rows(engine, task.split("_", 1)[1], chunk_size)
+    raise ValueError(f"Unknown distillation task {task!r} (expected one of {', '.join(TASKS)})")
+
+
+# =========================
+# TRAINING
+# =========================
+def train_task(task: str, rows: list[LabeledText], models_dir: Path = DISTILLED_DIR) -> dict:
+    """Fit, score on the holdout, export models/distilled/<task>/; returns the report."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.preprocessing import LabelEncoder
+
+    from .flat_model import export_flat_model
+
+    train = [r for r in rows if not is_holdout(r.requirement_id)]
+    holdout = [r for r in rows if is_holdout(r.requirement_id)]
+    counts = Counter(r.label for r in train)
+    if len(counts) < 2:
+        raise ValueError(f"{task}: need at least two distinct labels to train, got {dict(counts)}")
+
+    # min_df=2 would leave almost no vocabulary on a young database
+    vectorizer = TfidfVectorizer(**{**VECTORIZER_PARAMS, "min_df": 1 if len(train) < 200 else VECTORIZER_PARAMS["min_df"]})
+    label_encoder = LabelEncoder().fit([r.label for r in train])
+    X = vectorizer.fit_transform([r.text for r in train])
+    y = label_encoder.transform([r.label for r in train])
+    # LLM severity labels are skewed towards "medium": balance so the rare levels are still predicted
+    clf = SGDClassifier(loss="log_loss", alpha=1e-5, class_weight="balanced", max_iter=50, tol=1e-4, random_state=42)
+    clf.fit(X, y)
+
+    threshold = get_settings().distilled_min_confidence
+    report: dict[str, Any] = {
+        "task": task,
+        "n_train": len(train),
+        "n_holdout": len(holdout),
+        "labels": dict(sorted(counts.items())),
+        "min_confidence": threshold,
+    }
+    known = [r for r in holdout if r.label in set(label_encoder.classes_)]
+    if known:
+        probs = clf.predict_proba(vectorizer.transform([r.text for r in known]))
+        pred = label_encoder.classes_[probs.argmax(axis=1)]
+        conf = probs.max(axis=1)
+        correct = pred == [r.label for r in known]
+        confident = conf >= threshold
+        report["holdout_accuracy"] = float(correct.mean())
+        # Share of texts the local model answers alone, and how often it is right there
+        report["confident_share"] = float(confident.mean())
+        report["confident_accuracy"] = float(correct[confident].mean()) if confident.any() else None
+
+    out_dir = Path(models_dir) / task
+    export_flat_model(clf, vectorizer, label_encoder, out_dir, source=f"distilled:{task}")
+    (Path(models_dir) / f"{task}_report.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"[DISTILL] {task}: {report}")
+    return report
+
+
+# =========================
+# SERVING
+# =========================
+_models: dict[str, tuple[float, Any]] = {}
+prediction_counts: Counter = Counter()   # (task, confident) -> n, exported on /metrics
+
+
+def load_task_model(task: str, models_dir: Path = DISTILLED_DIR) -> Any:
+    """Memory-mapped model for `task`, None until `retrain.py distill` has run; reloaded when re-exported."""
+    from .flat_model import MANIFEST, FlatModel
+
+    manifest = Path(models_dir) / task / MANIFEST
+    if not manifest.exists():
+        return None
+    mtime = manifest.stat().st_mtime
+    cached = _models.get(task)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, FlatModel.load(manifest.parent))
+        _models[task] = cached
+    return cached[1]
+
+
+def predict_level(task: str, text: str) -> Optional[LevelPrediction]:
+    """Local prediction for `text`, or None when there is no model (or no text)."""
+    if not text:
+        return None
+    try:
+        model = load_task_model(task)
+    except (OSError, ValueError) as e:
+        print(f"[DISTILL] {task} model unavailable: {e}")
+        return None
+    if model is None:
+        return None
+    probs = model.predict_proba([text])[0]
+    best = int(probs.argmax())
+    confidence = float(probs[best])
+    confident = confidence >= get_settings().distilled_min_confidence
+    prediction_counts[(task, confident)] += 1
+    return LevelPrediction(
+        task=task,
+        label=model.classes[best],
+        confidence=confidence,
+        probabilities={c: float(p) for c, p in zip(model.classes, probs)},
+        confident=confident,
+    )
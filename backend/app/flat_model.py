@@ -0,0 +1,499 @@
+"""
+Pickle-free, memory-mapped format for the requirement category classifier
+
+A joblib bundle is unpickled into private Python objects in every process
+that loads it (each uvicorn worker, each inference worker), so memory grows
+with the number of workers. The flat format stores the same model as plain
+NumPy arrays plus a small JSON manifest:
+
+    models/category_flat_latest/
+        manifest.json        analyzer settings, classes, model kind, shapes
+        terms.npy            vocabulary, sorted (looked up with searchsorted)
+        term_index.npy       column of each sorted term
+        idf.npy              IDF weight per column
+        <model arrays>.npy   forest: flattened trees / linear: coef, intercept
+
+Arrays are opened with np.load(mmap_mode="r"): every process maps the same
+page-cache copy and loading is a few file opens instead of an unpickle.
+
+Supported models: RandomForest / ExtraTrees (forest), LogisticRegression,
+SGDClassifier (log / modified huber loss), MultinomialNB (linear), and
+CalibratedClassifierCV(method="sigmoid") around a linear model such as
+LinearSVC (calibrated_linear). Anything else raises ValueError on export and
+keeps using joblib.
+
+train_model.py exports after every training run; an existing joblib model
+can be converted without retraining:
+
+    python -m app.flat_model export            # models/*_latest.joblib -> models/category_flat_latest
+
+Usage example:
+    from app.flat_model import FlatModel
+
+    model = FlatModel.load("models/category_flat_latest")
+    probs = model.predict_proba(["The user shall reset the password"])   # (1, n_classes)
+    print(model.classes[probs[0].argmax()])
+    model.explain(["The user shall reset the password"], top_k=5)[0]["supporting"]
+"""
+
+import json
+import re
+import shutil
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+LATEST_DIR = "category_flat_latest"
+
+# Rows predicted per dense chunk (dense: n_rows x n_features float32)
+_CHUNK = 256
+
+
+# =========================
+# EXPORT
+# =========================
+def _export_vectorizer(vectorizer: Any) -> tuple[dict, dict[str, np.ndarray]]:
+    params = vectorizer.get_params()
+    if params["analyzer"] != "word" or params["tokenizer"] or params["preprocessor"] or params["strip_accents"]:
+        raise ValueError("Only word analyzers with the default tokenizer / preprocessor can be exported")
+    stop_words = vectorizer.get_stop_words()
+
+    vocab = vectorizer.vocabulary_
+    terms = sorted(vocab)
+    arrays = {
+        "terms": np.array(terms, dtype=str),
+        "term_index": np.array([vocab[t] for t in terms], dtype=np.int32),
+        "idf": np.asarray(vectorizer.idf_, dtype=np.float64),
+    }
+    meta = {
+        "lowercase": bool(params["lowercase"]),
+        "token_pattern": params["token_pattern"],
+        "ngram_range": list(params["ngram_range"]),
+        "stop_words": sorted(stop_words) if stop_words else [],
+        "binary": bool(params["binary"]),
+        "sublinear_tf": bool(params["sublinear_tf"]),
+        "use_idf": bool(params["use_idf"]),
+        "norm": params["norm"],
+        "n_features": len(vocab),
+    }
+    return meta, arrays
+
+
+def _export_forest(clf: Any) -> tuple[dict, dict[str, np.ndarray]]:
+    trees = [est.tree_ for est in clf.estimators_]
+    offsets = np.cumsum([0] + [t.node_count for t in trees])
+    left, right, feature, threshold, value = [], [], [], [], []
+    for tree, offset in zip(trees, offsets):
+        # Child ids are per tree; shift them into the concatenated node array (leaves keep -1)
+        is_leaf = tree.children_left < 0
+        left.append(np.where(is_leaf, -1, tree.children_left + offset))
+        right.append(np.where(is_leaf, -1, tree.children_right + offset))
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        v = tree.value[:, 0, :]
+        value.append(v / np.maximum(v.sum(axis=1, keepdims=True), 1e-12))
+    arrays = {
+        "roots": offsets[:-1].astype(np.int64),
+        "left": np.concatenate(left).astype(np.int64),
+        "right": np.concatenate(right).astype(np.int64),
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "value": np.concatenate(value).astype(np.float64),
+    }
+    return {"kind": "forest", "max_depth": int(max(t.max_depth for t in trees))}, arrays
+
+
+def _export_linear(clf: Any) -> tuple[dict, dict[str, np.ndarray]]:
+    name = type(clf).__name__
+    if name == "MultinomialNB":
+        # joint log likelihood = X @ feature_log_prob.T + class_log_prior
+        coef, intercept, link = clf.feature_log_prob_, clf.class_log_prior_, "softmax"
+    elif name == "LogisticRegression":
+        coef, intercept = clf.coef_, clf.intercept_
+        link = "ovr" if clf.solver == "liblinear" or getattr(clf, "multi_class", "auto") == "ovr" else "softmax"
+    elif name == "SGDClassifier":
+        if clf.loss not in ("log_loss", "log", "modified_huber"):
+            raise ValueError("SGDClassifier needs loss='log_loss' or 'modified_huber' for probabilities")
+        coef, intercept = clf.coef_, clf.intercept_
+        link = "ovr" if clf.loss != "modified_huber" else "ovr_huber"
+    else:
+        raise ValueError(f"No flat export for {name}")
+    arrays = {
+        "coef": np.ascontiguousarray(coef, dtype=np.float64),
+        "intercept": np.asarray(intercept, dtype=np.float64).reshape(-1),
+    }
+    return {"kind": "linear", "link": link}, arrays
+
+
+def _export_calibrated(clf: Any) -> tuple[dict, dict[str, np.ndarray]]:
+    # One (linear model, per-class sigmoid) pair per calibration fold; predict_proba averages them
+    if clf.method != "sigmoid":
+        raise ValueError(f"No flat export for CalibratedClassifierCV(method={clf.method!r})")
+    coef, intercept, cal_a, cal_b = [], [], [], []
+    for cc in clf.calibrated_classifiers_:
+        est = cc.estimator
+        if not hasattr(est, "coef_") or len(est.classes_) != len(clf.classes_):
+            raise ValueError(f"No flat export for calibrated {type(est).__name__}")
+        coef.append(est.coef_)
+        intercept.append(np.asarray(est.intercept_).reshape(-1))
+        cal_a.append([c.a_ for c in cc.calibrators])
+        cal_b.append([c.b_ for c in cc.calibrators])
+    arrays = {
+        "coef": np.asarray(coef, dtype=np.float64),            # (folds, k, n_features)
+        "intercept": np.asarray(intercept, dtype=np.float64),  # (folds, k)
+        "cal_a": np.asarray(cal_a, dtype=np.float64),
+        "cal_b": np.asarray(cal_b, dtype=np.float64),
+    }
+    return {"kind": "calibrated_linear"}, arrays
+
+
+def _write(out_dir: Path, meta: dict, model_arrays: dict[str, np.ndarray], vectorizer: Any, label_encoder: Any,
+           source: str) -> Path:
+    vec_meta, vec_arrays = _export_vectorizer(vectorizer)
+
+    tmp = out_dir.with_name(out_dir.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    arrays = {**vec_arrays, **model_arrays}
+    for name, arr in arrays.items():
+        np.save(tmp / f"{name}.npy", arr, allow_pickle=False)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": source,
+        "classes": [str(c) for c in label_encoder.classes_],
+        "vectorizer": vec_meta,
+        "model": meta,
+        "arrays": {name: {"dtype": str(arr.dtype), "shape": list(arr.shape)} for name, arr in arrays.items()},
+    }
+    (tmp / MANIFEST).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    # Swap the directory in as a whole so readers never see a half-written model
+    old = out_dir.with_name(out_dir.name + ".old")
+    if old.exists():
+        shutil.rmtree(old)
+    if out_dir.exists():
+        out_dir.rename(old)
+    tmp.rename(out_dir)
+    if old.exists():
+        shutil.rmtree(old)
+    return out_dir
+
+
+def export_flat_model(clf: Any, vectorizer: Any, label_encoder: Any, out_dir: Path, source: str = "") -> Path:
+    """Write clf + vectorizer + label encoder as a flat model; ValueError if the model type is not supported."""
+    if type(clf).__name__ in ("RandomForestClassifier", "ExtraTreesClassifier"):
+        meta, arrays = _export_forest(clf)
+    elif type(clf).__name__ == "CalibratedClassifierCV":
+        meta, arrays = _export_calibrated(clf)
+    else:
+        meta, arrays = _export_linear(clf)
+    return _write(Path(out_dir), meta, arrays, vectorizer, label_encoder, source or type(clf).__name__)
+
+
+# =========================
+# INFERENCE
+# =========================
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max(axis=1, keepdims=True)
+    np.exp(z, out=z)
+    return z / z.sum(axis=1, keepdims=True)
+
+
+class FlatModel:
+    def __init__(self, path: Path, manifest: dict, arrays: dict[str, np.ndarray]):
+        self.path = path
+        self.manifest = manifest
+        self.arrays = arrays
+        self.classes: list[str] = manifest["classes"]
+
+        vec = manifest["vectorizer"]
+        self._token_re = re.compile(vec["token_pattern"])
+        self._lowercase = vec["lowercase"]
+        self._ngram_min, self._ngram_max = vec["ngram_range"]
+        self._stop_words = frozenset(vec["stop_words"])
+        self.n_features = vec["n_features"]
+        self._names: Optional[np.ndarray] = None
+
+    @property
+    def version(self) -> str:
+        return self.manifest.get("created_at", "")
+
+    @classmethod
+    def load(cls, path: Path | str) -> "FlatModel":
+        path = Path(path)
+        manifest = json.loads((path / MANIFEST).read_text(encoding="utf-8"))
+        if manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported flat model format {manifest.get('format_version')!r} in {path}")
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in manifest["arrays"]}
+        return cls(path, manifest, arrays)
+
+    # ---- vectorizer ----
+    def _ngrams(self, text: str) -> list[str]:
+        if self._lowercase:
+            text = text.lower()
+        tokens = [t for t in self._token_re.findall(text) if t not in self._stop_words]
+        out = []
+        for n in range(self._ngram_min, self._ngram_max + 1):
+            out.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return out
+
+    def transform(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """TF-IDF as CSR parts (indptr, columns, values), same numbers as the sklearn vectorizer."""
+        terms = self.arrays["terms"]
+        term_index = self.arrays["term_index"]
+        vec = self.manifest["vectorizer"]
+
+        indptr = [0]
+        cols_parts, vals_parts = [], []
+        for text in texts:
+            grams = self._ngrams(text or "")
+            if grams:
+                # Vectorized vocabulary lookup on the sorted, memory-mapped term array
+                grams_arr = np.array(grams, dtype=str)
+                pos = np.searchsorted(terms, grams_arr)
+                pos = np.minimum(pos, len(terms) - 1)
+                hit = terms[pos] == grams_arr
+                cols, counts = np.unique(term_index[pos[hit]], return_counts=True)
+                vals = counts.astype(np.float64)
+            else:
+                cols, vals = np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+
+            if vec["binary"]:
+                vals = np.ones_like(vals)
+            elif vec["sublinear_tf"]:
+                vals = 1.0 + np.log(vals)
+            if vec["use_idf"]:
+                vals = vals * self.arrays["idf"][cols]
+            if vec["norm"] == "l2" and vals.size:
+                vals = vals / np.sqrt((vals * vals).sum())
+            elif vec["norm"] == "l1" and vals.size:
+                vals = vals / np.abs(vals).sum()
+
+            cols_parts.append(cols)
+            vals_parts.append(vals)
+            indptr.append(indptr[-1] + len(cols))
+
+        cols = np.concatenate(cols_parts) if cols_parts else np.empty(0, dtype=np.int32)
+        vals = np.concatenate(vals_parts) if vals_parts else np.empty(0, dtype=np.float64)
+        return np.asarray(indptr, dtype=np.int64), cols, vals
+
+    def _dense(self, indptr: np.ndarray, cols: np.ndarray, vals: np.ndarray, dtype: Any) -> np.ndarray:
+        X = np.zeros((len(indptr) - 1, self.n_features), dtype=dtype)
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        X[rows, cols] = vals
+        return X
+
+    # ---- models ----
+    def _forest_proba(self, X: np.ndarray) -> np.ndarray:
+        a = self.arrays
+        n_rows = X.shape[0]
+        # Walk every (row, tree) pair one level per step: max_depth numpy steps for the whole batch
+        node = np.broadcast_to(a["roots"], (n_rows, len(a["roots"]))).copy()
+        rows = np.arange(n_rows)[:, None]
+        for _ in range(self.manifest["model"]["max_depth"]):
+            left = a["left"][node]
+            inner = left >= 0
+            if not inner.any():
+                break
+            go_left = X[rows, a["feature"][node]] <= a["threshold"][node]
+            node = np.where(inner, np.where(go_left, left, a["right"][node]), node)
+        return a["value"][node].mean(axis=1)
+
+    @staticmethod
+    def _decision(coef: np.ndarray, intercept: np.ndarray, indptr: np.ndarray, cols: np.ndarray,
+                  vals: np.ndarray) -> np.ndarray:
+        # Sparse X @ coef.T + intercept without scipy: weighted coef columns, summed per row
+        z = np.zeros((len(indptr) - 1, coef.shape[0]))
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        np.add.at(z, rows, coef[:, cols].T * vals[:, None])
+        return z + intercept
+
+    def _calibrated_proba(self, indptr: np.ndarray, cols: np.ndarray, vals: np.ndarray) -> np.ndarray:
+        a = self.arrays
+        n_classes = len(self.classes)
+        total = np.zeros((len(indptr) - 1, n_classes))
+        for fold in range(a["coef"].shape[0]):
+            z = self._decision(a["coef"][fold], a["intercept"][fold], indptr, cols, vals)
+            p = 1.0 / (1.0 + np.exp(a["cal_a"][fold] * z + a["cal_b"][fold]))
+            if n_classes == 2:
+                p = np.column_stack([1.0 - p[:, 0], p[:, 0]])
+            else:
+                s = p.sum(axis=1, keepdims=True)
+                p = np.where(s > 0, p / np.where(s > 0, s, 1), 1.0 / n_classes)
+            total += p
+        return total / a["coef"].shape[0]
+
+    def _linear_proba(self, indptr: np.ndarray, cols: np.ndarray, vals: np.ndarray) -> np.ndarray:
+        z = self._decision(self.arrays["coef"], self.arrays["intercept"], indptr, cols, vals)
+
+        link = self.manifest["model"]["link"]
+        if z.shape[1] == 1:
+            # Binary: one decision column, same link as the multiclass case (sklearn's binary predict_proba)
+            if link == "ovr_huber":
+                p = (np.clip(z[:, 0], -1, 1) + 1) / 2
+            else:
+                p = 1.0 / (1.0 + np.exp(-z[:, 0]))
+            return np.column_stack([1.0 - p, p])
+        if link == "softmax":
+            return _softmax(z)
+        if link == "ovr_huber":
+            p = (np.clip(z, -1, 1) + 1) / 2
+        else:
+            p = 1.0 / (1.0 + np.exp(-z))
+        total = p.sum(axis=1, keepdims=True)
+        return np.where(total > 0, p / np.where(total > 0, total, 1), 1.0 / p.shape[1])
+
+    def predict_proba(self, texts: list[str]) -> np.ndarray:
+        kind = self.manifest["model"]["kind"]
+        out = []
+        for start in range(0, len(texts), _CHUNK):
+            indptr, cols, vals = self.transform(texts[start:start + _CHUNK])
+            if kind == "forest":
+                # sklearn trees compare float32 features against float64 thresholds
+                out.append(self._forest_proba(self._dense(indptr, cols, vals, np.float32)))
+            elif kind == "calibrated_linear":
+                out.append(self._calibrated_proba(indptr, cols, vals))
+            else:
+                out.append(self._linear_proba(indptr, cols, vals))
+        if not out:
+            return np.zeros((0, len(self.classes)))
+        return np.vstack(out)
+
+    # ---- explanations ----
+    def _column_terms(self) -> np.ndarray:
+        # Inverse of the vocabulary: n-gram text per feature column
+        if self._names is None:
+            self._names = np.empty(self.n_features, dtype=self.arrays["terms"].dtype)
+            self._names[self.arrays["term_index"]] = self.arrays["terms"]
+        return self._names
+
+    def _linear_weights(self, cols: np.ndarray) -> np.ndarray:
+        """(n_classes, len(cols)) weight of each feature towards each class, in log-odds units."""
+        a = self.arrays
+        if self.manifest["model"]["kind"] == "calibrated_linear":
+            # The sigmoid calibration rescales (and can flip) each class's decision value
+            W = (-a["cal_a"][:, :, None] * a["coef"][:, :, cols]).mean(axis=0)
+        else:
+            W = a["coef"][:, cols]
+        if W.shape[0] == 1:
+            W = np.vstack([-W[0], W[0]])
+        elif self.manifest["model"].get("link") == "softmax":
+            # Softmax only sees differences between classes: weight relative to the class average
+            W = W - W.mean(axis=0)
+        return W
+
+    def _forest_contributions(self, X: np.ndarray, pred: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Per-(row, feature) contributions to the predicted class probability: every split on
+        a row's decision path moves the node value; that change is credited to the split feature.
+        """
+        a = self.arrays
+        n_rows, n_trees = X.shape[0], len(a["roots"])
+        node = np.broadcast_to(a["roots"], (n_rows, n_trees)).copy()
+        rows = np.arange(n_rows)[:, None]
+        cls = pred[:, None]
+        keys, deltas = [], []
+        for _ in range(self.manifest["model"]["max_depth"]):
+            left = a["left"][node]
+            inner = left >= 0
+            if not inner.any():
+                break
+            feat = a["feature"][node]
+            go_left = X[rows, feat] <= a["threshold"][node]
+            child = np.where(inner, np.where(go_left, left, a["right"][node]), node)
+            delta = a["value"][child, np.broadcast_to(cls, node.shape)] - a["value"][node, np.broadcast_to(cls, node.shape)]
+            keys.append((np.broadcast_to(rows, node.shape) * self.n_features + feat)[inner])
+            deltas.append(delta[inner])
+            node = child
+        if not keys:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0)
+        uniq, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        weights = np.bincount(inverse, weights=np.concatenate(deltas)) / n_trees
+        return uniq // self.n_features, uniq % self.n_features, weights
+
+    def explain(self, texts: list[str], top_k: int = 5) -> list[dict]:
+        """
+        Prediction plus the n-grams that pushed towards it ("supporting") and away
+        from it ("opposing") for every text, computed for the whole batch at once.
+
+        Linear models: TF-IDF value x class weight of each n-gram in the text.
+        Forests: change of the predicted class probability at each split on the
+        decision paths, summed per n-gram; splits on n-grams missing from the
+        text count too (in_text=False, e.g. "no 'password' -> not Security").
+        """
+        kind = self.manifest["model"]["kind"]
+        names = self._column_terms()
+        out: list[dict] = []
+        for start in range(0, len(texts), _CHUNK):
+            chunk = texts[start:start + _CHUNK]
+            indptr, cols, vals = self.transform(chunk)
+            if kind == "forest":
+                X = self._dense(indptr, cols, vals, np.float32)
+                probs = self._forest_proba(X)
+                pred = probs.argmax(axis=1)
+                rows, feats, weights = self._forest_contributions(X, pred)
+                in_text = X[rows, feats] > 0
+            else:
+                probs = (self._calibrated_proba if kind == "calibrated_linear" else self._linear_proba)(indptr, cols, vals)
+                pred = probs.argmax(axis=1)
+                rows = np.repeat(np.arange(len(chunk)), np.diff(indptr))
+                feats = cols
+                weights = self._linear_weights(cols)[pred[rows], np.arange(len(cols))] * vals
+                in_text = np.ones(len(cols), dtype=bool)
+
+            # Rows in order, strongest contribution first within each row; one slice per row
+            order = np.lexsort((-weights, rows))
+            rows, feats, weights, in_text = rows[order], feats[order], weights[order], in_text[order]
+            bounds = np.searchsorted(rows, np.arange(len(chunk) + 1))
+            for i in range(len(chunk)):
+                lo, hi = bounds[i], bounds[i + 1]
+                pos = [j for j in range(lo, min(hi, lo + top_k)) if weights[j] > 0]
+                neg = [j for j in range(hi - 1, max(lo, hi - top_k) - 1, -1) if weights[j] < 0]
+                out.append({
+                    "predicted_category": self.classes[pred[i]],
+                    "confidence": float(probs[i, pred[i]]),
+                    "supporting": [
+                        {"ngram": str(names[feats[j]]), "weight": float(weights[j]), "in_text": bool(in_text[j])}
+                        for j in pos
+                    ],
+                    "opposing": [
+                        {"ngram": str(names[feats[j]]), "weight": float(weights[j]), "in_text": bool(in_text[j])}
+                        for j in neg
+                    ],
+                })
+        return out
+
+
+def load_latest(models_dir: Path | str = "models") -> Optional[FlatModel]:
+    path = Path(models_dir) / LATEST_DIR
+    if not (path / MANIFEST).exists():
+        return None
+    return FlatModel.load(path)
+
+
+def main(argv: list[str]) -> None:
+    if argv[:1] != ["export"]:
+        print("usage: python -m app.flat_model export [models_dir]")
+        sys.exit(2)
+    import joblib
+
+    models_dir = Path(argv[1] if len(argv) > 1 else "models")
+    clf = joblib.load(models_dir / "category_classifier_latest.joblib")
+    vectorizer = joblib.load(models_dir / "vectorizer_latest.joblib")
+    le = joblib.load(models_dir / "label_encoder_latest.joblib")
+    out = export_flat_model(clf, vectorizer, le, models_dir / LATEST_DIR)
+    print(f"Exported {type(clf).__name__} to {out}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,218 @@
+"""
+Keyword (full-text) search across requirements, test cases and bug reports
+
+Postgres:
+    Each table gets a generated, weighted `search_tsv tsvector` column with a
+    GIN index. Queries use websearch_to_tsquery (quotes, OR, -exclusions),
+    ts_rank_cd for ranking and ts_headline for highlighted snippets.
+
+SQLite (local stand-in):
+    Each table gets an external-content FTS5 table kept in sync by triggers.
+    Queries use bm25() for ranking and snippet() for highlighting.
+
+Usage example:
+    from app.fulltext import ensure_fulltext_schema, fulltext_search
+
+    async with engine.begin() as conn:
+        await ensure_fulltext_schema(conn)
+
+    hits = await fulltext_search(db, project_id=1, query="password reset", kinds=["requirement", "bug"])
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_STOP = "</mark>"
+
+
+@dataclass(frozen=True)
+class FullTextSource:
+    kind: str
+    table: str
+    # (column, weight) - weight A is most important, D least (Postgres setweight)
+    columns: tuple[tuple[str, str], ...]
+
+    @property
+    def column_names(self) -> list[str]:
+        return [c for c, _ in self.columns]
+
+    @property
+    def fts_table(self) -> str:
+        return f"{self.table}_fts"
+
+
+SOURCES: dict[str, FullTextSource] = {
+    "requirement": FullTextSource(
+        "requirement", "requirements",
+        (("title", "A"), ("description", "B"), ("acceptance_criteria", "C")),
+    ),
+    "test_case": FullTextSource(
+        "test_case", "test_cases",
+        (("title", "A"), ("steps", "B"), ("expected_result", "C")),
+    ),
+    "bug": FullTextSource(
+        "bug", "bug_reports",
+        (("title", "A"), ("description", "B"), ("steps_to_reproduce", "C"), ("expected_result", "D"), ("actual_result", "C")),
+    ),
+}
+
+# bm25 column weights for SQLite, mirroring the Postgres A/B/C/D weights
+_BM25_WEIGHTS = {"A": 10.0, "B": 4.0, "C": 2.0, "D": 1.0}
+
+
+# =========================
+# SCHEMA
+# =========================
+def _pg_ddl(src: FullTextSource) -> list[str]:
+    vector = " || ".join(
+        f"setweight(to_tsvector('english', coalesce({col}, '')), '{weight}')" for col, weight in src.columns
+    )
+    return [
+        f"ALTER TABLE {src.table} ADD COLUMN IF NOT EXISTS search_tsv tsvector "
+        f"GENERATED ALWAYS AS ({vector}) STORED",
+        f"CREATE INDEX IF NOT EXISTS ix_{src.table}_search_tsv ON {src.table} USING GIN (search_tsv)",
+    ]
+
+
+def _sqlite_ddl(src: FullTextSource) -> list[str]:
+    cols = ", ".join(src.column_names)
+    new_cols = ", ".join(f"new.{c}" for c in src.column_names)
+    old_cols = ", ".join(f"old.{c}" for c in src.column_names)
+    fts = src.fts_table
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+        f"content='{src.table}', content_rowid='id', tokenize='porter unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {src.table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {src.table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {src.table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+    ]
+
+
+def fulltext_ddl(dialect: str) -> list[str]:
+    """All DDL statements needed for full-text search on this dialect (idempotent)."""
+    statements: list[str] = []
+    for src in SOURCES.values():
+        if dialect == "postgresql":
+            statements += _pg_ddl(src)
+        elif dialect == "sqlite":
+            statements += _sqlite_ddl(src)
+    return statements
+
+
+async def ensure_fulltext_schema(conn: AsyncConnection) -> None:
+    dialect = conn.dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        print(f"[fulltext] No full-text support for dialect {dialect!r}; skipping")
+        return
+
+    missing_fts: list[str] = []
+    if dialect == "sqlite":
+        existing = {
+            r[0] for r in (await conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))).all()
+        }
+        missing_fts = [src.fts_table for src in SOURCES.values() if src.fts_table not in existing]
+
+    for stmt in fulltext_ddl(dialect):
+        await conn.execute(text(stmt))
+
+    # Freshly created FTS5 tables start empty: index the rows that already exist
+    for fts in missing_fts:
+        await conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+# =========================
+# QUERY
+# =========================
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def _fts5_match(query: str) -> str:
+    """
+    Turn free text into a safe FTS5 MATCH expression: every word quoted
+    (so user input can't inject FTS syntax), AND-ed, last word as prefix
+    so search-as-you-type works.
+    """
+    tokens = _TOKEN.findall(query)
+    if not tokens:
+        return ""
+    parts = [f'"{t}"' for t in tokens]
+    parts[-1] += "*"
+    return " ".join(parts)
+
+
+def _pg_query(src: FullTextSource) -> str:
+    document = "concat_ws(' ', " + ", ".join(src.column_names) + ")"
+    # ts_headline is expensive, so only run it on the already-limited top rows
+    return f"""
+        SELECT hit.id, hit.title, hit.rank,
+               ts_headline('english', hit.document, hit.query,
+                           'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxFragments=2, MinWords=5, MaxWords=20') AS snippet
+        FROM (
+            SELECT t.id, t.title, {document} AS document, q.query,
+                   ts_rank_cd(t.search_tsv, q.query) AS rank
+            FROM {src.table} t, websearch_to_tsquery('english', :q) AS q(query)
+            WHERE t.project_id = :project_id AND t.search_tsv @@ q.query
+            ORDER BY rank DESC
+            LIMIT :limit
+        ) hit
+        ORDER BY hit.rank DESC
+    """
+
+
+def _sqlite_query(src: FullTextSource) -> str:
+    fts = src.fts_table
+    weights = ", ".join(str(_BM25_WEIGHTS[w]) for _, w in src.columns)
+    return f"""
+        SELECT t.id, t.title,
+               -bm25({fts}, {weights}) AS rank,
+               snippet({fts}, -1, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}', '…', 16) AS snippet
+        FROM {fts}
+        JOIN {src.table} t ON t.id = {fts}.rowid
+        WHERE {fts} MATCH :q AND t.project_id = :project_id
+        ORDER BY rank DESC
+        LIMIT :limit
+    """
+
+
+async def fulltext_search(
+    db: AsyncSession,
+    project_id: int,
+    query: str,
+    kinds: Iterable[str] | None = None,
+    limit: int = 20,
+) -> list[dict[str, Any]]:
+    """
+    Ranked keyword search. Returns dicts with type, id, title, rank, snippet,
+    best first. Raises NotImplementedError on databases without FTS support.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        build, q = _pg_query, query
+    elif dialect == "sqlite":
+        build, q = _sqlite_query, _fts5_match(query)
+    else:
+        raise NotImplementedError(f"Full-text search is not supported on {dialect}")
+
+    if not q.strip():
+        return []
+
+    hits: list[dict[str, Any]] = []
+    for kind in kinds or SOURCES.keys():
+        src = SOURCES[kind]
+        rows = (await db.execute(text(build(src)), {"q": q, "project_id": project_id, "limit": limit})).all()
+        hits.extend(
+            {"type": kind, "id": r.id, "title": r.title, "rank": float(r.rank or 0.0), "snippet": r.snippet}
+            for r in rows
+        )
+
+    hits.sort(key=lambda h: h["rank"], reverse=True)
+    return hits[:limit]
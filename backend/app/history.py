@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
 
-from .db import get_db
+from .db import get_read_db
 from .auth import get_current_user
 from .permissions import ensure_project_access
 from .models import Requirement, TestCase
@@ -33,7 +33,7 @@ class HistoryItemOut(BaseModel):
 async def get_history(
     project_id: int,
     limit: int = 200,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: Any = Depends(get_current_user),
 ):
     # access check
@@ -8,7 +8,7 @@ from typing import Any, Literal, Optional
 import io
 import json
 
-from .db import get_db
+from .db import get_db, get_read_db
 from .auth import get_current_user
 from .permissions import ensure_project_access
 from .services.impexp import (
@@ -35,7 +35,7 @@ async def export_entity(
     project_id: int,
     entity: Entity,
     format: ExportFormat = Query("csv"),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: Any = Depends(get_current_user),
 ):
     await ensure_project_access(db, project_id, user.id, allow_view=True)
@@ -0,0 +1,252 @@
+"""
+Micro-batching inference service for the requirement category classifier
+
+`predict_category` is plain synchronous sklearn: called from an async handler
+it blocks the event loop for the whole vectorize + predict_proba, and every
+request pays the per-call overhead on its own. The service instead
+
+    - queues single predictions from concurrent requests
+    - collects them for up to INFERENCE_MAX_WAIT_MS (or INFERENCE_MAX_BATCH
+      texts) into one batch
+    - runs the batch as ONE sparse matrix / predict_proba in a process pool
+      (INFERENCE_WORKERS processes, each loading the model once)
+    - resolves every caller's future with its own row
+
+While all workers are busy the queue keeps filling, so batches grow with load
+and throughput scales with the number of cores. INFERENCE_WORKERS=0 runs the
+batches in a thread of the current process instead (no extra processes; for
+development and single-core hosts).
+
+Repeated texts are answered from app.prediction_cache without queueing.
+
+Queue depth, batch sizes, queue wait and batch latency are exported on
+GET /metrics.
+
+Usage example:
+    from app.inference import inference_service
+
+    pred, conf, probs = await inference_service.predict(requirement_text)
+    results = await inference_service.predict_many([r.description for r in reqs])
+    explanations = await inference_service.explain_many([r.description for r in reqs], top_k=5)
+"""
+
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from .config import get_settings
+from .metrics import Histogram
+from .prediction_cache import prediction_cache
+from . import ml
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+WAIT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+BATCH_SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# How stale the model fingerprint may get: a promoted model reaches the cache this much later
+FINGERPRINT_REFRESH_SECONDS = 1.0
+
+Prediction = tuple[str, float, dict[str, float]]
+
+
+def _warm_worker() -> None:
+    # Pool initializer: load (or map) the model before the first batch arrives
+    try:
+        ml.load_model()
+    except FileNotFoundError:
+        pass  # surfaces on the first batch instead
+
+
+def _copy(prediction: Prediction) -> Prediction:
+    # Callers own their probabilities dict; the cached one stays untouched
+    label, confidence, probabilities = prediction
+    return label, confidence, dict(probabilities)
+
+
+@dataclass
+class _Pending:
+    text: str
+    future: asyncio.Future
+    enqueued: float
+
+
+class InferenceService:
+    def __init__(
+        self,
+        predict_batch: Callable[[list[str]], list[Any]] = ml.predict_categories,
+        workers: Optional[int] = None,
+        max_batch: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+    ):
+        settings = get_settings()
+        self.predict_batch = predict_batch
+        self.workers = settings.inference_workers if workers is None else workers
+        self.max_batch = max(1, settings.inference_max_batch if max_batch is None else max_batch)
+        self.max_wait = max(0.0, settings.inference_max_wait_ms if max_wait_ms is None else max_wait_ms) / 1000.0
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[Executor] = None
+        self._fingerprint = ""
+        self._fingerprint_at = float("-inf")
+
+        self.requests = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.in_flight_batches = 0
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait = Histogram(WAIT_BUCKETS)
+        self.batch_seconds = Histogram(BATCH_SECONDS_BUCKETS)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def model_fingerprint(self) -> str:
+        # ml.model_fingerprint() stats three files; cache hits should not pay that on every keystroke
+        now = time.monotonic()
+        if now - self._fingerprint_at >= FINGERPRINT_REFRESH_SECONDS:
+            self._fingerprint = ml.model_fingerprint()
+            self._fingerprint_at = now
+        return self._fingerprint
+
+    # =========================
+    # PUBLIC API
+    # =========================
+    async def predict(self, text: str) -> Prediction:
+        fingerprint = self.model_fingerprint() if prediction_cache.enabled else ""
+        cached = prediction_cache.get(fingerprint, text)
+        if cached is not None:
+            return _copy(cached)
+        self._ensure_started()
+        future = self._loop.create_future()
+        self.requests += 1
+        self._queue.put_nowait(_Pending(text, future, time.perf_counter()))
+        result = await future
+        prediction_cache.put(fingerprint, text, result)
+        return _copy(result)
+
+    async def predict_many(self, texts: list[str]) -> list[Prediction]:
+        # Each text still goes through the queue, so a large list is split into max_batch chunks
+        return list(await asyncio.gather(*(self.predict(t) for t in texts)))
+
+    async def explain_many(self, texts: list[str], top_k: int = 5) -> list[dict]:
+        # Not queued with predictions (different output), but runs on the same warm workers
+        self._ensure_started()
+        return await self._loop.run_in_executor(self._executor, ml.explain_categories, texts, top_k)
+
+    async def warm_up(self) -> None:
+        """
+        Start the worker pool and load the model now (app startup), not inside
+        the first request: spawning the pool and loading the model takes longer
+        than PIPELINE_ML_TIMEOUT_SECONDS.
+        """
+        self._ensure_started()
+        started = time.perf_counter()
+        await self._loop.run_in_executor(self._executor, _warm_worker)
+        print(f"[INFERENCE] workers ready in {time.perf_counter() - started:.2f}s")
+
+    async def close(self) -> None:
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+        if self._queue is not None:
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if not item.future.done():
+                    item.future.set_exception(RuntimeError("Inference service stopped"))
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._loop = self._queue = self._batcher = self._slots = self._executor = None
+
+    # =========================
+    # BATCHING
+    # =========================
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._batcher is not None and not self._batcher.done():
+            return
+        if self._loop is not loop:
+            # First use, or a new event loop (tests): the old queue / semaphore belong to the old loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(max(1, self.workers))
+            self._loop = loop
+        if self._executor is None:
+            self._executor = self._make_executor()
+        self._batcher = loop.create_task(self._run())
+
+    def _make_executor(self) -> Executor:
+        if self.workers <= 0:
+            return ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference", initializer=_warm_worker)
+        # spawn, not fork: the server process has threads (thread pool, DB driver) that fork would copy mid-flight
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_warm_worker
+        )
+
+    async def _collect(self) -> list[_Pending]:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            # Wait for a free worker first: while all are busy, requests pile up into the next batch
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            # Callers that gave up (client disconnect) are not predicted
+            batch = [item for item in batch if not item.future.done()]
+            if not batch:
+                self._slots.release()
+                continue
+            self._loop.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch: list[_Pending]) -> None:
+        started = time.perf_counter()
+        for item in batch:
+            self.queue_wait.observe(started - item.enqueued)
+        self.batches += 1
+        self.in_flight_batches += 1
+        self.batch_sizes.observe(len(batch))
+        try:
+            results = await self._loop.run_in_executor(
+                self._executor, self.predict_batch, [item.text for item in batch]
+            )
+        except Exception as e:
+            self.failed_batches += 1
+            print(f"[INFERENCE] batch of {len(batch)} failed: {e}")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+        else:
+            for item, result in zip(batch, results):
+                if not item.future.done():
+                    item.future.set_result(result)
+        finally:
+            self.batch_seconds.observe(time.perf_counter() - started)
+            self.in_flight_batches -= 1
+            self._slots.release()
+
+
+inference_service = InferenceService()
@@ -1,17 +1,19 @@
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc, text
-from dotenv import load_dotenv
-import os
-from pathlib import Path
+from sqlalchemy import select, desc
+import time
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import PlainTextResponse
 from fastapi import Request
 import traceback
 from .auth import router as auth_router, get_current_user
 from .projects import router as projects_router
-from .db import Base, engine, get_db
+from .db import engine, read_engine, get_db, pool_status
+from .metrics import MetricsMiddleware, instrument_engine, router as metrics_router
+from .query_profiler import QueryProfilerMiddleware, install_app_engines
+from .config import get_settings
+from .schema_version import prepare_schema
 from .organizations import router as organizations_router
 from .roles import router as roles_router
 from .users import router as users_router
@@ -24,25 +26,32 @@ from .project_sharing import router as project_sharing_router
 from .test_executions import router as test_executions_router
 from .classify_requirement import router as classify_requirements_router
 from .bug_reports import router as bug_reports_router
-from .ml import predict_category
-from .schemas import RequirementPredictIn, RequirementPredictOut
+from .search import router as search_router
+from .traceability import router as traceability_router
+from .test_planning import router as test_planning_router
+from .import_export import router as import_export_router
+from .inference import inference_service
+from .schemas import RequirementPredictIn, RequirementPredictOut, RequirementExplainIn, RequirementExplanationOut
 from .models import User, Project
 from .models import Requirement
 from .schemas import RequirementCreateIn, RequirementUpdateIn, RequirementOut
 from .schemas import TestCasesIn, RiskIn, RegressionIn, SummaryIn, AIOut
-from .ai import call_ai_json, prompt_testcases, prompt_risk, prompt_regression, prompt_summary
+from .schemas import RegressionOut, RegressionTestOut
+from .regression import load_case_profiles, select_regression
+from .ai import acall_ai_json, prompt_testcases, prompt_risk, prompt_regression, prompt_summary
 
 
-# Load .env from backend/ directory (one level up from app/)
-env_path = Path(__file__).parent.parent / ".env"
-print(f"[ENV] Loading .env from: {env_path}")
-print(f"[ENV] .env exists: {env_path.exists()}")
-load_dotenv(dotenv_path=env_path, override=True)
-print(f"[ENV] OPENAI_API_KEY length after load: {len(os.getenv('OPENAI_API_KEY', ''))}")
-print(f"[ENV] OPENAI_MODEL after load: {os.getenv('OPENAI_MODEL', 'NOT SET')}")
-
 app = FastAPI(title="AI Assistant for Testers (Noor Engineering MVP)")
 
+# Per-route latency / SQL / LLM metrics (GET /metrics); added before CORS so CORS stays outermost
+app.add_middleware(QueryProfilerMiddleware)
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+if read_engine is not engine:
+    instrument_engine(read_engine)
+# Slow-query log (SLOW_QUERY_MS) and N+1 warnings (N_PLUS_ONE_THRESHOLD)
+install_app_engines()
+
 # CORS MUST be first
 app.add_middleware(
     CORSMiddleware,
@@ -70,6 +79,11 @@ app.include_router(history_router)
 app.include_router(requirement_analysis_router)
 app.include_router(classify_requirements_router)
 app.include_router(bug_reports_router)
+app.include_router(search_router)
+app.include_router(traceability_router)
+app.include_router(test_planning_router)
+app.include_router(import_export_router)
+app.include_router(metrics_router)
 # DEBUG: show full traceback in Swagger when 500 happens
 @app.exception_handler(Exception)
 async def debug_exception_handler(request: Request, exc: Exception):
@@ -80,49 +94,60 @@ async def debug_exception_handler(request: Request, exc: Exception):
 
 @app.on_event("startup")
 async def on_startup():
-    # Create tables
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-        # Ensure new columns exist (lightweight migration)
-        try:
-            await conn.execute(
-                text("ALTER TABLE requirement_analyses ADD COLUMN IF NOT EXISTS raw_json JSONB")
-            )
-        except Exception as exc:
-            # Don't block startup if DB is not Postgres or table doesn't exist yet
-            print(f"[startup] raw_json column check skipped: {exc}")
-
-        # Ensure classify_requirements columns exist
-        try:
-            await conn.execute(
-                text("ALTER TABLE classify_requirements ADD COLUMN IF NOT EXISTS recommendations TEXT")
-            )
-            await conn.execute(
-                text("ALTER TABLE classify_requirements ADD COLUMN IF NOT EXISTS raw_json JSONB")
-            )
-        except Exception as exc:
-            print(f"[startup] classify_requirements column check skipped: {exc}")
+    # Migrations run once per deploy (`alembic upgrade head`); workers only verify
+    await prepare_schema(engine)
 
-    if not os.getenv("OPENAI_API_KEY"):
+    if not get_settings().openai_api_key:
         print("WARNING: OPENAI_API_KEY is not set. Endpoints will fail until it is set.")
 
+    # Pool spawn + model load up front, so the first prediction is not the one timing out
+    await inference_service.warm_up()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await inference_service.close()
+
 @app.post("/api/requirements/predict", response_model=RequirementPredictOut)
 async def predict_requirement_category(
     payload: RequirementPredictIn,
     user: User = Depends(get_current_user),
 ):
     # user must be logged in (token auth)
-    pred, conf, probs = predict_category(payload.text)
+    pred, conf, probs = await inference_service.predict(payload.text)
     return RequirementPredictOut(
         predicted_category=pred,
         confidence=conf,
         probabilities=probs,
     )
+
+
+@app.post("/api/requirements/explain", response_model=list[RequirementExplanationOut])
+async def explain_requirement_categories(
+    payload: RequirementExplainIn,
+    user: User = Depends(get_current_user),
+):
+    """Prediction and top contributing n-grams for each text, one batch for the whole list."""
+    try:
+        return await inference_service.explain_many(payload.texts, top_k=payload.top_k)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+@app.get("/health/pool")
+def health_pool():
+    # Per worker process: size the pool from checked_out / utilization under load
+    status = {"primary": pool_status()}
+    if read_engine is not engine:
+        status["replica"] = pool_status(replica=True)
+    return status
+
+
 async def ensure_project_owner(db: AsyncSession, project_id: int, user_id: int) -> Project:
     stmt = select(Project).where(Project.id == project_id, Project.owner_user_id == user_id)
     project = (await db.execute(stmt)).scalars().first()
@@ -135,7 +160,7 @@ async def ensure_project_owner(db: AsyncSession, project_id: int, user_id: int)
 
 
 def _require_openai_key():
-    if not os.getenv("OPENAI_API_KEY"):
+    if not get_settings().openai_api_key:
         raise HTTPException(status_code=500, detail="OPENAI_API_KEY not configured")
 
 
@@ -153,7 +178,7 @@ async def make_testcases(
     await ensure_project_owner(db, payload.project_id, user.id)
 
     user_prompt = prompt_testcases(payload.requirement)
-    raw, parsed = call_ai_json(user_prompt)
+    raw, parsed = await acall_ai_json(user_prompt, kind="testcases")
 
     return AIOut(parsed_json=parsed, raw_text=raw)
 
@@ -168,28 +193,68 @@ async def analyze_risk(
     await ensure_project_owner(db, payload.project_id, user.id)
 
     user_prompt = prompt_risk(payload.requirement)
-    raw, parsed = call_ai_json(user_prompt)
+    raw, parsed = await acall_ai_json(user_prompt, kind="risk")
 
     return AIOut(parsed_json=parsed, raw_text=raw)
 
 
-@app.post("/api/regression", response_model=AIOut)
+@app.post("/api/regression", response_model=RegressionOut)
 async def suggest_regression(
     payload: RegressionIn,
     db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
-    _require_openai_key()
+    if payload.include_narrative:
+        _require_openai_key()
     await ensure_project_owner(db, payload.project_id, user.id)
 
-    input_text = payload.change_description
-    if payload.changed_components:
-        input_text += "\n\nCHANGED_COMPONENTS:\n" + "\n".join(payload.changed_components)
-
-    user_prompt = prompt_regression(payload.change_description, payload.changed_components)
-    raw, parsed = call_ai_json(user_prompt)
-
-    return AIOut(parsed_json=parsed, raw_text=raw)
+    # Selection is local (inventory + execution history); the LLM only explains it
+    started = time.perf_counter()
+    profiles = await load_case_profiles(
+        db, payload.project_id, branch=payload.branch, git_shas=payload.git_shas or []
+    )
+    selection = select_regression(
+        profiles,
+        changed_components=payload.changed_components,
+        change_description=payload.change_description,
+        branch=payload.branch,
+        time_budget_seconds=payload.time_budget_seconds,
+        max_tests=payload.max_tests,
+    )
+    took_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    narrative = None
+    if payload.include_narrative:
+        user_prompt = prompt_regression(
+            payload.change_description,
+            payload.changed_components,
+            selected_tests=[c.profile.title for c in selection.selected],
+        )
+        raw, parsed = await acall_ai_json(user_prompt, kind="regression")
+        narrative = AIOut(parsed_json=parsed, raw_text=raw)
+
+    return RegressionOut(
+        project_id=payload.project_id,
+        took_ms=took_ms,
+        time_budget_seconds=payload.time_budget_seconds,
+        estimated_total_seconds=selection.estimated_total_seconds,
+        candidates=selection.candidates,
+        not_selected=selection.not_selected,
+        selected=[
+            RegressionTestOut(
+                test_case_id=c.profile.test_case_id,
+                title=c.profile.title,
+                requirement_id=c.profile.requirement_id,
+                score=round(c.score, 4),
+                relevance=c.relevance,
+                failure_probability=c.failure_probability,
+                estimated_seconds=round(c.estimated_seconds, 2),
+                reasons=c.reasons,
+            )
+            for c in selection.selected
+        ],
+        narrative=narrative,
+    )
 
 
 @app.post("/api/summary", response_model=AIOut)
@@ -206,7 +271,7 @@ async def summarize(
         input_text += "\n\nBUG_REPORTS:\n" + payload.bug_reports
 
     user_prompt = prompt_summary(payload.test_results, payload.bug_reports)
-    raw, parsed = call_ai_json(user_prompt)
+    raw, parsed = await acall_ai_json(user_prompt, kind="summary")
 
     return AIOut(parsed_json=parsed, raw_text=raw)
 
@@ -0,0 +1,447 @@
+"""
+Request-level performance metrics
+
+A pure ASGI middleware records, per route (the path template, e.g.
+/api/projects/{project_id}/traceability, not the raw URL):
+
+    - request latency histogram and request count by status
+    - SQL statements per request (histogram) and total SQL time
+    - time spent waiting on the LLM
+    - response body size
+
+SQL is counted with SQLAlchemy cursor events on the app engines and LLM time
+with track_llm(); both add to the current request through a contextvar, so
+no route code has to pass anything around. GET /metrics renders everything
+in the Prometheus text format, together with the DB pool, the OpenAI
+limiter / circuit breaker and the single-flight stats.
+
+Every worker process keeps its own numbers: scrape each worker (or run one
+worker per container) and aggregate in Prometheus.
+
+With METRICS_SERVER_TIMING=1 responses also carry a Server-Timing header
+(app, db and llm durations) that shows up in the browser dev tools.
+
+Usage example:
+    from app.metrics import MetricsMiddleware, instrument_engine, track_llm
+
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
+
+    with track_llm():
+        raw = await call_the_model(prompt)
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .config import get_settings
+
+router = APIRouter(tags=["metrics"])
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+
+# Requests that matched no route share one label (404 scans must not create series)
+UNMATCHED_ROUTE = "unmatched"
+
+
+@dataclass
+class RequestMetrics:
+    sql_count: int = 0
+    sql_seconds: float = 0.0
+    llm_count: int = 0
+    llm_seconds: float = 0.0
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+def current_request_metrics() -> Optional[RequestMetrics]:
+    return _current.get()
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+
+@dataclass
+class RouteStats:
+    latency: Histogram
+    sql_statements: Histogram
+    sql_seconds: float = 0.0
+    llm_seconds: float = 0.0
+    response_bytes: int = 0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes: dict[tuple[str, str], RouteStats] = {}
+        self.requests: dict[tuple[str, str, str], int] = {}
+        self.llm_calls: dict[str, Histogram] = {}
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, m: RequestMetrics, size: int) -> None:
+        with self._lock:
+            stats = self.routes.get((method, route))
+            if stats is None:
+                stats = RouteStats(Histogram(LATENCY_BUCKETS), Histogram(SQL_COUNT_BUCKETS))
+                self.routes[(method, route)] = stats
+            stats.latency.observe(seconds)
+            stats.sql_statements.observe(m.sql_count)
+            stats.sql_seconds += m.sql_seconds
+            stats.llm_seconds += m.llm_seconds
+            stats.response_bytes += size
+            key = (method, route, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def observe_llm_call(self, outcome: str, seconds: float) -> None:
+        with self._lock:
+            hist = self.llm_calls.get(outcome)
+            if hist is None:
+                hist = self.llm_calls[outcome] = Histogram(LLM_BUCKETS)
+            hist.observe(seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.routes.clear()
+            self.requests.clear()
+            self.llm_calls.clear()
+
+
+registry = MetricsRegistry()
+
+
+# =========================
+# COLLECTION HOOKS
+# =========================
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["metrics_query_start"].pop()
+    m = _current.get()
+    if m is not None:
+        m.sql_count += 1
+        m.sql_seconds += time.perf_counter() - started
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("metrics_query_start"):
+        conn.info["metrics_query_start"].pop()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Count statements and SQL time of every request that uses this engine."""
+    sync_engine = engine.sync_engine
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+@contextmanager
+def track_llm() -> Iterator[None]:
+    """Add the time spent inside the block to the current request's LLM time."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        m = _current.get()
+        if m is not None:
+            m.llm_count += 1
+            m.llm_seconds += time.perf_counter() - started
+
+
+def observe_llm_call(outcome: str, seconds: float) -> None:
+    """One upstream LLM round trip (outcome: ok / error), independent of requests."""
+    registry.observe_llm_call(outcome, seconds)
+
+
+# =========================
+# MIDDLEWARE
+# =========================
+class MetricsMiddleware:
+    def __init__(self, app: Any):
+        self.app = app
+        self.server_timing = get_settings().metrics_server_timing
+        self._route_paths: dict[Any, str] = {}
+
+    def _route_label(self, scope: dict) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            app = scope.get("app")
+            for route in getattr(app, "routes", []):
+                if getattr(route, "endpoint", None) is endpoint:
+                    path = route.path
+                    break
+            else:
+                path = UNMATCHED_ROUTE
+            self._route_paths[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        m = RequestMetrics()
+        token = _current.set(m)
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(m, time.perf_counter() - started).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            registry.observe_request(
+                scope["method"], self._route_label(scope), status, time.perf_counter() - started, m, size
+            )
+
+
+def _server_timing(m: RequestMetrics, seconds: float) -> str:
+    # Headers go out before a streamed body: db / llm cover the work done up to then
+    return (
+        f"app;dur={seconds * 1000:.1f}, "
+        f'db;dur={m.sql_seconds * 1000:.1f};desc="{m.sql_count} queries", '
+        f"llm;dur={m.llm_seconds * 1000:.1f}"
+    )
+
+
+# =========================
+# PROMETHEUS EXPOSITION
+# =========================
+def _labels(**labels: Any) -> str:
+    parts = []
+    for k, v in labels.items():
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _histogram_lines(name: str, hist: Histogram, **labels: Any) -> list[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(hist.buckets, hist.counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+    lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {hist.total}')
+    lines.append(f"{name}_sum{_labels(**labels)} {hist.sum}")
+    lines.append(f"{name}_count{_labels(**labels)} {hist.total}")
+    return lines
+
+
+def _header(name: str, kind: str, help_text: str) -> list[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+def _runtime_lines() -> list[str]:
+    from .ai import _ai_inflight
+    from .ai_throttle import upstream_limiter, upstream_breaker
+    from .db import engine, read_engine, pool_status
+
+    lines = []
+    pools = [("primary", pool_status())]
+    if read_engine is not engine:
+        pools.append(("replica", pool_status(replica=True)))
+    for field, help_text in (
+        ("size", "Configured pool size"),
+        ("checked_out", "Connections in use"),
+        ("checked_in", "Idle connections in the pool"),
+        ("overflow", "Connections beyond pool_size (negative: not yet opened)"),
+        ("utilization", "checked_out / (size + max_overflow)"),
+        ("pings", "Pre-pings of idle connections"),
+        ("stale_disconnects", "Pooled connections found dead on checkout"),
+    ):
+        name = f"db_pool_{field}"
+        rows = [(pool, status[field]) for pool, status in pools if field in status]
+        if rows:
+            lines += _header(name, "counter" if field in ("pings", "stale_disconnects") else "gauge", help_text)
+            lines += [f"{name}{_labels(pool=pool)} {value}" for pool, value in rows]
+
+    lines += _header("ai_limiter_available", "gauge", "Tokens left in the shared OpenAI rate limit buckets")
+    lines.append(f'ai_limiter_available{_labels(bucket="requests")} {upstream_limiter.requests.available():.2f}')
+    lines.append(f'ai_limiter_available{_labels(bucket="tokens")} {upstream_limiter.tokens.available():.2f}')
+    lines += _header("ai_circuit_state", "gauge", "OpenAI circuit breaker (0 closed, 1 half open, 2 open)")
+    lines.append(f"ai_circuit_state {({'closed': 0, 'half_open': 1, 'open': 2}).get(upstream_breaker.state, 0)}")
+    lines += _header("ai_singleflight_started_total", "counter", "LLM calls started")
+    lines.append(f"ai_singleflight_started_total {_ai_inflight.started}")
+    lines += _header("ai_singleflight_coalesced_total", "counter", "Callers that joined an identical in-flight LLM call")
+    lines.append(f"ai_singleflight_coalesced_total {_ai_inflight.coalesced}")
+    lines += _header("ai_singleflight_in_flight", "gauge", "Distinct LLM calls in flight")
+    lines.append(f"ai_singleflight_in_flight {_ai_inflight.in_flight}")
+    lines += _ai_output_lines()
+    lines += _inference_lines()
+    lines += _ml_routing_lines()
+    lines += _distilled_lines()
+    return lines
+
+
+def _ai_output_lines() -> list[str]:
+    from .ai_output import output_stats
+
+    lines = _header(
+        "ai_output_total", "counter",
+        "LLM answers by parse / schema outcome (parsed, repaired, unparseable, valid, reask_fixed, invalid)",
+    )
+    lines += [f"ai_output_total{_labels(result=result)} {n}" for result, n in sorted(output_stats.items())]
+    return lines
+
+
+def _inference_lines() -> list[str]:
+    from .inference import inference_service as svc
+
+    lines = _header("inference_requests_total", "counter", "Single predictions queued")
+    lines.append(f"inference_requests_total {svc.requests}")
+    lines += _header("inference_queue_depth", "gauge", "Predictions waiting for a batch")
+    lines.append(f"inference_queue_depth {svc.queue_depth}")
+    lines += _header("inference_batches_in_flight", "gauge", "Batches running in the worker pool")
+    lines.append(f"inference_batches_in_flight {svc.in_flight_batches}")
+    lines += _header("inference_batches_failed_total", "counter", "Batches that raised")
+    lines.append(f"inference_batches_failed_total {svc.failed_batches}")
+    lines += _header("inference_batch_size", "histogram", "Predictions per batch")
+    lines += _histogram_lines("inference_batch_size", svc.batch_sizes)
+    lines += _header("inference_queue_wait_seconds", "histogram", "Time from enqueue to batch start")
+    lines += _histogram_lines("inference_queue_wait_seconds", svc.queue_wait)
+    lines += _header("inference_batch_duration_seconds", "histogram", "Batch latency in the worker pool")
+    lines += _histogram_lines("inference_batch_duration_seconds", svc.batch_seconds)
+    lines += _prediction_cache_lines()
+    return lines
+
+
+def _prediction_cache_lines() -> list[str]:
+    from .prediction_cache import prediction_cache as cache
+
+    lines = []
+    for name, value, help_text in (
+        ("prediction_cache_hits_total", cache.hits, "Predictions answered from the cache"),
+        ("prediction_cache_misses_total", cache.misses, "Predictions that went to the model"),
+        ("prediction_cache_evictions_total", cache.evictions, "Entries dropped by the LRU bound"),
+        ("prediction_cache_invalidations_total", cache.invalidations, "Cache flushes after a model version swap"),
+    ):
+        lines += _header(name, "counter", help_text)
+        lines.append(f"{name} {value}")
+    lines += _header("prediction_cache_entries", "gauge", "Cached predictions")
+    lines.append(f"prediction_cache_entries {len(cache)}")
+    ratio = cache.hit_ratio()
+    if ratio is not None:
+        lines += _header("prediction_cache_hit_ratio", "gauge", "Hits / lookups since start")
+        lines.append(f"prediction_cache_hit_ratio {ratio:.4f}")
+    return lines
+
+
+def _ml_routing_lines() -> list[str]:
+    from .config import get_settings
+    from .ml_routing import routing_stats as stats
+
+    lines = _header("ml_routing_decisions_total", "counter", "Classifications by who answered (app.ml_routing)")
+    lines += [
+        f"ml_routing_decisions_total{_labels(decision=decision)} {n}"
+        for decision, n in sorted(stats.decisions.items())
+    ]
+    lines += _header(
+        "ml_routing_comparisons_total", "counter",
+        "Local predictions compared with the LLM answer, by confidence bucket (lower bound)",
+    )
+    lines += [
+        f"ml_routing_comparisons_total{_labels(confidence=bucket, agree=str(agree).lower())} {n}"
+        for (bucket, agree), n in sorted(stats.comparisons.items())
+    ]
+    rate, _ = stats.agreement(get_settings().ml_routing_threshold)
+    if rate is not None:
+        lines += _header("ml_routing_agreement_ratio", "gauge", "Recent agreement with the LLM at the routing threshold")
+        lines.append(f"ml_routing_agreement_ratio {rate:.4f}")
+    return lines
+
+
+def _distilled_lines() -> list[str]:
+    from .distilled import prediction_counts
+
+    lines = _header("distilled_predictions_total", "counter", "Local risk / bug severity predictions (app.distilled)")
+    lines += [
+        f"distilled_predictions_total{_labels(task=task, confident=str(confident).lower())} {n}"
+        for (task, confident), n in sorted(prediction_counts.items())
+    ]
+    return lines
+
+
+def render_prometheus() -> str:
+    with registry._lock:
+        routes = sorted(registry.routes.items())
+        requests = sorted(registry.requests.items())
+        llm_calls = sorted(registry.llm_calls.items())
+
+        lines = _header("http_requests_total", "counter", "Requests by route and status")
+        lines += [
+            f"http_requests_total{_labels(method=method, route=route, status=status)} {n}"
+            for (method, route, status), n in requests
+        ]
+        lines += _header("http_request_duration_seconds", "histogram", "Request latency")
+        for (method, route), s in routes:
+            lines += _histogram_lines("http_request_duration_seconds", s.latency, method=method, route=route)
+        lines += _header("http_request_sql_statements", "histogram", "SQL statements per request")
+        for (method, route), s in routes:
+            lines += _histogram_lines("http_request_sql_statements", s.sql_statements, method=method, route=route)
+        for name, attr, help_text in (
+            ("http_request_sql_seconds_total", "sql_seconds", "Time spent in SQL"),
+            ("http_request_llm_seconds_total", "llm_seconds", "Time spent waiting on the LLM"),
+            ("http_response_size_bytes_total", "response_bytes", "Response body bytes"),
+        ):
+            lines += _header(name, "counter", help_text)
+            lines += [
+                f"{name}{_labels(method=method, route=route)} {getattr(s, attr)}" for (method, route), s in routes
+            ]
+        lines += _header("llm_call_duration_seconds", "histogram", "Upstream LLM round trips")
+        for outcome, hist in llm_calls:
+            lines += _histogram_lines("llm_call_duration_seconds", hist, outcome=outcome)
+
+    lines += _runtime_lines()
+    return "\n".join(lines) + "\n"
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    token = get_settings().metrics_token
+    if token and request.headers.get("authorization", "") != f"Bearer {token}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,7 +1,8 @@
 import os
-import joblib
 from pathlib import Path
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, List
+
+from .config import get_settings
 
 MODELS_DIR = Path("models")
 
@@ -10,23 +11,118 @@ def _load_latest(prefix: str) -> Any:
     p = MODELS_DIR / f"{prefix}_latest.joblib"
     if not p.exists():
         raise FileNotFoundError(f"Missing model file: {p}. Run train_model.py first.")
+    # joblib (and the sklearn classes it unpickles) only load on first prediction
+    import joblib
+
     return joblib.load(p)
 
+_bundle: Any = None
+_bundle_mtime: float = -1.0
+
+
 def load_bundle():
-    clf = _load_latest("category_classifier")
-    vectorizer = _load_latest("vectorizer")
-    le = _load_latest("label_encoder")
-    return clf, vectorizer, le
+    """
+    Classifier, vectorizer and label encoder, unpickled once per process.
+
+    Reloaded when train_model.py writes a new category_classifier_latest.joblib.
+    """
+    global _bundle, _bundle_mtime
+    p = MODELS_DIR / "category_classifier_latest.joblib"
+    mtime = p.stat().st_mtime if p.exists() else -1.0
+    if _bundle is None or mtime != _bundle_mtime:
+        clf = _load_latest("category_classifier")
+        vectorizer = _load_latest("vectorizer")
+        le = _load_latest("label_encoder")
+        _bundle, _bundle_mtime = (clf, vectorizer, le), mtime
+    return _bundle
+
+
+_flat: Any = None
+_flat_mtime: float = -1.0
+
+
+def load_flat_model() -> Any:
+    """
+    Memory-mapped model from models/category_flat_latest (app.flat_model),
+    shared by all processes through the page cache.
+
+    None when ML_MODEL_FORMAT=joblib or (auto) when no flat export exists.
+    """
+    global _flat, _flat_mtime
+    fmt = get_settings().ml_model_format
+    if fmt == "joblib":
+        return None
+    from .flat_model import LATEST_DIR, MANIFEST, FlatModel
+
+    manifest = MODELS_DIR / LATEST_DIR / MANIFEST
+    if not manifest.exists():
+        if fmt == "flat":
+            raise FileNotFoundError(f"Missing model file: {manifest}. Run train_model.py first.")
+        return None
+    mtime = manifest.stat().st_mtime
+    if _flat is None or mtime != _flat_mtime:
+        _flat, _flat_mtime = FlatModel.load(manifest.parent), mtime
+    return _flat
+
+
+def load_model() -> Any:
+    """Load whichever model predictions will use (warm-up)."""
+    return load_flat_model() or load_bundle()
+
+
+def model_version() -> str:
+    """Registry version of the promoted model (models/registry.json), "unversioned" for older exports."""
+    from .model_registry import current_version
+
+    return current_version(MODELS_DIR) or "unversioned"
+
+
+def model_fingerprint() -> str:
+    """
+    Identity of the model predictions currently use: registry version plus the
+    mtime of the files app.ml loads (covers exports made outside the registry).
+    """
+    paths = (MODELS_DIR / "category_classifier_latest.joblib", MODELS_DIR / "category_flat_latest" / "manifest.json")
+    mtimes = ",".join(str(p.stat().st_mtime_ns) if p.exists() else "-" for p in paths)
+    return f"{model_version()}@{mtimes}"
+
+
+def predict_categories(texts: List[str]) -> List[Tuple[str, float, Dict[str, float]]]:
+    """Batched predict_category: one sparse matrix, one predict_proba call."""
+    if not texts:
+        return []
+    flat = load_flat_model()
+    if flat is not None:
+        probs = flat.predict_proba(texts)
+        classes = flat.classes
+    else:
+        clf, vectorizer, le = load_bundle()
+        probs = clf.predict_proba(vectorizer.transform(texts))
+        classes = [str(c) for c in le.classes_]
+
+    best = probs.argmax(axis=1)
+    out = []
+    for row, best_idx in zip(probs, best):
+        all_probs = {classes[i]: float(row[i]) for i in range(len(classes))}
+        out.append((classes[best_idx], float(row[best_idx]), all_probs))
+    return out
+
 
 def predict_category(text: str) -> Tuple[str, float, Dict[str, float]]:
-    clf, vectorizer, le = load_bundle()
-    X = vectorizer.transform([text])
-    probs = clf.predict_proba(X)[0]
-    classes = le.classes_
+    # Synchronous; async handlers go through app.inference (batched, off the event loop)
+    return predict_categories([text])[0]
+
+
+def explain_categories(texts: List[str], top_k: int = 5) -> List[Dict[str, Any]]:
+    """
+    Per-text prediction with its top contributing n-grams (FlatModel.explain).
 
-    best_idx = int(probs.argmax())
-    pred = str(classes[best_idx])
-    conf = float(probs[best_idx])
+    Explanations read the model parameters from the flat export, which the
+    registry keeps in sync with the joblib files - also with ML_MODEL_FORMAT=joblib.
+    """
+    from .flat_model import load_latest
 
-    all_probs = {str(classes[i]): float(probs[i]) for i in range(len(classes))}
-    return pred, conf, all_probs
+    flat = load_flat_model() or load_latest(MODELS_DIR)
+    if flat is None:
+        raise FileNotFoundError("Explanations need the flat model export: run python -m app.flat_model export")
+    return flat.explain(texts, top_k=top_k)
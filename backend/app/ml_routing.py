@@ -0,0 +1,137 @@
+"""
+ML-first routing for requirement classification
+
+`generate_classification_and_store` used to send every requirement to the
+LLM. The local category classifier (app.ml via app.inference) answers in
+milliseconds and reports a confidence, so:
+
+    ML_ROUTING_MODE=on       confident local predictions (>= ML_ROUTING_THRESHOLD)
+                             are stored directly, with model_name "local:<version>";
+                             only uncertain requirements escalate to the LLM
+    ML_ROUTING_MODE=shadow   the LLM still answers every request; the local
+                             prediction is computed alongside and its agreement
+                             with the LLM is logged ([ML ROUTE]) and exported on
+                             /metrics - use it to pick the threshold
+    ML_ROUTING_MODE=off      LLM only, no local prediction
+
+The risk level comes from the distilled risk model (app.distilled) when one is
+trained - an unsure risk prediction escalates to the LLM as well - and keeps
+the "medium" default otherwise. Requests that ask for recommendations always
+go to the LLM.
+
+Usage example:
+    from app.ml_routing import local_decision, routing_stats
+
+    decision = await local_decision(requirement_text)
+    if decision is not None and decision.confident:
+        ...  # store decision.category / decision.confidence, skip the LLM
+    routing_stats.record_comparison(decision, llm_category)
+"""
+
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Optional
+
+from .config import get_settings
+from .training_data import LOCAL_MODEL_PREFIX, normalize_category
+
+# Classifier classes -> the vocabulary ClassifyRequirement rows use (LLM prompt categories)
+CLASSIFICATION_CATEGORIES = {
+    "Functional": "functional",
+    "Maintainability & Security": "security",
+    "Performance": "performance",
+    "Reliability & Safety": "reliability",
+    "Usability": "usability",
+}
+
+# Lower bounds of the confidence buckets exported on /metrics
+CONFIDENCE_BUCKETS = (0.0, 0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95)
+
+
+@dataclass
+class LocalDecision:
+    label: str                  # classifier class, e.g. "Maintainability & Security"
+    category: str               # ClassifyRequirement vocabulary, e.g. "security"
+    confidence: float
+    probabilities: dict[str, float]
+    model_name: str
+    confident: bool
+
+    def raw_json(self) -> dict:
+        return {
+            "source": "local",
+            "model": self.model_name,
+            "label": self.label,
+            "category": self.category,
+            "confidence": self.confidence,
+            "probabilities": self.probabilities,
+        }
+
+
+def local_model_name() -> str:
+    from .ml import model_version
+
+    return f"{LOCAL_MODEL_PREFIX}{model_version()}"
+
+
+def confidence_bucket(confidence: float) -> float:
+    return max(b for b in CONFIDENCE_BUCKETS if confidence >= b)
+
+
+class RoutingStats:
+    def __init__(self, window: int = 10000):
+        self.decisions: Counter = Counter()          # local | llm | llm_required | llm_risk | no_model
+        self.comparisons: Counter = Counter()        # (bucket, agree) -> n
+        self._recent: deque = deque(maxlen=window)   # (confidence, agree)
+
+    def record_decision(self, decision: str) -> None:
+        self.decisions[decision] += 1
+
+    def record_comparison(self, local: Optional[LocalDecision], llm_category: Optional[str]) -> None:
+        if local is None:
+            return
+        agree = normalize_category(llm_category) == local.label
+        self.comparisons[(confidence_bucket(local.confidence), agree)] += 1
+        self._recent.append((local.confidence, agree))
+
+        threshold = get_settings().ml_routing_threshold
+        rate, n = self.agreement(threshold)
+        rate_text = f"{rate:.1%}" if rate is not None else "n/a"
+        print(
+            f"[ML ROUTE] local={local.label} ({local.confidence:.2f}) llm={llm_category} "
+            f"{'agree' if agree else 'DISAGREE'} | agreement at >= {threshold:.2f}: {rate_text} (n={n})"
+        )
+
+    def agreement(self, threshold: float) -> tuple[Optional[float], int]:
+        """Agreement with the LLM over recent comparisons with confidence >= threshold."""
+        hits = [agree for confidence, agree in self._recent if confidence >= threshold]
+        if not hits:
+            return None, 0
+        return sum(hits) / len(hits), len(hits)
+
+
+routing_stats = RoutingStats()
+
+
+async def local_decision(text: str) -> Optional[LocalDecision]:
+    """Local prediction for `text`, or None when there is no usable model."""
+    from .inference import inference_service
+
+    if not text:
+        return None
+    try:
+        label, confidence, probabilities = await inference_service.predict(text)
+    except Exception as e:
+        # No model trained / failed batch: routing falls back to the LLM
+        print(f"[ML ROUTE] local prediction unavailable: {e}")
+        routing_stats.record_decision("no_model")
+        return None
+    category = CLASSIFICATION_CATEGORIES.get(label, label.lower())
+    return LocalDecision(
+        label=label,
+        category=category,
+        confidence=confidence,
+        probabilities=probabilities,
+        model_name=local_model_name(),
+        confident=confidence >= get_settings().ml_routing_threshold,
+    )
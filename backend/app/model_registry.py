@@ -0,0 +1,183 @@
+"""
+Model registry: versioned category classifiers and which one is live
+
+Every trained model is saved as a version (timestamp) using the file names
+train_model.py always used, and models/registry.json records where each
+version came from and which one is promoted:
+
+    models/
+        category_classifier_<version>.joblib
+        vectorizer_<version>.joblib
+        label_encoder_<version>.joblib
+        category_classifier_latest.joblib ...   the promoted version (joblib)
+        category_flat_latest/                   the promoted version (app.flat_model)
+        registry.json
+
+    {
+      "current": "20260301_020000",
+      "previous": "20260228_020000",
+      "versions": {
+        "20260301_020000": {"kind": "incremental", "parent": "20260228_020000",
+                            "model": "SGDClassifier", "n_samples": 1800,
+                            "metrics": {"holdout_accuracy": 0.91, ...},
+                            "watermark": {"classify_requirements": 52211, ...},
+                            "created_at": "...", "promoted_at": "..."}
+      }
+    }
+
+Promoting copies a version onto the *_latest files (and re-exports the flat
+model); API workers pick it up on their next prediction, because app.ml
+reloads when those files change.
+
+Usage example:
+    from app.model_registry import save_version, promote, rollback, current_version
+
+    version = save_version(clf, vectorizer, label_encoder, kind="full", metrics={"holdout_accuracy": 0.9})
+    promote(version)
+    rollback()   # back to the previously promoted version
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+MODELS_DIR = Path("models")
+REGISTRY_FILE = "registry.json"
+ARTIFACTS = ("category_classifier", "vectorizer", "label_encoder")
+FLAT_LATEST = "category_flat_latest"
+
+_cache: dict[Path, tuple[float, dict]] = {}
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _read_registry(models_dir: Path) -> dict:
+    path = Path(models_dir) / REGISTRY_FILE
+    if not path.exists():
+        return {"current": None, "previous": None, "versions": {}}
+    # Read on every prediction path (model name / cache keys): only re-parse when the file changed
+    mtime = path.stat().st_mtime
+    cached = _cache.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, json.loads(path.read_text(encoding="utf-8")))
+        _cache[path] = cached
+    return cached[1]
+
+
+def load_registry(models_dir: Path = MODELS_DIR) -> dict:
+    # A copy: callers edit it before _write_registry
+    return json.loads(json.dumps(_read_registry(models_dir)))
+
+
+def _write_registry(registry: dict, models_dir: Path) -> None:
+    path = Path(models_dir) / REGISTRY_FILE
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(registry, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def current_version(models_dir: Path = MODELS_DIR) -> Optional[str]:
+    return _read_registry(models_dir).get("current")
+
+
+def _artifact(models_dir: Path, prefix: str, version: str) -> Path:
+    return Path(models_dir) / f"{prefix}_{version}.joblib"
+
+
+def save_version(
+    clf: Any,
+    vectorizer: Any,
+    label_encoder: Any,
+    kind: str,
+    parent: Optional[str] = None,
+    metrics: Optional[dict] = None,
+    n_samples: Optional[int] = None,
+    watermark: Optional[dict] = None,
+    version: Optional[str] = None,
+    models_dir: Path = MODELS_DIR,
+) -> str:
+    """Write the three joblib files for a new version and record it (not promoted yet)."""
+    import joblib
+
+    models_dir = Path(models_dir)
+    models_dir.mkdir(parents=True, exist_ok=True)
+    version = version or datetime.now().strftime("%Y%m%d_%H%M%S")
+    base, n = version, 1
+    while _artifact(models_dir, ARTIFACTS[0], version).exists():
+        n += 1
+        version = f"{base}_{n}"
+
+    for prefix, obj in zip(ARTIFACTS, (clf, vectorizer, label_encoder)):
+        joblib.dump(obj, _artifact(models_dir, prefix, version))
+
+    registry = load_registry(models_dir)
+    registry["versions"][version] = {
+        "kind": kind,
+        "parent": parent,
+        "model": type(clf).__name__,
+        "n_samples": n_samples,
+        "metrics": metrics or {},
+        "watermark": watermark or {},
+        "created_at": _utc_now(),
+        "promoted_at": None,
+    }
+    _write_registry(registry, models_dir)
+    return version
+
+
+def load_version(version: str, models_dir: Path = MODELS_DIR) -> tuple[Any, Any, Any]:
+    import joblib
+
+    paths = [_artifact(models_dir, prefix, version) for prefix in ARTIFACTS]
+    missing = [str(p) for p in paths if not p.exists()]
+    if missing:
+        raise FileNotFoundError(f"Model version {version} is missing {missing}")
+    clf, vectorizer, label_encoder = (joblib.load(p) for p in paths)
+    return clf, vectorizer, label_encoder
+
+
+def promote(version: str, models_dir: Path = MODELS_DIR) -> None:
+    """Make `version` the model the API serves."""
+    from .flat_model import export_flat_model
+
+    models_dir = Path(models_dir)
+    registry = load_registry(models_dir)
+    if version not in registry["versions"]:
+        raise KeyError(f"Unknown model version {version}")
+    clf, vectorizer, label_encoder = load_version(version, models_dir)
+
+    for prefix in ARTIFACTS:
+        # Copy then rename: a worker reloading mid-promotion never reads a half-written file
+        latest = models_dir / f"{prefix}_latest.joblib"
+        tmp = models_dir / f"{prefix}_latest.joblib.tmp"
+        shutil.copyfile(_artifact(models_dir, prefix, version), tmp)
+        os.replace(tmp, latest)
+
+    try:
+        export_flat_model(clf, vectorizer, label_encoder, models_dir / FLAT_LATEST,
+                          source=f"category_classifier_{version}.joblib")
+    except ValueError as e:
+        # A stale flat export would keep serving the old model; fall back to joblib instead
+        print(f"[MODEL] flat export skipped for {version} ({e}); serving joblib")
+        shutil.rmtree(models_dir / FLAT_LATEST, ignore_errors=True)
+
+    if registry.get("current") != version:
+        registry["previous"] = registry.get("current")
+    registry["current"] = version
+    registry["versions"][version]["promoted_at"] = _utc_now()
+    _write_registry(registry, models_dir)
+    print(f"[MODEL] promoted {version}")
+
+
+def rollback(models_dir: Path = MODELS_DIR) -> str:
+    registry = load_registry(models_dir)
+    previous = registry.get("previous")
+    if not previous:
+        raise ValueError("No previously promoted version to roll back to")
+    promote(previous, models_dir)
+    return previous
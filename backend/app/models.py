@@ -1,10 +1,13 @@
-from sqlalchemy import Boolean, String, Text, DateTime, UniqueConstraint, func, Integer, ForeignKey,Enum, Index, CheckConstraint
+from sqlalchemy import Boolean, String, Text, DateTime, UniqueConstraint, func, Integer, ForeignKey,Enum, Index, CheckConstraint, JSON
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 from typing import Any
 from .db import Base
 
+# JSONB on Postgres, plain JSON on SQLite (local runs, benchmarks)
+JSONB_TYPE = JSON().with_variant(JSONB(), "postgresql")
+
 # =========================
 # ORGANIZATIONS
 # =========================
@@ -329,7 +332,7 @@ class RequirementAnalysis(Base):
     recommendations: Mapped[str | None] = mapped_column(Text, nullable=True)
 
     # ⭐ store full AI output here (recommended)
-    raw_json: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    raw_json: Mapped[dict | None] = mapped_column(JSONB_TYPE, nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
@@ -382,6 +385,7 @@ class TestCase(Base):
 
     executions = relationship("TestExecution", back_populates="test_case", cascade="all, delete-orphan")
     bug_reports = relationship("BugReport",back_populates="test_case",cascade="all, delete-orphan",)
+    stats = relationship("TestCaseStats", back_populates="test_case", uselist=False, cascade="all, delete-orphan")
 class TestRun(Base):
     __tablename__ = "test_runs"
 
@@ -471,7 +475,7 @@ class TestExecution(Base):
     )
 
     # ✅ OS/browser/device/appVersion/etc
-    environment_json: Mapped[dict[str, Any] | None] = mapped_column(JSONB, nullable=True)
+    environment_json: Mapped[dict[str, Any] | None] = mapped_column(JSONB_TYPE, nullable=True)
 
     build_number: Mapped[str | None] = mapped_column(String(50), nullable=True)
     git_sha: Mapped[str | None] = mapped_column(String(64), nullable=True)
@@ -483,7 +487,7 @@ class TestExecution(Base):
     notes: Mapped[str | None] = mapped_column(Text, nullable=True)
 
     # ✅ links to logs/screenshots/videos etc
-    artifacts: Mapped[dict[str, Any] | None] = mapped_column(JSONB, nullable=True)
+    artifacts: Mapped[dict[str, Any] | None] = mapped_column(JSONB_TYPE, nullable=True)
 
     attempt: Mapped[int] = mapped_column(
         Integer,
@@ -514,6 +518,51 @@ class TestExecution(Base):
     # ✅ IMPORTANT: remove delete-orphan if BugReport.test_execution_id is nullable + SET NULL
     bug_reports = relationship("BugReport", back_populates="test_execution")
     bug_retests = relationship("BugRetest", back_populates="test_execution", cascade="all, delete-orphan")
+
+
+# =========================
+# TEST CASE STATS (precomputed from executions)
+# =========================
+class TestCaseStats(Base):
+    """
+    One row per test case, updated incrementally whenever an execution of
+    that case finishes, so prioritization never has to scan test_executions.
+    """
+    __tablename__ = "test_case_stats"
+
+    test_case_id: Mapped[int] = mapped_column(
+        ForeignKey("test_cases.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    project_id: Mapped[int] = mapped_column(
+        ForeignKey("projects.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+
+    run_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    fail_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # exponentially weighted failure rate, recent runs weigh most
+    failure_ewma: Mapped[float | None] = mapped_column(nullable=True)
+
+    last_run_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_result: Mapped[str | None] = mapped_column(String(20), nullable=True)
+
+    # last N durations in seconds (newest last) and statistics over them
+    recent_durations: Mapped[list[float] | None] = mapped_column(JSONB_TYPE, nullable=True)
+    median_duration_seconds: Mapped[float | None] = mapped_column(nullable=True)  # p50
+    p95_duration_seconds: Mapped[float | None] = mapped_column(nullable=True)
+    # exponentially weighted duration, follows speed-ups/slow-downs quickly
+    duration_ewma_seconds: Mapped[float | None] = mapped_column(nullable=True)
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+    test_case = relationship("TestCase", back_populates="stats")
 class ClassifyRequirement(Base):
     __tablename__ = "classify_requirements"
 
@@ -539,7 +588,7 @@ class ClassifyRequirement(Base):
     summary: Mapped[str | None] = mapped_column(Text, nullable=True)
     reasoning: Mapped[str | None] = mapped_column(Text, nullable=True)
     recommendations: Mapped[str | None] = mapped_column(Text, nullable=True)  # ✅ add
-    raw_json: Mapped[dict | None] = mapped_column(JSONB, nullable=True)       # ✅ add (recommended)
+    raw_json: Mapped[dict | None] = mapped_column(JSONB_TYPE, nullable=True)       # ✅ add (recommended)
 
     model_name: Mapped[str | None] = mapped_column(String(100), nullable=True)
 
@@ -631,7 +680,7 @@ class BugReport(Base):
     environment: Mapped[str | None] = mapped_column(String(100), nullable=True)
 
     # ✅ AI report data (optional)
-    ai_report_json: Mapped[dict[str, Any] | None] = mapped_column(JSONB, nullable=True)
+    ai_report_json: Mapped[dict[str, Any] | None] = mapped_column(JSONB_TYPE, nullable=True)
     ai_report_raw: Mapped[str | None] = mapped_column(Text, nullable=True)
     ai_reported_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
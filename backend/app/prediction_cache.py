@@ -0,0 +1,109 @@
+"""
+LRU + TTL cache for category predictions
+
+The same requirement text is predicted over and over: /api/requirements/predict
+runs on every pause while a user types, and create_requirement_analysis
+predicts the description again. The cache sits in front of the inference
+service (app.inference) so repeats never reach the batch queue:
+
+    key      (model fingerprint, hash of the normalized text)
+    bound    PREDICTION_CACHE_SIZE entries, least recently used evicted first
+    expiry   PREDICTION_CACHE_TTL_SECONDS after the prediction was made
+
+Text is normalized the way the vectorizer sees it (lowercase, whitespace
+collapsed), so "Reset  password" and "reset password" share an entry. The
+fingerprint (app.ml.model_fingerprint) changes when the registry promotes
+or rolls back a version, so entries of the old model stop matching and the
+whole cache is dropped on the first lookup after the swap. The inference
+service re-reads the fingerprint at most once per second
+(FINGERPRINT_REFRESH_SECONDS), so lookups themselves touch no files.
+
+Hits, misses, evictions and the hit ratio are exported on GET /metrics.
+
+Usage example:
+    from app.prediction_cache import prediction_cache
+
+    cached = prediction_cache.get(fingerprint, text)   # always get() before put()
+    if cached is None:
+        cached = predict(text)
+        prediction_cache.put(fingerprint, text, cached)
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from .config import get_settings
+from .singleflight import make_key
+
+
+def normalize_text(text: str) -> str:
+    # Matches the TF-IDF analyzer: case and runs of whitespace never change a prediction
+    return " ".join(text.split()).lower()
+
+
+class PredictionCache:
+    def __init__(self, max_size: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        settings = get_settings()
+        self.max_size = settings.prediction_cache_size if max_size is None else max_size
+        self.ttl = settings.prediction_cache_ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries: OrderedDict[tuple[str, str], tuple[float, Any]] = OrderedDict()
+        self._fingerprint: Optional[str] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def hit_ratio(self) -> Optional[float]:
+        total = self.hits + self.misses
+        return self.hits / total if total else None
+
+    def _check_fingerprint(self, fingerprint: str) -> None:
+        if fingerprint != self._fingerprint:
+            if self._entries:
+                # New model version: every entry belongs to the old one
+                print(f"[MODEL] prediction cache cleared ({len(self._entries)} entries of {self._fingerprint})")
+                self._entries.clear()
+                self.invalidations += 1
+            self._fingerprint = fingerprint
+
+    def get(self, fingerprint: str, text: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        self._check_fingerprint(fingerprint)
+        key = (fingerprint, make_key(normalize_text(text)))
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, fingerprint: str, text: str, value: Any) -> None:
+        # A prediction started before a model swap finishes after it: never cache the old model's answer
+        if not self.enabled or fingerprint != self._fingerprint:
+            return
+        key = (fingerprint, make_key(normalize_text(text)))
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._fingerprint = None
+
+
+prediction_cache = PredictionCache()
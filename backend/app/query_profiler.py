@@ -0,0 +1,201 @@
+"""
+Query profiler: slow-query log and N+1 detection
+
+Hooks SQLAlchemy cursor events on the app engines and
+
+    - logs every statement slower than SLOW_QUERY_MS, with the SHAPE of its
+      bound parameters (names and types, never the values)
+    - per request, flags statements that ran more than N_PLUS_ONE_THRESHOLD
+      times with the same shape (the classic lazy-load-in-a-loop)
+
+Statements are grouped by shape: whitespace is collapsed and IN lists of
+any length look the same, so `WHERE id IN (1, 2)` and `WHERE id IN (7, 8, 9)`
+count as one statement.
+
+The same profiler backs the `query_profiler` pytest fixture (backend/conftest.py):
+a test exercises an endpoint and ends with
+query_profiler.assert_budget(max_queries=..., max_repeats=...).
+
+Usage example (anywhere else):
+    from app.query_profiler import profile_queries
+
+    with profile_queries() as prof:
+        await load_timeline(db, bug_id)
+    print(prof.report())
+"""
+
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .config import get_settings
+
+_WS_RE = re.compile(r"\s+")
+# IN (?, ?, ?) / IN ($1, $2) / IN (%(id_1)s, ...) -> IN (...)
+_IN_LIST_RE = re.compile(r"\bIN \((?:[^()]|\([^()]*\))*\)", re.IGNORECASE)
+# expanding bind parameters that were not rendered yet
+_POSTCOMPILE_RE = re.compile(r"\(?__\[POSTCOMPILE_\w+\]\)?")
+
+SHAPE_MAX_LEN = 300
+
+
+def statement_shape(statement: str) -> str:
+    shape = _WS_RE.sub(" ", statement).strip()
+    shape = _POSTCOMPILE_RE.sub("(...)", shape)
+    return _IN_LIST_RE.sub("IN (...)", shape)
+
+
+def parameter_shape(parameters: Any, executemany: bool = False) -> str:
+    """`{'project_id': int, 'title': str}` style description of bound parameters."""
+    if executemany and isinstance(parameters, (list, tuple)) and parameters:
+        return f"{len(parameters)} x {parameter_shape(parameters[0])}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        names = [type(v).__name__ for v in parameters]
+        if len(names) > 10:
+            # long positional lists are almost always an expanded IN
+            common = Counter(names).most_common(1)[0][0]
+            return f"({len(names)} params, mostly {common})"
+        return "(" + ", ".join(names) + ")"
+    return type(parameters).__name__
+
+
+@dataclass
+class QueryProfile:
+    """Statements seen while a profiler was active."""
+    label: str = ""
+    count: int = 0
+    seconds: float = 0.0
+    by_statement: Counter = field(default_factory=Counter)
+    seconds_by_statement: dict[str, float] = field(default_factory=dict)
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.by_statement[statement] += 1
+        self.seconds_by_statement[statement] = self.seconds_by_statement.get(statement, 0.0) + seconds
+
+    def by_shape(self) -> Counter:
+        shapes: Counter = Counter()
+        for statement, n in self.by_statement.items():
+            shapes[statement_shape(statement)] += n
+        return shapes
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Statement shapes that ran more than `threshold` times, most frequent first."""
+        return [(shape, n) for shape, n in self.by_shape().most_common() if n > threshold]
+
+    def report(self, top: int = 10) -> str:
+        lines = [f"{self.count} statements, {self.seconds * 1000:.1f} ms total"]
+        for shape, n in self.by_shape().most_common(top):
+            lines.append(f"  {n:>4}x  {shape[:SHAPE_MAX_LEN]}")
+        return "\n".join(lines)
+
+    def assert_budget(self, max_queries: Optional[int] = None, max_repeats: Optional[int] = None) -> None:
+        """
+        Fail if more than `max_queries` statements ran, or if any single
+        statement shape ran more than `max_repeats` times (N+1).
+        """
+        problems = []
+        if max_queries is not None and self.count > max_queries:
+            problems.append(f"ran {self.count} statements, budget is {max_queries}")
+        if max_repeats is not None:
+            for shape, n in self.repeated(max_repeats):
+                problems.append(f"statement ran {n}x (max {max_repeats}): {shape[:SHAPE_MAX_LEN]}")
+        if problems:
+            raise AssertionError("Query budget exceeded:\n" + "\n".join(problems) + "\n" + self.report())
+
+    def reset(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+        self.by_statement.clear()
+        self.seconds_by_statement.clear()
+
+
+# All profilers active in the current context (a test fixture and the request middleware can nest)
+_active: ContextVar[tuple[QueryProfile, ...]] = ContextVar("query_profiles", default=())
+
+
+# =========================
+# ENGINE HOOKS
+# =========================
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("profiler_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["profiler_query_start"].pop()
+    for profile in _active.get():
+        profile.record(statement, seconds)
+
+    slow_ms = get_settings().slow_query_ms
+    if slow_ms and seconds * 1000 >= slow_ms:
+        print(
+            f"[SLOW SQL] {seconds * 1000:.1f} ms  {statement_shape(statement)[:SHAPE_MAX_LEN]}"
+            f"  params={parameter_shape(parameters, executemany)}"
+        )
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("profiler_query_start"):
+        conn.info["profiler_query_start"].pop()
+
+
+def install(engine: AsyncEngine) -> None:
+    sync_engine = engine.sync_engine
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+def install_app_engines() -> None:
+    from .db import engine, read_engine
+
+    install(engine)
+    if read_engine is not engine:
+        install(read_engine)
+
+
+@contextmanager
+def profile_queries(label: str = "") -> Iterator[QueryProfile]:
+    """Collect every statement run in this context (task / request) while the block is active."""
+    install_app_engines()
+    profile = QueryProfile(label=label)
+    token = _active.set(_active.get() + (profile,))
+    try:
+        yield profile
+    finally:
+        _active.reset(token)
+
+
+# =========================
+# PER-REQUEST N+1 DETECTION
+# =========================
+class QueryProfilerMiddleware:
+    """Logs requests that run the same statement shape more than N_PLUS_ONE_THRESHOLD times."""
+
+    def __init__(self, app: Any):
+        self.app = app
+        self.threshold = get_settings().n_plus_one_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.threshold:
+            await self.app(scope, receive, send)
+            return
+
+        with profile_queries(f"{scope['method']} {scope['path']}") as profile:
+            await self.app(scope, receive, send)
+
+        for shape, n in profile.repeated(self.threshold):
+            print(f"[N+1] {profile.label}: statement ran {n}x  {shape[:SHAPE_MAX_LEN]}")
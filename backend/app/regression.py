@@ -0,0 +1,296 @@
+"""
+Change-impact regression test selection
+
+Picks the test cases worth re-running for a change using only local data:
+
+    relevance   - how strongly a test case relates to the changed components:
+                  token overlap with the test case text, with its requirement's
+                  text, and past failures on the same branch / git sha
+    failure     - the case's failure EWMA from TestCaseStats, shrunk toward
+                  the prior while the case has few runs
+    cost        - median recorded duration from TestCaseStats
+
+Candidates are ranked by  relevance * failure * priority / cost  and picked
+greedily until the time budget is used up. No network calls, so a selection
+over a few thousand test cases takes milliseconds; the LLM is only asked for
+an optional narrative on top of the result.
+
+Usage example:
+    from app.regression import load_case_profiles, select_regression
+
+    profiles = await load_case_profiles(db, project_id, branch="feature/login")
+    selection = select_regression(
+        profiles,
+        changed_components=["auth/login_service.py"],
+        change_description="Lock account after 5 failed logins",
+        branch="feature/login",
+        time_budget_seconds=900,
+    )
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import get_settings
+from .models import Requirement, TestCase, TestCaseStats, TestExecution
+from .test_case_stats_utils import DEFAULT_DURATION_SECONDS, FAILING_RESULTS, FAILURE_EWMA_ALPHA, PRIOR_FAILURE_RATE
+
+# Failing executions older than this (per project, newest first) are ignored for branch / sha matches
+HISTORY_LIMIT = get_settings().regression_history_limit
+
+# Pseudo-runs of PRIOR_FAILURE_RATE mixed into the failure EWMA, so one lucky pass does not zero a case
+PRIOR_RUNS = 4.0
+# Runs an EWMA with FAILURE_EWMA_ALPHA effectively remembers
+EWMA_RUNS = 1.0 / FAILURE_EWMA_ALPHA
+
+PRIORITY_WEIGHTS = {"critical": 1.5, "high": 1.25, "medium": 1.0, "low": 0.8}
+
+# Requirement text is a weaker signal than the test case's own text
+REQUIREMENT_MATCH_WEIGHT = 0.7
+DESCRIPTION_MATCH_WEIGHT = 0.3
+# A failure on the same branch / sha makes a case relevant on its own
+BRANCH_FAILURE_RELEVANCE = 0.5
+SHA_FAILURE_RELEVANCE = 0.8
+
+_STOPWORDS = frozenset(
+    "the and for with from that this into when then than are was were has have not "
+    "should must can will all any src app lib test tests spec py js ts java".split()
+)
+_CAMEL = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+_WORD = re.compile(r"[A-Za-z0-9]+")
+
+
+def tokenize(text: Optional[str]) -> set[str]:
+    """Lower-case word set; splits paths, snake_case and camelCase (LoginService -> login, service)."""
+    if not text:
+        return set()
+    words = _WORD.findall(_CAMEL.sub(" ", text))
+    return {w.lower() for w in words if len(w) >= 3 and w.lower() not in _STOPWORDS}
+
+
+@dataclass
+class CaseProfile:
+    test_case_id: int
+    title: str
+    requirement_id: Optional[int]
+    priority: str
+    case_tokens: set[str]
+    requirement_tokens: set[str]
+    # from TestCaseStats
+    runs: int = 0
+    failures: int = 0
+    failure_ewma: Optional[float] = None
+    median_duration_seconds: Optional[float] = None
+    branch_failures: int = 0
+    sha_failures: int = 0
+
+    def failure_probability(self) -> float:
+        if not self.runs or self.failure_ewma is None:
+            return PRIOR_FAILURE_RATE
+        n = min(self.runs, EWMA_RUNS)
+        return (n * self.failure_ewma + PRIOR_RUNS * PRIOR_FAILURE_RATE) / (n + PRIOR_RUNS)
+
+    def estimated_seconds(self) -> float:
+        return self.median_duration_seconds or DEFAULT_DURATION_SECONDS
+
+
+@dataclass
+class RegressionCandidate:
+    profile: CaseProfile
+    relevance: float
+    failure_probability: float
+    estimated_seconds: float
+    score: float
+    reasons: list[str]
+
+    @property
+    def value_per_second(self) -> float:
+        return self.score / max(self.estimated_seconds, 1.0)
+
+
+@dataclass
+class RegressionSelection:
+    selected: list[RegressionCandidate]
+    candidates: int
+    not_selected: int
+    estimated_total_seconds: float
+
+
+# =========================
+# LOADING
+# =========================
+async def load_case_profiles(
+    db: AsyncSession,
+    project_id: int,
+    branch: Optional[str] = None,
+    git_shas: Iterable[str] = (),
+) -> list[CaseProfile]:
+    """Active test cases of the project with their text and stats, plus failures on the branch / shas."""
+    case_rows = (
+        await db.execute(
+            select(
+                TestCase.id, TestCase.title, TestCase.description, TestCase.steps,
+                TestCase.expected_result, TestCase.priority, TestCase.requirement_id,
+                Requirement.title.label("req_title"),
+                Requirement.description.label("req_description"),
+                Requirement.acceptance_criteria.label("req_acceptance"),
+                TestCaseStats.run_count, TestCaseStats.fail_count, TestCaseStats.failure_ewma,
+                TestCaseStats.median_duration_seconds,
+            )
+            .outerjoin(Requirement, Requirement.id == TestCase.requirement_id)
+            .outerjoin(TestCaseStats, TestCaseStats.test_case_id == TestCase.id)
+            .where(TestCase.project_id == project_id, TestCase.status == "active")
+        )
+    ).all()
+
+    profiles: dict[int, CaseProfile] = {}
+    for r in case_rows:
+        profiles[r.id] = CaseProfile(
+            test_case_id=r.id,
+            title=r.title,
+            requirement_id=r.requirement_id,
+            priority=(r.priority or "medium").lower(),
+            case_tokens=tokenize(" ".join(p for p in (r.title, r.description, r.steps, r.expected_result) if p)),
+            requirement_tokens=tokenize(" ".join(p for p in (r.req_title, r.req_description, r.req_acceptance) if p)),
+            runs=r.run_count or 0,
+            failures=r.fail_count or 0,
+            failure_ewma=r.failure_ewma,
+            median_duration_seconds=r.median_duration_seconds,
+        )
+    if not profiles:
+        return []
+
+    shas = {s for s in git_shas if s}
+    if not branch and not shas:
+        return list(profiles.values())
+
+    matches = []
+    if branch:
+        matches.append(TestExecution.branch == branch)
+    if shas:
+        matches.append(TestExecution.git_sha.in_(shas))
+    failures = await db.execute(
+        select(TestExecution.test_case_id, TestExecution.branch, TestExecution.git_sha)
+        .where(
+            TestExecution.project_id == project_id,
+            TestExecution.result.in_(FAILING_RESULTS),
+            or_(*matches),
+        )
+        .order_by(TestExecution.created_at.desc(), TestExecution.id.desc())
+        .limit(HISTORY_LIMIT)
+    )
+    for e in failures:
+        profile = profiles.get(e.test_case_id)
+        if profile is None:
+            continue
+        if branch and e.branch == branch:
+            profile.branch_failures += 1
+        if e.git_sha and e.git_sha in shas:
+            profile.sha_failures += 1
+
+    return list(profiles.values())
+
+
+# =========================
+# SELECTION
+# =========================
+def _overlap(needle: set[str], haystack: set[str]) -> float:
+    return len(needle & haystack) / len(needle) if needle else 0.0
+
+
+def _relevance(
+    profile: CaseProfile,
+    component_tokens: list[tuple[str, set[str]]],
+    description_tokens: set[str],
+    branch: Optional[str],
+) -> tuple[float, list[str]]:
+    relevance = 0.0
+    reasons: list[str] = []
+
+    for component, tokens in component_tokens:
+        direct = _overlap(tokens, profile.case_tokens)
+        via_req = REQUIREMENT_MATCH_WEIGHT * _overlap(tokens, profile.requirement_tokens)
+        best = max(direct, via_req)
+        if best > 0:
+            reasons.append(
+                f"matches component '{component}'" if direct >= via_req
+                else f"requirement matches component '{component}'"
+            )
+        relevance = max(relevance, best)
+
+    if description_tokens:
+        desc = DESCRIPTION_MATCH_WEIGHT * _overlap(description_tokens, profile.case_tokens | profile.requirement_tokens)
+        if desc > 0 and not reasons:
+            reasons.append("matches change description")
+        relevance = max(relevance, desc)
+
+    if profile.sha_failures:
+        relevance = max(relevance, SHA_FAILURE_RELEVANCE)
+        reasons.append(f"failed {profile.sha_failures}x at the given git sha")
+    if profile.branch_failures:
+        relevance = max(relevance, BRANCH_FAILURE_RELEVANCE)
+        reasons.append(f"failed {profile.branch_failures}x on branch '{branch}'")
+
+    return min(relevance, 1.0), reasons
+
+
+def select_regression(
+    profiles: list[CaseProfile],
+    changed_components: Optional[list[str]] = None,
+    change_description: Optional[str] = None,
+    branch: Optional[str] = None,
+    time_budget_seconds: Optional[float] = None,
+    max_tests: Optional[int] = None,
+) -> RegressionSelection:
+    """Rank relevant test cases and pick the best value-per-second subset that fits the budget."""
+    component_tokens = [(c, tokenize(c)) for c in (changed_components or []) if tokenize(c)]
+    description_tokens = tokenize(change_description)
+
+    candidates: list[RegressionCandidate] = []
+    for profile in profiles:
+        relevance, reasons = _relevance(profile, component_tokens, description_tokens, branch)
+        if relevance <= 0:
+            continue
+        p_fail = profile.failure_probability()
+        if profile.runs == 0:
+            reasons.append("never executed")
+        elif profile.failures:
+            reasons.append(f"failed {profile.failures} of {profile.runs} runs")
+        score = relevance * p_fail * PRIORITY_WEIGHTS.get(profile.priority, 1.0)
+        candidates.append(RegressionCandidate(
+            profile=profile,
+            relevance=round(relevance, 4),
+            failure_probability=round(p_fail, 4),
+            estimated_seconds=profile.estimated_seconds(),
+            score=score,
+            reasons=reasons,
+        ))
+
+    if time_budget_seconds is None:
+        ranked = sorted(candidates, key=lambda c: c.score, reverse=True)
+    else:
+        ranked = sorted(candidates, key=lambda c: c.value_per_second, reverse=True)
+
+    selected: list[RegressionCandidate] = []
+    used = 0.0
+    for cand in ranked:
+        if max_tests is not None and len(selected) >= max_tests:
+            break
+        if time_budget_seconds is not None and used + cand.estimated_seconds > time_budget_seconds:
+            # keep scanning: a cheaper, lower-ranked case may still fit
+            continue
+        selected.append(cand)
+        used += cand.estimated_seconds
+
+    # Run order: most likely to catch a regression first
+    selected.sort(key=lambda c: c.score, reverse=True)
+    return RegressionSelection(
+        selected=selected,
+        candidates=len(candidates),
+        not_selected=len(candidates) - len(selected),
+        estimated_total_seconds=round(used, 2),
+    )
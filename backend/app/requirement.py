@@ -6,10 +6,11 @@ from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import selectinload
 from typing import Any
 from .permissions import ensure_project_access
-from .db import get_db
+from .db import get_db, get_read_db
 from .models import Requirement, TestCase, User
 from .schemas import RequirementCreateIn, RequirementUpdateIn, RequirementOut, TestCaseOut
 from .auth import get_current_user
+from .semantic_search import index_requirement, index_test_cases, remove_item
 
 router = APIRouter(prefix="/api/requirements", tags=["requirements"])
 
@@ -79,7 +80,6 @@ async def create_requirement(
         except Exception:
             tcs_payload = None
 
-    created_tc_rows: list[TestCase] = []
     if tcs_payload:
         try:
             for tc in tcs_payload:
@@ -118,12 +118,9 @@ async def create_requirement(
                     status=status,
                 )
                 db.add(tc_obj)
-                created_tc_rows.append(tc_obj)
 
+            # no per-row refresh: the rows are loaded again below in one query
             await db.commit()
-            # refresh created rows (optional)
-            for t in created_tc_rows:
-                await db.refresh(t)
 
         except SQLAlchemyError as e:
             print(f"[REQUIREMENT] Failed to create test cases: {e}")
@@ -135,6 +132,10 @@ async def create_requirement(
     # load test cases for response
     stmt = select(TestCase).where(TestCase.requirement_id == req.id).order_by(desc(TestCase.id))
     rows = (await db.execute(stmt)).scalars().all()
+
+    # keep the semantic search index in sync
+    await index_requirement(req)
+    await index_test_cases(req.project_id, rows)
     return _req_to_out(req, test_cases=rows)
 
 
@@ -156,7 +157,7 @@ async def get_requirement(
 
 
 @router.get("", response_model=list[RequirementOut])
-async def list_requirements(project_id: int, limit: int = 200, db: AsyncSession = Depends(get_db), user: Any = Depends(get_current_user)):
+async def list_requirements(project_id: int, limit: int = 200, db: AsyncSession = Depends(get_read_db), user: Any = Depends(get_current_user)):
     await ensure_project_access(db, project_id, user.id, allow_view=True)
 
     limit = max(1, min(limit, 500))
@@ -207,6 +208,7 @@ async def update_requirement(
 
     await db.commit()
     await db.refresh(req)
+    await index_requirement(req)
 
     stmt = select(TestCase).where(TestCase.requirement_id == req.id).order_by(desc(TestCase.id))
     rows = (await db.execute(stmt)).scalars().all()
@@ -225,6 +227,8 @@ async def delete_requirement(
 
     await ensure_project_access(db, req.project_id, user.id, allow_view=False)
 
+    project_id = req.project_id
     await db.delete(req)
     await db.commit()
+    await remove_item(project_id, "requirement", requirement_id)
     return {"status": "deleted", "id": requirement_id}
@@ -7,9 +7,17 @@ from .db import get_db
 from .auth import get_current_user
 from .permissions import ensure_project_access
 from .models import Requirement, RequirementAnalysis
-from .schemas import RequirementAnalysisCreateIn, RequirementAnalysisOut
-from .ai import call_ai_json, prompt_requirement_analysis
-from .ml import predict_category
+from .schemas import (
+    ClassifyRequirementOut,
+    RequirementAnalysisCreateIn,
+    RequirementAnalysisOut,
+    RequirementPipelineIn,
+    RequirementPipelineOut,
+    RequirementPredictOut,
+)
+from .ai import acall_ai_json, prompt_requirement_analysis
+from .analysis_pipeline import analysis_fields, build_rows, run_pipeline, run_stages, stage_timeouts
+from .inference import inference_service
 
 router = APIRouter(prefix="/api/requirement_analyses", tags=["requirement_analyses"])
 
@@ -38,40 +46,30 @@ async def create_requirement_analysis(
     raw_json = None
 
     if not any([summary, category, risk_level, recommendations]):
-        # 3) Generate analysis via AI from requirement text
+        # 3) Generate analysis via AI from requirement text, ML category alongside (not after)
         requirement_text = req.description or req.title
-        user_prompt = prompt_requirement_analysis(requirement_text)
-        raw, parsed = call_ai_json(user_prompt)
+        limits = stage_timeouts()
+        analysis_prompt = prompt_requirement_analysis(requirement_text)
+        result = await run_stages({
+            "analysis": (lambda: acall_ai_json(analysis_prompt, kind="requirement_analysis"), limits["analysis"]),
+            "ml": (lambda: inference_service.predict(requirement_text), limits["ml"]),
+        })
+        stage = result.stages["analysis"]
+        if stage.status == "timeout":
+            raise HTTPException(status_code=504, detail=f"AI analysis {stage.error}")
+        if stage.exception is not None:
+            raise stage.exception
+        raw, parsed = stage.value
         raw_json = parsed if isinstance(parsed, dict) else {"raw_text": raw}
 
-        # Extract fields from AI response
-        if isinstance(parsed, dict):
-            summary = parsed.get("summary") or summary
-
-            # Derive risk_level from highest severity in risks
-            risks = parsed.get("risks") or []
-            severity_order = {"low": 1, "medium": 2, "high": 3, "critical": 4}
-            max_sev = None
-            max_score = 0
-            for r in risks:
-                sev = (r or {}).get("severity")
-                score = severity_order.get(str(sev).lower(), 0)
-                if score > max_score:
-                    max_score = score
-                    max_sev = str(sev).lower()
-            risk_level = max_sev or risk_level
-
-            # Recommendations from acceptance criteria suggestions (fallback to open questions)
-            rec_list = parsed.get("acceptance_criteria_suggested") or parsed.get("open_questions") or []
-            if rec_list:
-                recommendations = "\n".join([f"- {item}" for item in rec_list if item])
+        fields = analysis_fields(parsed)
+        summary = fields["summary"] or summary
+        risk_level = fields["risk_level"] or risk_level
+        recommendations = fields["recommendations"] or recommendations
 
         # Category from ML classifier (best-effort)
-        try:
-            pred, conf, _probs = predict_category(requirement_text)
-            category = pred or category
-        except Exception:
-            pass
+        if result.ok("ml"):
+            category = result.value("ml")[0] or category
 
     # 4) Create analysis record
     analysis = RequirementAnalysis(
@@ -90,6 +88,51 @@ async def create_requirement_analysis(
     return analysis
 
 
+@router.post("/pipeline", response_model=RequirementPipelineOut)
+async def run_analysis_pipeline(
+    payload: RequirementPipelineIn,
+    db: AsyncSession = Depends(get_db),
+    user: Any = Depends(get_current_user),
+):
+    """
+    ML prediction, LLM analysis and LLM classification at the same time
+    (app.analysis_pipeline); whatever finished in time is stored in one commit.
+    """
+    req = (
+        await db.execute(select(Requirement).where(Requirement.id == payload.requirement_id))
+    ).scalars().first()
+    if not req:
+        raise HTTPException(status_code=404, detail="Requirement not found")
+    await ensure_project_access(db, req.project_id, user.id, allow_view=True)
+
+    result = await run_pipeline(req, payload.include_recommendations, payload.timeouts)
+    analysis, classification = build_rows(req, user.id, result)
+    if analysis is None and classification is None:
+        timed_out = any(s.status == "timeout" for s in result.stages.values())
+        raise HTTPException(
+            status_code=504 if timed_out else 502,
+            detail={"message": "Every analysis stage failed", "stages": result.stage_report()},
+        )
+
+    rows = [row for row in (analysis, classification) if row is not None]
+    db.add_all(rows)
+    await db.commit()
+    for row in rows:
+        await db.refresh(row)
+
+    prediction = result.value("ml")
+    return RequirementPipelineOut(
+        analysis=RequirementAnalysisOut.model_validate(analysis) if analysis is not None else None,
+        classification=ClassifyRequirementOut.model_validate(classification) if classification is not None else None,
+        prediction=RequirementPredictOut(
+            predicted_category=prediction[0], confidence=prediction[1], probabilities=prediction[2]
+        ) if prediction else None,
+        stages=result.stage_report(),
+        partial=result.partial,
+        seconds=result.seconds,
+    )
+
+
 @router.get("", response_model=list[RequirementAnalysisOut])
 async def list_analyses_for_requirement(
     requirement_id: int,
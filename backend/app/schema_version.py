@@ -0,0 +1,143 @@
+"""
+Database schema management at startup
+
+Schema changes are Alembic migrations (backend/alembic/versions), applied
+ONCE per deploy as a separate step:
+
+    cd backend && alembic upgrade head
+
+Workers then only check that the database is at the revision this code
+expects, which is a single SELECT instead of DDL that takes table locks
+on every boot. SCHEMA_MODE selects the behaviour:
+
+    verify  (default)  compare alembic_version with the migration head, refuse
+                       to start when the database is behind
+    create             legacy behaviour: create_all + ad-hoc ALTER TABLEs +
+                       full-text setup on every boot (local development)
+    skip               do nothing
+
+Usage example:
+    from app.schema_version import prepare_schema
+
+    @app.on_event("startup")
+    async def on_startup():
+        await prepare_schema(engine)
+"""
+
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .config import get_settings
+
+SCHEMA_MODE = get_settings().schema_mode
+
+ALEMBIC_DIR = Path(__file__).resolve().parent.parent / "alembic"
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+def _script_directory():
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory(str(ALEMBIC_DIR))
+
+
+def head_revision() -> str:
+    return _script_directory().get_current_head()
+
+
+async def current_revision(engine: AsyncEngine) -> Optional[str]:
+    async with engine.connect() as conn:
+        try:
+            return (await conn.execute(text("SELECT version_num FROM alembic_version"))).scalar()
+        except Exception:
+            # no alembic_version table: never migrated
+            return None
+
+
+async def verify_schema(engine: AsyncEngine) -> str:
+    """Raise SchemaVersionError if the database is not migrated up to this code's head."""
+    script = _script_directory()
+    head = script.get_current_head()
+    current = await current_revision(engine)
+
+    if current == head:
+        return current
+    if current is None:
+        raise SchemaVersionError(
+            "Database has no migration version. Run `alembic upgrade head` "
+            "(or `alembic stamp 0001` first for a database created by the old startup create_all), "
+            "or set SCHEMA_MODE=create for local development."
+        )
+
+    known = {rev.revision for rev in script.walk_revisions()}
+    if current in known:
+        raise SchemaVersionError(
+            f"Database schema is at {current}, code expects {head}. Run `alembic upgrade head`."
+        )
+
+    # A newer revision than this code knows: a migration for the next release
+    # already ran (rolling deploy). Migrations are additive, so keep serving.
+    print(f"[startup] Database schema {current} is newer than code head {head}; continuing")
+    return current
+
+
+async def legacy_create_schema(engine: AsyncEngine) -> None:
+    """The old every-boot schema setup, kept for SCHEMA_MODE=create."""
+    # Base via app.models: importing it registers every table on Base.metadata for create_all
+    from .models import Base
+    from .fulltext import ensure_fulltext_schema
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        # Ensure new columns exist (lightweight migration)
+        try:
+            await conn.execute(
+                text("ALTER TABLE requirement_analyses ADD COLUMN IF NOT EXISTS raw_json JSONB")
+            )
+        except Exception as exc:
+            # Don't block startup if DB is not Postgres or table doesn't exist yet
+            print(f"[startup] raw_json column check skipped: {exc}")
+
+        # Ensure classify_requirements columns exist
+        try:
+            await conn.execute(
+                text("ALTER TABLE classify_requirements ADD COLUMN IF NOT EXISTS recommendations TEXT")
+            )
+            await conn.execute(
+                text("ALTER TABLE classify_requirements ADD COLUMN IF NOT EXISTS raw_json JSONB")
+            )
+        except Exception as exc:
+            print(f"[startup] classify_requirements column check skipped: {exc}")
+
+    # Duration statistics added to test_case_stats after the table was introduced
+    try:
+        async with engine.begin() as conn:
+            for col in ("p95_duration_seconds", "duration_ewma_seconds"):
+                await conn.execute(
+                    text(f"ALTER TABLE test_case_stats ADD COLUMN IF NOT EXISTS {col} DOUBLE PRECISION")
+                )
+    except Exception as exc:
+        print(f"[startup] test_case_stats column check skipped: {exc}")
+
+    # Full-text search columns/indexes (tsvector + GIN on Postgres, FTS5 on SQLite)
+    try:
+        async with engine.begin() as conn:
+            await ensure_fulltext_schema(conn)
+    except Exception as exc:
+        print(f"[startup] full-text search setup skipped: {exc}")
+
+
+async def prepare_schema(engine: AsyncEngine) -> None:
+    if SCHEMA_MODE == "create":
+        await legacy_create_schema(engine)
+    elif SCHEMA_MODE == "verify":
+        revision = await verify_schema(engine)
+        print(f"[startup] Database schema at revision {revision}")
+    elif SCHEMA_MODE != "skip":
+        raise SchemaVersionError(f"Unknown SCHEMA_MODE {SCHEMA_MODE!r} (expected verify, create or skip)")
@@ -57,6 +57,12 @@ class BaseIn(BaseModel):
 class RegressionIn(BaseIn):
     change_description: str = Field(min_length=5)
     changed_components: Optional[list[str]] = None
+    # history correlation: failures on this branch / these commits rank higher
+    branch: Optional[str] = None
+    git_shas: Optional[list[str]] = None
+    time_budget_seconds: Optional[float] = Field(default=None, gt=0)
+    max_tests: Optional[int] = Field(default=None, ge=1)
+    include_narrative: bool = False
 
 class RiskIn(BaseIn):
     feature_description: str = Field(min_length=5)
@@ -73,6 +79,29 @@ class AIOut(BaseModel):
     raw_text: str
 
 
+class RegressionTestOut(BaseModel):
+    test_case_id: int
+    title: str
+    requirement_id: Optional[int] = None
+    score: float
+    relevance: float
+    failure_probability: float
+    estimated_seconds: float
+    reasons: list[str]
+
+
+class RegressionOut(BaseModel):
+    project_id: int
+    took_ms: float
+    time_budget_seconds: Optional[float] = None
+    estimated_total_seconds: float
+    candidates: int
+    not_selected: int
+    selected: list[RegressionTestOut]
+    # optional LLM explanation of the selection
+    narrative: Optional[AIOut] = None
+
+
 # ---------- HISTORY ----------
 # HistoryItem removed — history endpoints and RequestLog have been removed
 # ---------- USER ----------
@@ -182,6 +211,22 @@ class RequirementPredictOut(BaseModel):
     predicted_category: str
     confidence: float
     probabilities: dict[str, float]   
+
+class RequirementExplainIn(BaseModel):
+    texts: list[str] = Field(min_length=1, max_length=200)
+    top_k: int = Field(default=5, ge=1, le=50)
+
+class NgramContribution(BaseModel):
+    ngram: str
+    weight: float      # towards the predicted category (log-odds for linear models, probability for forests)
+    in_text: bool      # False: a forest split on the n-gram being absent
+
+class RequirementExplanationOut(BaseModel):
+    predicted_category: str
+    confidence: float
+    supporting: list[NgramContribution]
+    opposing: list[NgramContribution]
+
 class RequirementCreateIn(BaseModel):
     project_id: int
     title: str = Field(min_length=1, max_length=255)
@@ -483,6 +528,25 @@ class ClassifyRequirementOut(ClassifyRequirementBase):
     requirement_id: int
     created_at: datetime
 
+class RequirementPipelineIn(BaseModel):
+    requirement_id: int
+    include_recommendations: bool = False
+    # per-stage overrides: {"ml": 1.0, "analysis": 20, "classification": 20}
+    timeouts: Optional[dict[str, float]] = None
+
+class PipelineStageOut(BaseModel):
+    status: str                 # ok | timeout | error
+    seconds: float
+    error: Optional[str] = None
+
+class RequirementPipelineOut(BaseModel):
+    analysis: Optional[RequirementAnalysisOut] = None
+    classification: Optional[ClassifyRequirementOut] = None
+    prediction: Optional[RequirementPredictOut] = None
+    stages: dict[str, PipelineStageOut]
+    partial: bool
+    seconds: float
+
 class ClassifyRequirementListOut(BaseModel):
     """
     Useful if you want pagination metadata later.
@@ -706,4 +770,123 @@ class BugRetestSummaryOut(BaseModel):
     bug_id: int
     retests: list[BugRetestWithDetailsOut]
     stats: BugRetestStatsOut
-    formatted_summary: str  # Human-readable: "3 retests: Failed → Failed → Passed (Verified)"
\ No newline at end of file
+    formatted_summary: str  # Human-readable: "3 retests: Failed → Failed → Passed (Verified)"
+
+# =========================
+# SEARCH SCHEMAS
+# =========================
+class SearchHitOut(BaseModel):
+    """One semantic search hit (requirement or test case)."""
+    type: Literal["requirement", "test_case"]
+    id: int
+    score: float  # cosine similarity, higher is closer
+    title: str
+
+
+class SearchOut(BaseModel):
+    project_id: int
+    query: str
+    took_ms: float
+    results: list[SearchHitOut]
+
+
+class FullTextHitOut(BaseModel):
+    """One keyword search hit; snippet contains <mark>...</mark> highlights."""
+    type: Literal["requirement", "test_case", "bug"]
+    id: int
+    title: str
+    rank: float
+    snippet: Optional[str] = None
+
+
+class FullTextOut(BaseModel):
+    project_id: int
+    query: str
+    took_ms: float
+    results: list[FullTextHitOut]
+
+
+# =========================
+# TRACEABILITY SCHEMAS
+# =========================
+CoverageStatus = Literal["not_covered", "not_run", "partial", "failing", "passing"]
+
+class TraceabilityRowOut(BaseModel):
+    """One requirement row of the traceability matrix (latest execution per test case)."""
+    requirement_id: int
+    external_id: Optional[str] = None
+    title: str
+
+    test_cases: int
+    executed: int
+    passed: int
+    failed: int
+    blocked: int
+    skipped: int
+    not_run: int
+    open_bugs: int
+
+    coverage_status: CoverageStatus
+    release_ready: bool
+
+
+class TraceabilityMatrixOut(BaseModel):
+    project_id: int
+    total: int
+    limit: int
+    offset: int
+    # pass as after_id for the next page; None on the last page
+    next_after_id: Optional[int] = None
+    rows: list[TraceabilityRowOut]
+
+
+# =========================
+# TEST PLANNING SCHEMAS
+# =========================
+class TestPriorityOut(BaseModel):
+    test_case_id: int
+    title: str
+    requirement_id: Optional[int] = None
+
+    score: float
+    failure_rate: float
+    run_count: int
+    last_result: Optional[str] = None
+    days_since_last_run: Optional[float] = None  # None = never run
+    open_bugs: int
+    risk_level: Optional[str] = None
+    median_duration_seconds: Optional[float] = None
+    p95_duration_seconds: Optional[float] = None
+
+
+class TestPriorityListOut(BaseModel):
+    project_id: int
+    total: int
+    items: list[TestPriorityOut]
+
+
+class RunEstimateIn(BaseModel):
+    # which cases: explicit ids, or the cases of a test run, or all active cases
+    test_case_ids: Optional[list[int]] = None
+    test_run_id: Optional[int] = None
+    workers: int = Field(default=1, ge=1, le=256)
+    default_duration_seconds: float = Field(default=60.0, gt=0)
+
+
+class RunShardOut(BaseModel):
+    worker: int
+    test_case_ids: list[int]
+    estimated_seconds: float
+    p95_seconds: float
+
+
+class RunEstimateOut(BaseModel):
+    project_id: int
+    workers: int
+    test_cases: int
+    unknown_duration_cases: int
+    serial_seconds: float
+    wall_clock_seconds: float
+    wall_clock_p95_seconds: float
+    balance: float
+    shards: list[RunShardOut]
@@ -0,0 +1,144 @@
+import asyncio
+import time
+from typing import Any, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import get_db, get_read_db
+from .auth import get_current_user
+from .permissions import ensure_project_access
+from .models import Requirement, TestCase
+from .schemas import SearchHitOut, SearchOut, FullTextHitOut, FullTextOut
+from .fulltext import fulltext_search
+from . import semantic_search
+
+router = APIRouter(prefix="/api/projects", tags=["search"])
+
+REINDEX_CHUNK = 1000
+
+
+async def rebuild_project_index(db: AsyncSession, project_id: int) -> int:
+    """
+    Re-embed every requirement and test case of a project (chunked, streamed
+    from the DB). Concurrent rebuilds of one project, in any worker, run one
+    after the other.
+    """
+    idx = await asyncio.to_thread(semantic_search.get_index, project_id)
+    handle = await asyncio.to_thread(idx.lock_rebuild)
+    try:
+        return await _rebuild(db, project_id, idx)
+    finally:
+        await asyncio.to_thread(idx.unlock_rebuild, handle)
+
+
+async def _rebuild(db: AsyncSession, project_id: int, idx: semantic_search.ProjectIndex) -> int:
+    await asyncio.to_thread(idx.reset)
+
+    total = 0
+    for model, kind, to_text in (
+        (Requirement, "requirement", semantic_search.requirement_text),
+        (TestCase, "test_case", semantic_search.test_case_text),
+    ):
+        stmt = (
+            select(model)
+            .where(model.project_id == project_id)
+            .order_by(model.id)
+            .execution_options(yield_per=REINDEX_CHUNK)
+        )
+        result = await db.stream(stmt)
+        async for chunk in result.scalars().partitions(REINDEX_CHUNK):
+            items = [(row.id, to_text(row)) for row in chunk]
+            total += await asyncio.to_thread(semantic_search.index_items, project_id, kind, items)
+
+    await asyncio.to_thread(idx.mark_complete)
+    return total
+
+
+@router.get("/{project_id}/search", response_model=SearchOut)
+async def semantic_search_project(
+    project_id: int,
+    q: str = Query(..., min_length=2),
+    k: int = Query(default=10, ge=1, le=100),
+    kind: Optional[Literal["requirement", "test_case"]] = Query(default=None),
+    db: AsyncSession = Depends(get_read_db),
+    user: Any = Depends(get_current_user),
+):
+    await ensure_project_access(db, project_id, user.id, allow_view=True)
+
+    started = time.perf_counter()
+
+    idx = await asyncio.to_thread(semantic_search.get_index, project_id)
+    if idx.needs_rebuild:
+        # Never built (or the embedder changed, or a rebuild is running): a GET does not build it
+        raise HTTPException(
+            status_code=409,
+            detail=f"Search index is not built yet; POST /api/projects/{project_id}/search/reindex",
+        )
+
+    hits = await asyncio.to_thread(semantic_search.search, project_id, q, k, kind)
+
+    # Attach titles (one query per kind, not per hit)
+    titles: dict[tuple[str, int], str] = {}
+    req_ids = [entity_id for hit_kind, entity_id, _ in hits if hit_kind == "requirement"]
+    tc_ids = [entity_id for hit_kind, entity_id, _ in hits if hit_kind == "test_case"]
+    if req_ids:
+        rows = (await db.execute(select(Requirement.id, Requirement.title).where(Requirement.id.in_(req_ids)))).all()
+        titles.update({("requirement", r.id): r.title for r in rows})
+    if tc_ids:
+        rows = (await db.execute(select(TestCase.id, TestCase.title).where(TestCase.id.in_(tc_ids)))).all()
+        titles.update({("test_case", r.id): r.title for r in rows})
+
+    results = [
+        SearchHitOut(type=hit_kind, id=entity_id, score=score, title=titles[(hit_kind, entity_id)])
+        for hit_kind, entity_id, score in hits
+        # rows deleted from the DB but not yet from the index are skipped
+        if (hit_kind, entity_id) in titles
+    ]
+
+    return SearchOut(
+        project_id=project_id,
+        query=q,
+        took_ms=round((time.perf_counter() - started) * 1000, 2),
+        results=results,
+    )
+
+
+@router.get("/{project_id}/fulltext", response_model=FullTextOut)
+async def fulltext_search_project(
+    project_id: int,
+    q: str = Query(..., min_length=2),
+    types: list[Literal["requirement", "test_case", "bug"]] = Query(default=["requirement", "test_case", "bug"]),
+    limit: int = Query(default=20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    user: Any = Depends(get_current_user),
+):
+    await ensure_project_access(db, project_id, user.id, allow_view=True)
+
+    started = time.perf_counter()
+    try:
+        hits = await fulltext_search(db, project_id, q, kinds=types, limit=limit)
+    except NotImplementedError as exc:
+        raise HTTPException(status_code=501, detail=str(exc))
+
+    return FullTextOut(
+        project_id=project_id,
+        query=q,
+        took_ms=round((time.perf_counter() - started) * 1000, 2),
+        results=[FullTextHitOut(**h) for h in hits],
+    )
+
+
+@router.post("/{project_id}/search/reindex")
+async def reindex_project(
+    project_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: Any = Depends(get_current_user),
+):
+    await ensure_project_access(db, project_id, user.id, allow_view=False)
+    try:
+        total = await rebuild_project_index(db, project_id)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Reindex failed: {exc}")
+    return {"project_id": project_id, "indexed": total}
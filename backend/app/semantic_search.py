@@ -0,0 +1,452 @@
+"""
+Semantic search over requirements and test cases
+
+Every requirement / test case is embedded into a small float32 vector and
+stored in one matrix per project:
+
+    data/search_index/project_<id>/
+        vectors.f32     (capacity x dim) float32, memory-mapped
+        keys.i64        (capacity x 2)   int64 [kind, entity_id], kind 0 = free row
+        manifest.json   embedder name, dim, row count, complete flag
+        index.lock      held for each write
+        rebuild.lock    held for a whole rebuild
+
+Vectors are L2-normalized, so cosine similarity is one matrix-vector product
+over the memory-mapped file. Rows are updated in place on create/update and
+freed on delete, so the index never needs a full rebuild during normal use.
+Writes take a per-project file lock (index.lock) and re-read the manifest
+first, so several uvicorn workers can update the same project; routers call
+the async wrappers, which embed and write in a worker thread. The full build
+only runs from POST /api/projects/{id}/search/reindex; searching a project
+whose index is not complete answers 409.
+
+Embedders (first available wins):
+    1. sentence-transformers model from EMBEDDING_MODEL_PATH (optional dependency)
+    2. the trained TF-IDF vectorizer (models/vectorizer_latest.joblib) + a fixed
+       random projection down to SEARCH_EMBED_DIM dimensions
+    3. a hashing vectorizer (no model files needed)
+
+The embedder's name carries the model version (registry version + file
+mtime), and get_embedder() reloads it when the model files change; indexes
+built with another name answer 409 until they are rebuilt.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+from .config import get_settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-worker dev setups only, no cross-process lock
+    fcntl = None
+
+INDEX_DIR = Path(get_settings().search_index_dir)
+EMBED_DIM = get_settings().search_embed_dim
+
+KIND_CODES = {"requirement": 1, "test_case": 2}
+KIND_NAMES = {v: k for k, v in KIND_CODES.items()}
+
+_INITIAL_CAPACITY = 1024
+# How stale the embedder may get: a newly trained model is picked up this much later
+EMBEDDER_REFRESH_SECONDS = 1.0
+
+
+def requirement_text(req: Any) -> str:
+    return " ".join(
+        part for part in (req.title, req.description, getattr(req, "acceptance_criteria", None)) if part
+    )
+
+
+def test_case_text(tc: Any) -> str:
+    return " ".join(
+        part for part in (tc.title, tc.description, tc.steps, tc.expected_result) if part
+    )
+
+
+# =========================
+# EMBEDDERS
+# =========================
+def _l2_normalize(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (m / norms).astype(np.float32, copy=False)
+
+
+class _SentenceTransformerEmbedder:
+    def __init__(self, path: str, version: str):
+        # Optional dependency, imported only when configured: it pulls in torch
+        from sentence_transformers import SentenceTransformer  # type: ignore
+
+        self.model = SentenceTransformer(path)
+        self.dim = int(self.model.get_sentence_embedding_dimension())
+        self.name = f"st:{Path(path).name}@{version}:{self.dim}"
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        return _l2_normalize(np.asarray(self.model.encode(texts), dtype=np.float32))
+
+
+class _TfidfProjectionEmbedder:
+    """
+    TF-IDF (trained vocabulary) projected to `dim`, plus hashed terms so words
+    outside the trained vocabulary still contribute to similarity.
+    """
+
+    def __init__(self, vectorizer: Any, dim: int, version: str):
+        self.vectorizer = vectorizer
+        self.hashing = _HashingEmbedder(dim)
+        n_features = len(vectorizer.vocabulary_)
+        # Fixed seed -> every worker (and every restart) builds the same projection
+        rng = np.random.default_rng(1407)
+        self.projection = (rng.standard_normal((n_features, dim)) / np.sqrt(dim)).astype(np.float32)
+        self.dim = dim
+        self.name = f"tfidf-rp+hash:{version}:{n_features}:{dim}"
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        x = self.vectorizer.transform(texts)
+        projected = _l2_normalize(np.asarray(x @ self.projection, dtype=np.float32))
+        return _l2_normalize(projected + self.hashing.embed(texts))
+
+
+class _HashingEmbedder:
+    def __init__(self, dim: int):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.vectorizer = HashingVectorizer(
+            n_features=dim,
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm=None,
+            stop_words="english",
+        )
+        self.dim = dim
+        self.name = f"hashing:{dim}"
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        x = self.vectorizer.transform(texts)
+        return _l2_normalize(np.asarray(x.toarray(), dtype=np.float32))
+
+
+_embedder = None
+_embedder_versions: tuple[str, str] = ("", "")
+_embedder_checked_at = float("-inf")
+_embedder_lock = threading.Lock()
+
+
+def _mtime(path: Path) -> str:
+    try:
+        return str(path.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return "-"
+
+
+def _model_versions() -> tuple[str, str]:
+    """(sentence-transformers model, TF-IDF vectorizer) versions; a change means a new embedder."""
+    from . import ml
+
+    model_path = get_settings().embedding_model_path
+    st_version = _mtime(Path(model_path)) if model_path else ""
+    tfidf_version = f"{ml.model_version()}@{_mtime(ml.MODELS_DIR / 'vectorizer_latest.joblib')}"
+    return st_version, tfidf_version
+
+
+def _load_embedder(versions: tuple[str, str]):
+    st_version, tfidf_version = versions
+    model_path = get_settings().embedding_model_path
+    if model_path:
+        try:
+            return _SentenceTransformerEmbedder(model_path, st_version)
+        except Exception as exc:
+            print(f"[SEARCH] Could not load embedding model {model_path}: {exc}")
+
+    try:
+        from .ml import _load_latest
+
+        return _TfidfProjectionEmbedder(_load_latest("vectorizer"), EMBED_DIM, tfidf_version)
+    except Exception as exc:
+        print(f"[SEARCH] TF-IDF vectorizer unavailable, using hashing embedder: {exc}")
+        return _HashingEmbedder(EMBED_DIM)
+
+
+def get_embedder():
+    """The current embedder; reloaded (at most every EMBEDDER_REFRESH_SECONDS check) when its model files change."""
+    global _embedder, _embedder_versions, _embedder_checked_at
+    if _embedder is not None and time.monotonic() - _embedder_checked_at < EMBEDDER_REFRESH_SECONDS:
+        return _embedder
+    with _embedder_lock:
+        versions = _model_versions()
+        _embedder_checked_at = time.monotonic()
+        if _embedder is not None and versions == _embedder_versions:
+            return _embedder
+        if _embedder is not None:
+            print("[SEARCH] Embedding model changed, reloading; project indexes need a reindex")
+        _embedder, _embedder_versions = _load_embedder(versions), versions
+        return _embedder
+
+
+# =========================
+# PER-PROJECT INDEX
+# =========================
+class ProjectIndex:
+    def __init__(self, project_id: int, embedder_name: str, dim: int):
+        self.project_id = project_id
+        self.dir = INDEX_DIR / f"project_{project_id}"
+        self.embedder_name = embedder_name
+        self.dim = dim
+        self.count = 0
+        self.capacity = 0
+        self.vectors: Optional[np.memmap] = None
+        self.keys: Optional[np.memmap] = None
+        self.rows: dict[tuple[int, int], int] = {}
+        self.free_rows: list[int] = []
+        self.complete = False  # True once a full rebuild from the DB has finished
+        self.lock = threading.RLock()
+        self._manifest_mtime = 0
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.dir / "manifest.json"
+
+    def exists(self) -> bool:
+        return self.manifest_path.exists()
+
+    @property
+    def needs_rebuild(self) -> bool:
+        return self.vectors is None or not self.complete
+
+    @contextmanager
+    def _write_lock(self):
+        """Thread lock + cross-process file lock, with another worker's writes loaded first."""
+        with self.lock:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            with open(self.dir / "index.lock", "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self.refresh_if_changed()
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def lock_rebuild(self):
+        """
+        Cross-process lock held for a whole rebuild, so two rebuilds never
+        interleave. A separate file from index.lock, which every write inside
+        the rebuild takes. Returns the handle for unlock_rebuild.
+        """
+        self.dir.mkdir(parents=True, exist_ok=True)
+        handle = open(self.dir / "rebuild.lock", "a")
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def unlock_rebuild(self, handle) -> None:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+        handle.close()
+
+    # ---- file handling ----
+    def _open(self, capacity: int) -> None:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        vec_path = self.dir / "vectors.f32"
+        key_path = self.dir / "keys.i64"
+        for path, row_bytes in ((vec_path, self.dim * 4), (key_path, 2 * 8)):
+            with open(path, "ab") as f:
+                if f.tell() < capacity * row_bytes:
+                    f.truncate(capacity * row_bytes)
+        self.vectors = np.memmap(vec_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self.keys = np.memmap(key_path, dtype=np.int64, mode="r+", shape=(capacity, 2))
+        self.capacity = capacity
+
+    def _write_manifest(self) -> None:
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "embedder": self.embedder_name,
+            "dim": self.dim,
+            "count": self.count,
+            "complete": self.complete,
+        }))
+        os.replace(tmp, self.manifest_path)
+        self._manifest_mtime = self.manifest_path.stat().st_mtime_ns
+
+    def load(self) -> bool:
+        """Load (or re-load after another worker wrote to it). Returns False if incompatible/missing."""
+        try:
+            # stat before reading: a write landing in between must still look unseen
+            mtime = self.manifest_path.stat().st_mtime_ns
+            manifest = json.loads(self.manifest_path.read_text())
+        except FileNotFoundError:
+            return False
+        if manifest.get("embedder") != self.embedder_name or manifest.get("dim") != self.dim:
+            return False
+        self.count = int(manifest["count"])
+        self.complete = bool(manifest.get("complete"))
+        self._open(max(self.count, _INITIAL_CAPACITY))
+        keys = np.asarray(self.keys[: self.count])
+        self.rows = {}
+        self.free_rows = []
+        for row, (kind, entity_id) in enumerate(keys.tolist()):
+            if kind == 0:
+                self.free_rows.append(row)
+            else:
+                self.rows[(kind, entity_id)] = row
+        self._manifest_mtime = mtime
+        return True
+
+    def refresh_if_changed(self) -> None:
+        try:
+            mtime = self.manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        with self.lock:
+            if mtime != self._manifest_mtime:
+                self.load()
+
+    def reset(self) -> None:
+        with self._write_lock():
+            self._reset()
+
+    def _reset(self) -> None:
+        self.complete = False
+        self.count = 0
+        self.rows = {}
+        self.free_rows = []
+        self._open(_INITIAL_CAPACITY)
+        self.keys[:] = 0
+        self._write_manifest()
+
+    # ---- updates ----
+    def upsert(self, kind: str, entity_ids: list[int], vectors: np.ndarray) -> None:
+        code = KIND_CODES[kind]
+        with self._write_lock():
+            if self.vectors is None:
+                self._reset()
+            for entity_id, vec in zip(entity_ids, vectors):
+                row = self.rows.get((code, entity_id))
+                if row is None:
+                    if self.free_rows:
+                        row = self.free_rows.pop()
+                    else:
+                        if self.count >= self.capacity:
+                            self.vectors.flush()
+                            self.keys.flush()
+                            self._open(self.capacity * 2)
+                        row = self.count
+                        self.count += 1
+                    self.rows[(code, entity_id)] = row
+                    self.keys[row] = (code, entity_id)
+                self.vectors[row] = vec
+            self.vectors.flush()
+            self.keys.flush()
+            self._write_manifest()
+
+    def mark_complete(self) -> None:
+        with self._write_lock():
+            self.complete = True
+            self._write_manifest()
+
+    def remove(self, kind: str, entity_id: int) -> None:
+        code = KIND_CODES[kind]
+        with self._write_lock():
+            row = self.rows.pop((code, entity_id), None)
+            if row is None or self.keys is None:
+                return
+            self.keys[row] = (0, 0)
+            self.vectors[row] = 0.0
+            self.free_rows.append(row)
+            self.keys.flush()
+            self._write_manifest()
+
+    # ---- query ----
+    def search(self, query_vec: np.ndarray, k: int, kind: Optional[str] = None) -> list[tuple[str, int, float]]:
+        with self.lock:
+            if self.vectors is None or self.count == 0:
+                return []
+            scores = np.asarray(self.vectors[: self.count] @ query_vec, dtype=np.float32)
+            kinds = np.asarray(self.keys[: self.count, 0])
+            if kind:
+                scores[kinds != KIND_CODES[kind]] = -np.inf
+            else:
+                scores[kinds == 0] = -np.inf
+
+            k = min(k, self.count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            ids = np.asarray(self.keys[top, 1])
+            return [
+                (KIND_NAMES[int(kinds[row])], int(entity_id), float(scores[row]))
+                for row, entity_id in zip(top, ids)
+                if np.isfinite(scores[row])
+            ]
+
+
+_indexes: dict[int, ProjectIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(project_id: int, embedder: Any = None) -> ProjectIndex:
+    """The project's index for `embedder` (default: the current one)."""
+    embedder = embedder or get_embedder()
+    with _indexes_lock:
+        idx = _indexes.get(project_id)
+        if idx is None or idx.embedder_name != embedder.name:
+            idx = ProjectIndex(project_id, embedder.name, embedder.dim)
+            idx.load()
+            _indexes[project_id] = idx
+    idx.refresh_if_changed()
+    return idx
+
+
+# =========================
+# PUBLIC API (used by routers)
+# =========================
+def index_items(project_id: int, kind: str, items: Iterable[tuple[int, str]]) -> int:
+    """Embed and upsert (entity_id, text) pairs. Returns number of rows written."""
+    items = list(items)
+    if not items:
+        return 0
+    embedder = get_embedder()
+    vectors = embedder.embed([text for _, text in items])
+    # the same embedder for both: a reload in between must not put old vectors in a new index
+    get_index(project_id, embedder).upsert(kind, [entity_id for entity_id, _ in items], vectors)
+    return len(items)
+
+
+async def index_requirement(req: Any) -> None:
+    """Best-effort: search must never break a create/update."""
+    # Text is read from the ORM object here, on the loop; embedding and file writes run in a thread
+    items = [(req.id, requirement_text(req))]
+    try:
+        await asyncio.to_thread(index_items, req.project_id, "requirement", items)
+    except Exception as exc:
+        print(f"[SEARCH] Failed to index requirement {getattr(req, 'id', None)}: {exc}")
+
+
+async def index_test_cases(project_id: int, test_cases: list[Any]) -> None:
+    items = [(t.id, test_case_text(t)) for t in test_cases]
+    try:
+        await asyncio.to_thread(index_items, project_id, "test_case", items)
+    except Exception as exc:
+        print(f"[SEARCH] Failed to index test cases: {exc}")
+
+
+async def remove_item(project_id: int, kind: str, entity_id: int) -> None:
+    try:
+        await asyncio.to_thread(lambda: get_index(project_id).remove(kind, entity_id))
+    except Exception as exc:
+        print(f"[SEARCH] Failed to remove {kind} {entity_id} from index: {exc}")
+
+
+def search(project_id: int, query: str, k: int = 10, kind: Optional[str] = None) -> list[tuple[str, int, float]]:
+    embedder = get_embedder()
+    query_vec = embedder.embed([query])[0]
+    return get_index(project_id, embedder).search(query_vec, k, kind)
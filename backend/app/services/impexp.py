@@ -1,7 +1,6 @@
 # app/services/impexp.py
 from __future__ import annotations
 
-from dataclasses import dataclass
 from typing import Any, Literal, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -9,13 +8,15 @@ import io
 import csv
 import json
 
-# YAML kräver dependency: pyyaml
-try:
-    import yaml  # type: ignore
-except Exception:
-    yaml = None
 
-from openpyxl import Workbook, load_workbook
+# openpyxl och pyyaml laddas först när xlsx/yaml faktiskt används (snabbare uppstart)
+def _load_yaml():
+    # YAML kräver dependency: pyyaml
+    try:
+        import yaml  # type: ignore
+    except Exception:
+        raise ValueError("pyyaml is not installed. Add dependency: pyyaml")
+    return yaml
 
 from ..models import Requirement, TestCase  # anpassa till dina modeller
 
@@ -100,6 +101,8 @@ def parse_csv_bytes(content: bytes) -> tuple[list[dict[str, Any]], list[str]]:
 
 
 def parse_xlsx_bytes(content: bytes) -> tuple[list[dict[str, Any]], list[str]]:
+    from openpyxl import load_workbook
+
     wb = load_workbook(io.BytesIO(content), data_only=True)
     ws = wb.active
     rows_iter = ws.iter_rows(values_only=True)
@@ -136,9 +139,7 @@ def parse_json_bytes(content: bytes) -> tuple[list[dict[str, Any]], list[str]]:
 
 
 def parse_yaml_bytes(content: bytes) -> tuple[list[dict[str, Any]], list[str]]:
-    if yaml is None:
-        raise ValueError("pyyaml is not installed. Add dependency: pyyaml")
-    data = yaml.safe_load(content.decode("utf-8"))
+    data = _load_yaml().safe_load(content.decode("utf-8"))
     if isinstance(data, dict) and isinstance(data.get("requirements"), list):
         rows = data["requirements"]
     elif isinstance(data, list):
@@ -387,9 +388,7 @@ def _export_rows(rows: list[dict[str, Any]], fmt: ExportFormat, sheet_name: str)
         return json.dumps(rows, ensure_ascii=False, indent=2).encode("utf-8"), "application/json"
 
     if fmt == "yaml":
-        if yaml is None:
-            raise ValueError("pyyaml is not installed. Add dependency: pyyaml")
-        return yaml.safe_dump(rows, sort_keys=False, allow_unicode=True).encode("utf-8"), "text/yaml"
+        return _load_yaml().safe_dump(rows, sort_keys=False, allow_unicode=True).encode("utf-8"), "text/yaml"
 
     if fmt == "csv":
         out = io.StringIO()
@@ -408,6 +407,8 @@ def _export_rows(rows: list[dict[str, Any]], fmt: ExportFormat, sheet_name: str)
         return out.getvalue().encode("utf-8"), "text/csv"
 
     if fmt == "xlsx":
+        from openpyxl import Workbook
+
         wb = Workbook()
         ws = wb.active
         ws.title = sheet_name
@@ -0,0 +1,66 @@
+"""
+Single-flight request coalescing
+
+Concurrent callers asking for the same key share ONE in-flight call instead
+of each starting their own. The first caller starts the work; everyone who
+arrives while it is still running awaits the same result (or exception).
+Once it finishes the key is forgotten, so later calls run fresh.
+
+Usage example:
+    from app.singleflight import SingleFlight, make_key
+
+    flight = SingleFlight()
+
+    async def get_analysis(prompt: str):
+        key = make_key("analysis", prompt)
+        return await flight.do(key, lambda: asyncio.to_thread(expensive_call, prompt))
+"""
+
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Hashable
+
+
+def make_key(*parts: str) -> str:
+    """Stable hash of the parts that make two calls identical (model, prompt, ...)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update((part or "").encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `fn()` for `key`, or join the call already running for it.
+
+        The work runs in its own task and callers await it through
+        `asyncio.shield`, so one caller disconnecting (cancellation) does not
+        cancel the shared call for everyone else.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,266 @@
+"""
+Utility functions for maintaining per-test-case execution statistics
+
+TestCaseStats is updated incrementally when an execution finishes, so
+prioritization and planning read one row per test case instead of scanning
+the whole execution history.
+
+Usage example:
+    from app.test_case_stats_utils import record_execution_result
+
+    exec_row.result = "failed"
+    await db.flush()
+    await db.refresh(exec_row)          # resolve server-side finished_at
+    await record_execution_result(db, exec_row, previous_result="pending")
+    await db.commit()
+
+    await forget_execution(db, exec_row)   # before deleting a finished execution
+    await db.delete(exec_row)
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import TestCaseStats, TestExecution
+
+# Results that count as a finished run
+FINAL_RESULTS = ("passed", "failed", "blocked", "skipped")
+# Results that count as a failure for the failure rate
+FAILING_RESULTS = ("failed", "blocked")
+
+# Never-run cases are assumed to fail this often
+PRIOR_FAILURE_RATE = 0.25
+# Assumed duration of a case with no recorded duration
+DEFAULT_DURATION_SECONDS = 60.0
+
+# Weight of the newest run in the failure / duration EWMAs
+FAILURE_EWMA_ALPHA = 0.3
+DURATION_EWMA_ALPHA = 0.2
+# Number of recent durations kept for p50 / p95
+RECENT_DURATIONS_KEEP = 50
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Linear-interpolated percentile (q in 0..100) of a non-empty list."""
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def execution_seconds(started_at: Optional[datetime], finished_at: Optional[datetime]) -> Optional[float]:
+    if not started_at or not finished_at:
+        return None
+    seconds = (finished_at - started_at).total_seconds()
+    return seconds if seconds > 0 else None
+
+
+async def _get_or_create(db: AsyncSession, test_case_id: int, project_id: int) -> TestCaseStats:
+    stmt = select(TestCaseStats).where(TestCaseStats.test_case_id == test_case_id).with_for_update()
+    stats = (await db.execute(stmt)).scalars().first()
+    if stats is not None:
+        return stats
+
+    # Two first executions of the same case can race on the insert
+    try:
+        async with db.begin_nested():
+            stats = TestCaseStats(test_case_id=test_case_id, project_id=project_id, run_count=0, fail_count=0)
+            db.add(stats)
+        return stats
+    except IntegrityError:
+        return (await db.execute(stmt)).scalars().one()
+
+
+def _backed_out(ewma: float, alpha: float, value: float) -> float:
+    """The EWMA before `value` was folded in."""
+    return (ewma - alpha * value) / (1 - alpha)
+
+
+def apply_result(
+    stats: TestCaseStats,
+    result: str,
+    finished_at: Optional[datetime],
+    duration_seconds: Optional[float],
+    previous_result: Optional[str] = None,
+) -> None:
+    """
+    Fold one finished execution into the stats row.
+
+    If the execution already had a final result (a correction, e.g. passed ->
+    failed) the run is not counted again: the failure count moves and the
+    previous result is backed out of the EWMA, assuming it was the latest one
+    folded in (corrections almost always target the newest execution).
+    """
+    failed = 1.0 if result in FAILING_RESULTS else 0.0
+
+    if previous_result in FINAL_RESULTS:
+        was_failed = 1.0 if previous_result in FAILING_RESULTS else 0.0
+        stats.fail_count += int(failed) - int(was_failed)
+        if stats.failure_ewma is not None:
+            if stats.run_count <= 1:
+                stats.failure_ewma = None
+            else:
+                before = _backed_out(stats.failure_ewma, FAILURE_EWMA_ALPHA, was_failed)
+                stats.failure_ewma = min(max(before, 0.0), 1.0)
+    else:
+        stats.run_count += 1
+        stats.fail_count += int(failed)
+        if duration_seconds is not None:
+            durations = list(stats.recent_durations or [])
+            durations.append(round(duration_seconds, 3))
+            durations = durations[-RECENT_DURATIONS_KEEP:]
+            stats.recent_durations = durations
+            stats.median_duration_seconds = round(percentile(durations, 50), 3)
+            stats.p95_duration_seconds = round(percentile(durations, 95), 3)
+            if stats.duration_ewma_seconds is None:
+                stats.duration_ewma_seconds = round(duration_seconds, 3)
+            else:
+                stats.duration_ewma_seconds = round(
+                    DURATION_EWMA_ALPHA * duration_seconds + (1 - DURATION_EWMA_ALPHA) * stats.duration_ewma_seconds, 3
+                )
+
+    if stats.failure_ewma is None:
+        stats.failure_ewma = failed
+    else:
+        stats.failure_ewma = FAILURE_EWMA_ALPHA * failed + (1 - FAILURE_EWMA_ALPHA) * stats.failure_ewma
+
+    if finished_at is not None and (stats.last_run_at is None or finished_at >= stats.last_run_at):
+        stats.last_run_at = finished_at
+        stats.last_result = result
+
+
+def retract_result(stats: TestCaseStats, result: str, duration_seconds: Optional[float]) -> None:
+    """
+    Take one finished execution back out of the stats row (deleted, or edited
+    back to pending). Like a correction, the EWMAs are backed out assuming it
+    was the latest run folded in; last_run_at / last_result are left to the caller.
+    """
+    was_failed = 1.0 if result in FAILING_RESULTS else 0.0
+    stats.run_count = max(stats.run_count - 1, 0)
+    stats.fail_count = max(stats.fail_count - int(was_failed), 0)
+    if stats.run_count == 0 or stats.failure_ewma is None:
+        stats.failure_ewma = None
+    else:
+        stats.failure_ewma = min(max(_backed_out(stats.failure_ewma, FAILURE_EWMA_ALPHA, was_failed), 0.0), 1.0)
+
+    if duration_seconds is None:
+        return
+    durations = list(stats.recent_durations or [])
+    if round(duration_seconds, 3) in durations:
+        durations.remove(round(duration_seconds, 3))
+    stats.recent_durations = durations
+    if durations:
+        stats.median_duration_seconds = round(percentile(durations, 50), 3)
+        stats.p95_duration_seconds = round(percentile(durations, 95), 3)
+        if stats.duration_ewma_seconds is not None:
+            before = _backed_out(stats.duration_ewma_seconds, DURATION_EWMA_ALPHA, duration_seconds)
+            stats.duration_ewma_seconds = round(max(before, 0.0), 3)
+    else:
+        stats.median_duration_seconds = stats.p95_duration_seconds = stats.duration_ewma_seconds = None
+
+
+async def _refresh_last_run(db: AsyncSession, stats: TestCaseStats, execution_id: int) -> None:
+    """Point last_run_at / last_result at the newest finished execution other than `execution_id`."""
+    latest = (
+        await db.execute(
+            select(TestExecution.result, TestExecution.finished_at)
+            .where(
+                TestExecution.test_case_id == stats.test_case_id,
+                TestExecution.id != execution_id,
+                TestExecution.result.in_(FINAL_RESULTS),
+            )
+            .order_by(TestExecution.finished_at.desc(), TestExecution.id.desc())
+            .limit(1)
+        )
+    ).first()
+    stats.last_run_at = latest.finished_at if latest else None
+    stats.last_result = latest.result if latest else None
+
+
+async def forget_execution(
+    db: AsyncSession,
+    execution: TestExecution,
+    result: Optional[str] = None,
+    duration_seconds: Optional[float] = None,
+) -> Optional[TestCaseStats]:
+    """
+    Back a finished execution out of its test case's stats. `result` /
+    `duration_seconds` default to the execution's own (pass the old values
+    when it was just edited). Caller commits.
+    """
+    if result is None:
+        result = execution.result
+        duration_seconds = execution_seconds(execution.started_at, execution.finished_at)
+    if result not in FINAL_RESULTS:
+        return None
+
+    stats = await _get_or_create(db, execution.test_case_id, execution.project_id)
+    retract_result(stats, result, duration_seconds)
+    await _refresh_last_run(db, stats, execution.id)
+    return stats
+
+
+async def record_execution_result(
+    db: AsyncSession,
+    execution: TestExecution,
+    previous_result: Optional[str] = None,
+    previous_seconds: Optional[float] = None,
+) -> Optional[TestCaseStats]:
+    """
+    Update the stats of the execution's test case if the execution is finished,
+    or back the previous result out if a finished execution went back to
+    pending (`previous_seconds` is its duration before the edit).
+
+    `execution` must have concrete started_at / finished_at values (refresh it
+    after flush when they come from server defaults). Caller commits.
+    """
+    if execution.result not in FINAL_RESULTS:
+        if previous_result in FINAL_RESULTS:
+            return await forget_execution(db, execution, previous_result, previous_seconds)
+        return None
+    if previous_result == execution.result:
+        return None
+
+    stats = await _get_or_create(db, execution.test_case_id, execution.project_id)
+    apply_result(
+        stats,
+        execution.result,
+        execution.finished_at,
+        execution_seconds(execution.started_at, execution.finished_at),
+        previous_result=previous_result,
+    )
+    return stats
+
+
+async def rebuild_project_stats(db: AsyncSession, project_id: int, chunk_size: int = 1000) -> int:
+    """
+    Recompute every stats row of a project from its execution history
+    (backfill for data that existed before the stats table). Caller commits.
+    """
+    await db.execute(delete(TestCaseStats).where(TestCaseStats.project_id == project_id))
+
+    rows: dict[int, TestCaseStats] = {}
+    stmt = (
+        select(
+            TestExecution.test_case_id, TestExecution.result,
+            TestExecution.started_at, TestExecution.finished_at,
+        )
+        .where(TestExecution.project_id == project_id, TestExecution.result.in_(FINAL_RESULTS))
+        .order_by(TestExecution.finished_at, TestExecution.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    result = await db.stream(stmt)
+    async for e in result:
+        stats = rows.get(e.test_case_id)
+        if stats is None:
+            stats = TestCaseStats(test_case_id=e.test_case_id, project_id=project_id, run_count=0, fail_count=0)
+            rows[e.test_case_id] = stats
+        apply_result(stats, e.result, e.finished_at, execution_seconds(e.started_at, e.finished_at))
+
+    db.add_all(rows.values())
+    return len(rows)
@@ -5,11 +5,12 @@ import json
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
 
-from .db import get_db
+from .db import get_db, get_read_db
 from .models import TestCase, User
 from .schemas import TestCaseCreateIn, TestCaseOut
 from .auth import get_current_user
 from .permissions import ensure_project_access
+from .semantic_search import index_test_cases, remove_item
 from typing import Any
 
 router = APIRouter(prefix="/api/test_cases", tags=["test_cases"])
@@ -56,7 +57,7 @@ async def list_test_cases_by_requirement(
     requirement_id: int,
     project_id: int,
     limit: int = 200,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: Any = Depends(get_current_user),
 ):
     # Ensure the user can view this project
@@ -118,6 +119,7 @@ async def create_test_case(
     try:
         await db.commit()
         await db.refresh(tc)
+        await index_test_cases(tc.project_id, [tc])
         return _tc_to_out(tc)
     except IntegrityError:
         # Possible unique constraint violation on (project_id, title).
@@ -138,7 +140,7 @@ async def create_test_case(
 async def list_test_cases(
     project_id: int,
     limit: int = 50,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: Any = Depends(get_current_user),
 ):
     await ensure_project_access(db, project_id, user.id, allow_view=True)
@@ -204,6 +206,7 @@ async def update_test_case(
 
     await db.commit()
     await db.refresh(tc)
+    await index_test_cases(tc.project_id, [tc])
     return _tc_to_out(tc)
 
 
@@ -219,6 +222,8 @@ async def delete_test_case(
 
     await ensure_project_access(db, tc.project_id, user.id, allow_view=False)
 
+    project_id = tc.project_id
     await db.delete(tc)
     await db.commit()
+    await remove_item(project_id, "test_case", test_case_id)
     return {"status": "deleted", "id": test_case_id}
@@ -1,14 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc, func
 from sqlalchemy.orm import selectinload
 from typing import Any, Optional
 
-from .db import get_db
+from .db import get_db, get_read_db
 from .models import TestExecution, TestCase
 from .schemas import TestExecutionCreateIn, TestExecutionUpdateIn, TestExecutionOut
 from .auth import get_current_user
 from .permissions import ensure_project_access
+from .test_case_stats_utils import execution_seconds, forget_execution, record_execution_result
 
 router = APIRouter(prefix="/api/test_executions", tags=["test_executions"])
 
@@ -100,8 +101,11 @@ async def create_test_execution(
     )
 
     db.add(exec_row)
-    await db.commit()
+    await db.flush()
     await db.refresh(exec_row)
+    # same transaction: stats never drift from the executions they summarize
+    await record_execution_result(db, exec_row)
+    await db.commit()
 
     # load executed_by_user for output name (optional)
     exec_row = (
@@ -121,7 +125,7 @@ async def list_test_executions(
     test_run_id: Optional[int] = None,
     test_case_id: Optional[int] = None,
     limit: int = 200,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: Any = Depends(get_current_user),
 ):
     await ensure_project_access(db, project_id, user.id, allow_view=True)
@@ -162,6 +166,8 @@ async def update_test_execution(
         raise HTTPException(status_code=404, detail="Execution not found")
 
     await ensure_project_access(db, exec_row.project_id, user.id, allow_view=False)
+    previous_result = exec_row.result
+    previous_seconds = execution_seconds(exec_row.started_at, exec_row.finished_at)
 
     # Update only provided fields
     if payload.status is not None:
@@ -211,6 +217,9 @@ async def update_test_execution(
     if payload.attempt is not None:
         exec_row.attempt = payload.attempt
 
+    await db.flush()
+    await db.refresh(exec_row)
+    await record_execution_result(db, exec_row, previous_result=previous_result, previous_seconds=previous_seconds)
     await db.commit()
     await db.refresh(exec_row)
     return _exec_to_out(exec_row)
@@ -232,7 +241,8 @@ async def delete_test_execution(
     # Permission check (must have edit access)
     await ensure_project_access(db, exec_row.project_id, user.id, allow_view=False)
 
-    # Delete
+    # Delete (and take a finished run back out of the case's stats)
+    await forget_execution(db, exec_row)
     await db.delete(exec_row)
     await db.commit()
 
@@ -0,0 +1,250 @@
+import heapq
+import math
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import get_db, get_read_db
+from .auth import get_current_user
+from .permissions import ensure_project_access
+from .models import TestCase, TestCaseStats, TestExecution, BugReport, ClassifyRequirement
+from .schemas import TestPriorityOut, TestPriorityListOut, RunEstimateIn, RunEstimateOut, RunShardOut
+from .test_case_stats_utils import DEFAULT_DURATION_SECONDS, PRIOR_FAILURE_RATE, rebuild_project_stats
+from .traceability import CLOSED_BUG_STATUSES
+
+router = APIRouter(prefix="/api/projects", tags=["test_planning"])
+
+# Weights of the "how likely is this case to find a failure" signals (sum = 1)
+W_FAILURE = 0.45
+W_STALENESS = 0.20
+W_BUGS = 0.20
+W_RISK = 0.15
+
+# Days without a run after which a case is ~63% "stale"
+STALENESS_DAYS = 14.0
+# Durations are compared on this scale, so a 2s and a 10s case rank almost alike
+DURATION_SCALE_SECONDS = 60.0
+
+RISK_SCORES = {"low": 0.25, "medium": 0.5, "high": 0.75, "critical": 1.0}
+
+
+def _priority_score(
+    failure_rate: float,
+    days_since_last_run: Optional[float],
+    open_bugs: int,
+    risk_level: Optional[str],
+    duration_seconds: float,
+) -> float:
+    staleness = 1.0 if days_since_last_run is None else 1.0 - math.exp(-days_since_last_run / STALENESS_DAYS)
+    bugs = 1.0 - 0.5 ** open_bugs
+    risk = RISK_SCORES.get((risk_level or "").lower(), 0.5)
+
+    value = W_FAILURE * failure_rate + W_STALENESS * staleness + W_BUGS * bugs + W_RISK * risk
+    # value per unit of time: cheap cases with the same value run first
+    return value / (1.0 + duration_seconds / DURATION_SCALE_SECONDS)
+
+
+@router.get("/{project_id}/test_priority", response_model=TestPriorityListOut)
+async def prioritized_test_cases(
+    project_id: int,
+    test_run_id: Optional[int] = Query(default=None, description="Only cases already planned in this run"),
+    limit: int = Query(default=500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_read_db),
+    user: Any = Depends(get_current_user),
+):
+    await ensure_project_access(db, project_id, user.id, allow_view=True)
+
+    latest_risk = (
+        select(
+            ClassifyRequirement.requirement_id,
+            ClassifyRequirement.risk_level,
+            func.row_number()
+            .over(
+                partition_by=ClassifyRequirement.requirement_id,
+                order_by=(ClassifyRequirement.created_at.desc(), ClassifyRequirement.id.desc()),
+            )
+            .label("rn"),
+        )
+        .where(ClassifyRequirement.project_id == project_id)
+        .subquery()
+    )
+
+    # Open bugs per test case: linked to the case itself, or to its requirement
+    # without a case. Two grouped subqueries (not one OR join) so each side uses its index.
+    open_bug = (BugReport.project_id == project_id) & BugReport.status.notin_(CLOSED_BUG_STATUSES)
+    case_bugs = (
+        select(BugReport.test_case_id, func.count(BugReport.id).label("n"))
+        .where(open_bug, BugReport.test_case_id.isnot(None))
+        .group_by(BugReport.test_case_id)
+        .subquery()
+    )
+    req_bugs = (
+        select(BugReport.requirement_id, func.count(BugReport.id).label("n"))
+        .where(open_bug, BugReport.test_case_id.is_(None), BugReport.requirement_id.isnot(None))
+        .group_by(BugReport.requirement_id)
+        .subquery()
+    )
+    open_bugs = (func.coalesce(case_bugs.c.n, 0) + func.coalesce(req_bugs.c.n, 0)).label("open_bugs")
+
+    stmt = (
+        select(
+            TestCase.id, TestCase.title, TestCase.requirement_id,
+            TestCaseStats.run_count, TestCaseStats.failure_ewma, TestCaseStats.last_run_at,
+            TestCaseStats.last_result, TestCaseStats.median_duration_seconds,
+            TestCaseStats.p95_duration_seconds, latest_risk.c.risk_level, open_bugs,
+        )
+        .outerjoin(TestCaseStats, TestCaseStats.test_case_id == TestCase.id)
+        .outerjoin(
+            latest_risk,
+            (latest_risk.c.requirement_id == TestCase.requirement_id) & (latest_risk.c.rn == 1),
+        )
+        .outerjoin(case_bugs, case_bugs.c.test_case_id == TestCase.id)
+        .outerjoin(req_bugs, req_bugs.c.requirement_id == TestCase.requirement_id)
+        .where(TestCase.project_id == project_id, TestCase.status == "active")
+    )
+    if test_run_id is not None:
+        stmt = stmt.where(
+            TestCase.id.in_(select(TestExecution.test_case_id).where(TestExecution.test_run_id == test_run_id))
+        )
+    cases = (await db.execute(stmt)).all()
+
+
+    now = datetime.now(timezone.utc)
+    items: list[TestPriorityOut] = []
+    for c in cases:
+        days = None
+        if c.last_run_at is not None:
+            last = c.last_run_at if c.last_run_at.tzinfo else c.last_run_at.replace(tzinfo=timezone.utc)
+            days = max((now - last).total_seconds() / 86400.0, 0.0)
+        failure_rate = c.failure_ewma if c.run_count else PRIOR_FAILURE_RATE
+        duration = c.median_duration_seconds or DEFAULT_DURATION_SECONDS
+        bugs = int(c.open_bugs)
+
+        items.append(TestPriorityOut(
+            test_case_id=c.id,
+            title=c.title,
+            requirement_id=c.requirement_id,
+            score=round(_priority_score(failure_rate, days, bugs, c.risk_level, duration), 6),
+            failure_rate=round(failure_rate, 4),
+            run_count=c.run_count or 0,
+            last_result=c.last_result,
+            days_since_last_run=round(days, 2) if days is not None else None,
+            open_bugs=bugs,
+            risk_level=c.risk_level,
+            median_duration_seconds=c.median_duration_seconds,
+            p95_duration_seconds=c.p95_duration_seconds,
+        ))
+
+    items.sort(key=lambda i: i.score, reverse=True)
+    return TestPriorityListOut(project_id=project_id, total=len(items), items=items[:limit])
+
+
+@router.post("/{project_id}/test_stats/rebuild")
+async def rebuild_test_stats(
+    project_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: Any = Depends(get_current_user),
+):
+    """Recompute test case stats from the full execution history (backfill / repair)."""
+    await ensure_project_access(db, project_id, user.id, allow_view=False)
+    count = await rebuild_project_stats(db, project_id)
+    await db.commit()
+    return {"project_id": project_id, "test_cases": count}
+
+
+def _lpt_partition(durations: dict[int, float], workers: int) -> list[list[int]]:
+    """
+    Longest-processing-time-first: hand the longest remaining case to the
+    currently least-loaded worker. Makespan is within 4/3 of optimal.
+    """
+    shards: list[list[int]] = [[] for _ in range(workers)]
+    loads = [(0.0, w) for w in range(workers)]
+    heapq.heapify(loads)
+    for case_id in sorted(durations, key=lambda c: (-durations[c], c)):
+        load, w = heapq.heappop(loads)
+        shards[w].append(case_id)
+        heapq.heappush(loads, (load + durations[case_id], w))
+    return shards
+
+
+@router.post("/{project_id}/run_estimate", response_model=RunEstimateOut)
+async def estimate_run(
+    project_id: int,
+    payload: RunEstimateIn,
+    db: AsyncSession = Depends(get_db),
+    user: Any = Depends(get_current_user),
+):
+    """
+    Estimate the wall-clock time of a proposed run and split its cases into
+    `workers` balanced shards. Expected durations use the duration EWMA
+    (falling back to p50, then a default); the p95 figures use the same
+    shards with p95 durations as a pessimistic bound.
+    """
+    await ensure_project_access(db, project_id, user.id, allow_view=True)
+
+    stmt = (
+        select(
+            TestCase.id,
+            TestCaseStats.duration_ewma_seconds,
+            TestCaseStats.median_duration_seconds,
+            TestCaseStats.p95_duration_seconds,
+        )
+        .outerjoin(TestCaseStats, TestCaseStats.test_case_id == TestCase.id)
+        .where(TestCase.project_id == project_id)
+    )
+    if payload.test_case_ids:
+        stmt = stmt.where(TestCase.id.in_(payload.test_case_ids))
+    elif payload.test_run_id is not None:
+        stmt = stmt.where(
+            TestCase.id.in_(select(TestExecution.test_case_id).where(TestExecution.test_run_id == payload.test_run_id))
+        )
+    else:
+        stmt = stmt.where(TestCase.status == "active")
+    rows = (await db.execute(stmt)).all()
+
+    if payload.test_case_ids:
+        missing = set(payload.test_case_ids) - {r.id for r in rows}
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Test cases not found in project: {sorted(missing)}")
+
+    expected: dict[int, float] = {}
+    pessimistic: dict[int, float] = {}
+    unknown = 0
+    for r in rows:
+        exp = r.duration_ewma_seconds or r.median_duration_seconds
+        if exp is None:
+            unknown += 1
+            exp = payload.default_duration_seconds
+        expected[r.id] = exp
+        pessimistic[r.id] = max(r.p95_duration_seconds or exp, exp)
+
+    workers = min(payload.workers, max(len(expected), 1))
+    shards = _lpt_partition(expected, workers)
+
+    shard_out = [
+        RunShardOut(
+            worker=i + 1,
+            test_case_ids=ids,
+            estimated_seconds=round(sum(expected[c] for c in ids), 2),
+            p95_seconds=round(sum(pessimistic[c] for c in ids), 2),
+        )
+        for i, ids in enumerate(shards)
+    ]
+    serial = sum(expected.values())
+    wall = max((s.estimated_seconds for s in shard_out), default=0.0)
+
+    return RunEstimateOut(
+        project_id=project_id,
+        workers=workers,
+        test_cases=len(expected),
+        unknown_duration_cases=unknown,
+        serial_seconds=round(serial, 2),
+        wall_clock_seconds=wall,
+        wall_clock_p95_seconds=max((s.p95_seconds for s in shard_out), default=0.0),
+        # 1.0 = perfectly balanced shards
+        balance=round(wall / (serial / workers), 4) if serial else 1.0,
+        shards=shard_out,
+    )
@@ -0,0 +1,292 @@
+import asyncio
+import csv
+import io
+import os
+import tempfile
+from typing import Any, AsyncIterator, Literal, Optional
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func, case, and_, true
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .db import get_read_db, read_session_factory
+from .auth import get_current_user
+from .permissions import ensure_project_access
+from .models import Requirement, TestCase, TestExecution, BugReport
+from .schemas import TraceabilityRowOut, TraceabilityMatrixOut
+
+router = APIRouter(prefix="/api/projects", tags=["traceability"])
+
+# Bugs in these states no longer block a release
+CLOSED_BUG_STATUSES = ("resolved", "closed", "verified")
+
+EXPORT_COLUMNS = [
+    "requirement_id", "external_id", "title", "test_cases", "executed",
+    "passed", "failed", "blocked", "skipped", "not_run", "open_bugs",
+    "coverage_status", "release_ready",
+]
+
+EXPORT_CHUNK = 1000
+
+
+def _matrix_stmt(project_id: int, requirement_ids: Optional[list[int]] = None):
+    """
+    One aggregated query: requirement -> test case counts, result of the
+    LATEST execution per test case, and open bugs (linked directly or via
+    one of the requirement's test cases). With `requirement_ids` (one page)
+    only those requirements and their cases / executions / bugs are aggregated.
+    """
+
+    def _on_page(column: Any):
+        return column.in_(requirement_ids) if requirement_ids is not None else true()
+
+    latest_exec = (
+        select(
+            TestExecution.test_case_id,
+            TestExecution.result,
+            func.row_number()
+            .over(
+                partition_by=TestExecution.test_case_id,
+                order_by=(TestExecution.created_at.desc(), TestExecution.id.desc()),
+            )
+            .label("rn"),
+        )
+        .where(TestExecution.project_id == project_id)
+    )
+    if requirement_ids is not None:
+        latest_exec = latest_exec.where(
+            TestExecution.test_case_id.in_(select(TestCase.id).where(TestCase.requirement_id.in_(requirement_ids)))
+        )
+    latest_exec = latest_exec.subquery()
+
+    def _count_result(result: str):
+        return func.coalesce(func.sum(case((latest_exec.c.result == result, 1), else_=0)), 0)
+
+    coverage = (
+        select(
+            TestCase.requirement_id.label("req_id"),
+            func.count(TestCase.id).label("test_cases"),
+            func.count(latest_exec.c.test_case_id).label("executed"),
+            _count_result("passed").label("passed"),
+            _count_result("failed").label("failed"),
+            _count_result("blocked").label("blocked"),
+            _count_result("skipped").label("skipped"),
+        )
+        .select_from(TestCase)
+        .outerjoin(latest_exec, and_(latest_exec.c.test_case_id == TestCase.id, latest_exec.c.rn == 1))
+        .where(TestCase.project_id == project_id, TestCase.requirement_id.isnot(None), _on_page(TestCase.requirement_id))
+        .group_by(TestCase.requirement_id)
+        .subquery()
+    )
+
+    # Open bugs: linked to the requirement itself, or (no requirement set) to one of its test cases.
+    # Two grouped subqueries instead of a COALESCE key, so each side can use its index.
+    open_bug = and_(BugReport.project_id == project_id, BugReport.status.notin_(CLOSED_BUG_STATUSES))
+    direct_bugs = (
+        select(BugReport.requirement_id.label("req_id"), func.count(BugReport.id).label("open_bugs"))
+        .where(open_bug, BugReport.requirement_id.isnot(None), _on_page(BugReport.requirement_id))
+        .group_by(BugReport.requirement_id)
+        .subquery()
+    )
+    case_bugs = (
+        select(TestCase.requirement_id.label("req_id"), func.count(BugReport.id).label("open_bugs"))
+        .select_from(BugReport)
+        .join(TestCase, TestCase.id == BugReport.test_case_id)
+        .where(
+            open_bug,
+            BugReport.requirement_id.is_(None),
+            TestCase.requirement_id.isnot(None),
+            _on_page(TestCase.requirement_id),
+        )
+        .group_by(TestCase.requirement_id)
+        .subquery()
+    )
+
+    return (
+        select(
+            Requirement.id.label("requirement_id"),
+            Requirement.external_id,
+            Requirement.title,
+            func.coalesce(coverage.c.test_cases, 0).label("test_cases"),
+            func.coalesce(coverage.c.executed, 0).label("executed"),
+            func.coalesce(coverage.c.passed, 0).label("passed"),
+            func.coalesce(coverage.c.failed, 0).label("failed"),
+            func.coalesce(coverage.c.blocked, 0).label("blocked"),
+            func.coalesce(coverage.c.skipped, 0).label("skipped"),
+            (func.coalesce(direct_bugs.c.open_bugs, 0) + func.coalesce(case_bugs.c.open_bugs, 0)).label("open_bugs"),
+        )
+        .outerjoin(coverage, coverage.c.req_id == Requirement.id)
+        .outerjoin(direct_bugs, direct_bugs.c.req_id == Requirement.id)
+        .outerjoin(case_bugs, case_bugs.c.req_id == Requirement.id)
+        .where(Requirement.project_id == project_id, _on_page(Requirement.id))
+        .order_by(Requirement.id)
+    )
+
+
+def _row_to_out(r: Any) -> TraceabilityRowOut:
+    test_cases = int(r.test_cases)
+    executed = int(r.executed)
+    passed = int(r.passed)
+    failed = int(r.failed)
+    blocked = int(r.blocked)
+    open_bugs = int(r.open_bugs)
+
+    if test_cases == 0:
+        status = "not_covered"
+    elif failed or blocked:
+        status = "failing"
+    elif executed == 0:
+        status = "not_run"
+    elif passed == test_cases:
+        status = "passing"
+    else:
+        status = "partial"
+
+    return TraceabilityRowOut(
+        requirement_id=r.requirement_id,
+        external_id=r.external_id,
+        title=r.title,
+        test_cases=test_cases,
+        executed=executed,
+        passed=passed,
+        failed=failed,
+        blocked=blocked,
+        skipped=int(r.skipped),
+        not_run=test_cases - executed,
+        open_bugs=open_bugs,
+        coverage_status=status,
+        release_ready=(status == "passing" and open_bugs == 0),
+    )
+
+
+@router.get("/{project_id}/traceability", response_model=TraceabilityMatrixOut)
+async def traceability_matrix(
+    project_id: int,
+    limit: int = Query(default=100, ge=1, le=1000),
+    offset: int = Query(default=0, ge=0),
+    after_id: Optional[int] = Query(default=None, description="Keyset cursor: next_after_id of the previous page"),
+    db: AsyncSession = Depends(get_read_db),
+    user: Any = Depends(get_current_user),
+):
+    await ensure_project_access(db, project_id, user.id, allow_view=True)
+
+    # Pick the page's requirement ids first (index only), then aggregate just those
+    page = select(Requirement.id).where(Requirement.project_id == project_id).order_by(Requirement.id).limit(limit)
+    if after_id is not None:
+        page = page.where(Requirement.id > after_id)
+    else:
+        page = page.offset(offset)
+    ids = list((await db.execute(page)).scalars())
+
+    rows = (await db.execute(_matrix_stmt(project_id, ids))).all() if ids else []
+    total = (
+        await db.execute(select(func.count(Requirement.id)).where(Requirement.project_id == project_id))
+    ).scalar_one()
+
+    return TraceabilityMatrixOut(
+        project_id=project_id,
+        total=total,
+        limit=limit,
+        offset=offset,
+        next_after_id=ids[-1] if len(ids) == limit else None,
+        rows=[_row_to_out(r) for r in rows],
+    )
+
+
+async def _iter_matrix(db: AsyncSession, project_id: int) -> AsyncIterator[TraceabilityRowOut]:
+    result = await db.stream(_matrix_stmt(project_id).execution_options(yield_per=EXPORT_CHUNK))
+    async for r in result:
+        yield _row_to_out(r)
+
+
+async def _csv_stream(project_id: int, session_factory: async_sessionmaker) -> AsyncIterator[str]:
+    # The request's session is closed before a streamed body is sent,
+    # so the stream owns its own session for its whole lifetime.
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+
+    n = 0
+    async with session_factory() as db:
+        async for row in _iter_matrix(db, project_id):
+            data = row.model_dump()
+            writer.writerow([data[c] for c in EXPORT_COLUMNS])
+            n += 1
+            if n % EXPORT_CHUNK == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate(0)
+    yield buf.getvalue()
+
+
+def _append_rows(ws: Any, rows: list[list[Any]]) -> None:
+    for values in rows:
+        ws.append(values)
+
+
+async def _xlsx_file(db: AsyncSession, project_id: int) -> str:
+    """
+    Write the workbook to a temp file and return its path. Rows are read from
+    the DB in chunks on the loop; openpyxl (append, zip on save) runs in a thread.
+    """
+    from openpyxl import Workbook
+
+    # write_only keeps memory flat: rows are serialized as they are appended
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Traceability")
+    ws.append(EXPORT_COLUMNS)
+    chunk: list[list[Any]] = []
+    async for row in _iter_matrix(db, project_id):
+        data = row.model_dump()
+        chunk.append([data[c] for c in EXPORT_COLUMNS])
+        if len(chunk) >= EXPORT_CHUNK:
+            await asyncio.to_thread(_append_rows, ws, chunk)
+            chunk = []
+    if chunk:
+        await asyncio.to_thread(_append_rows, ws, chunk)
+
+    fd, path = tempfile.mkstemp(prefix=f"traceability_{project_id}_", suffix=".xlsx")
+    os.close(fd)
+    try:
+        await asyncio.to_thread(wb.save, path)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+async def _file_stream(path: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """Stream a finished export file, then delete it."""
+    try:
+        with open(path, "rb") as f:
+            while data := await asyncio.to_thread(f.read, chunk_size):
+                yield data
+    finally:
+        os.unlink(path)
+
+
+@router.get("/{project_id}/traceability/export")
+async def export_traceability_matrix(
+    project_id: int,
+    request: Request,
+    format: Literal["csv", "xlsx"] = Query("csv"),
+    db: AsyncSession = Depends(get_read_db),
+    user: Any = Depends(get_current_user),
+):
+    await ensure_project_access(db, project_id, user.id, allow_view=True)
+
+    filename = f"project_{project_id}_traceability.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    if format == "csv":
+        stream = _csv_stream(project_id, read_session_factory(request))
+        return StreamingResponse(stream, media_type="text/csv; charset=utf-8", headers=headers)
+
+    # An xlsx is a zip: it can only be sent once complete, so it is built in a temp file and streamed from there
+    path = await _xlsx_file(db, project_id)
+    return StreamingResponse(
+        _file_stream(path),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers=headers,
+    )
@@ -0,0 +1,170 @@
+"""
+Labeled requirements from the database, for retraining the category classifier
+
+Two sources of labels, both streamed in chunks (server-side cursor,
+`yield_per`) so memory stays flat on large tables:
+
+    human   RequirementAnalysis rows entered by a user (no AI output stored,
+            raw_json IS NULL) - these win over everything else
+    llm     ClassifyRequirement rows from the LLM; mocked responses and rows
+            written by the local model itself (model_name "local:...") are
+            skipped, so the classifier never trains on its own output
+
+Free-form categories ("security", "reliability", ...) are mapped onto the
+classifier's classes; anything that does not map ("other") is dropped.
+
+A stable 10% of requirements (by id hash) is held out of training and used
+by retrain.py to compare a candidate model against the promoted one.
+
+Usage example:
+    from app.training_data import collect_labels, stream_labeled_texts
+
+    labels, watermark = await collect_labels(engine)
+    async for chunk in stream_labeled_texts(engine, labels, chunk_size=5000):
+        X = vectorizer.transform([row.text for row in chunk])
+"""
+
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .models import ClassifyRequirement, Requirement, RequirementAnalysis
+
+# Prefix of ClassifyRequirement.model_name for rows written by the local classifier
+LOCAL_MODEL_PREFIX = "local:"
+
+# LLM / user vocabulary -> classifier classes (see data/requirements.csv)
+CATEGORY_ALIASES = {
+    "functional": "Functional",
+    "security": "Maintainability & Security",
+    "maintainability": "Maintainability & Security",
+    "maintainability & security": "Maintainability & Security",
+    "performance": "Performance",
+    "reliability": "Reliability & Safety",
+    "safety": "Reliability & Safety",
+    "reliability & safety": "Reliability & Safety",
+    "usability": "Usability",
+}
+
+HOLDOUT_PERCENT = 10
+
+
+@dataclass
+class LabeledText:
+    requirement_id: int
+    text: str
+    label: str
+    source: str     # human | llm
+
+
+def normalize_category(value: Optional[str]) -> Optional[str]:
+    if not value:
+        return None
+    return CATEGORY_ALIASES.get(value.strip().lower())
+
+
+def is_holdout(requirement_id: int) -> bool:
+    # Multiplicative hash: holdout membership does not follow id ranges (projects, import batches)
+    return (requirement_id * 2654435761) % 2**32 % 100 < HOLDOUT_PERCENT
+
+
+def training_text(title: Optional[str], description: Optional[str]) -> str:
+    # Same text the API classifies (requirement_analysis: description, else title)
+    return description or title or ""
+
+
+async def collect_labels(
+    engine: AsyncEngine,
+    since: Optional[dict[str, int]] = None,
+    chunk_size: int = 5000,
+) -> tuple[dict[int, tuple[str, str]], dict[str, int]]:
+    """
+    {requirement_id: (label, source)} for every labeled requirement, plus the
+    watermark (max row id per source table) to pass as `since` next time.
+
+    With `since`, only label rows added after the watermark are read
+    (incremental retraining); the latest label per requirement wins.
+    """
+    since = since or {}
+    labels: dict[int, tuple[str, str]] = {}
+
+    async with engine.connect() as conn:
+        # Fix the upper bound first: rows inserted while we read belong to the next run
+        watermark = {}
+        for key, model in (("classify_requirements", ClassifyRequirement),
+                           ("requirement_analyses", RequirementAnalysis)):
+            max_id = (await conn.execute(select(func.max(model.id)))).scalar() or 0
+            watermark[key] = max(since.get(key, 0), max_id)
+
+        # LLM labels first, so human labels read afterwards overwrite them
+        stmt = (
+            select(ClassifyRequirement.requirement_id, ClassifyRequirement.category, ClassifyRequirement.raw_json)
+            .where(ClassifyRequirement.id > since.get("classify_requirements", 0))
+            .where(ClassifyRequirement.id <= watermark["classify_requirements"])
+            .where(
+                (ClassifyRequirement.model_name.is_(None))
+                | ~ClassifyRequirement.model_name.startswith(LOCAL_MODEL_PREFIX)
+            )
+            .order_by(ClassifyRequirement.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        result = await conn.stream(stmt)
+        async for rows in result.partitions():
+            for req_id, category, raw_json in rows:
+                if isinstance(raw_json, dict) and raw_json.get("mock"):
+                    continue
+                label = normalize_category(category)
+                if label and labels.get(req_id, ("", ""))[1] != "human":
+                    labels[req_id] = (label, "llm")
+
+        stmt = (
+            select(RequirementAnalysis.requirement_id, RequirementAnalysis.category)
+            .where(RequirementAnalysis.id > since.get("requirement_analyses", 0))
+            .where(RequirementAnalysis.id <= watermark["requirement_analyses"])
+            .where(RequirementAnalysis.raw_json.is_(None), RequirementAnalysis.category.is_not(None))
+            .order_by(RequirementAnalysis.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        result = await conn.stream(stmt)
+        async for rows in result.partitions():
+            for req_id, category in rows:
+                label = normalize_category(category)
+                if label:
+                    labels[req_id] = (label, "human")
+
+    return labels, watermark
+
+
+async def stream_labeled_texts(
+    engine: AsyncEngine,
+    labels: dict[int, tuple[str, str]],
+    chunk_size: int = 5000,
+    holdout: Optional[bool] = False,
+) -> AsyncIterator[list[LabeledText]]:
+    """
+    Requirement texts for `labels`, in chunks of up to `chunk_size`.
+
+    holdout=False: training rows only, True: holdout rows only, None: all.
+    """
+    wanted = sorted(
+        req_id for req_id in labels if holdout is None or is_holdout(req_id) == holdout
+    )
+    async with engine.connect() as conn:
+        # One bounded IN list per chunk instead of one query over the whole table
+        for start in range(0, len(wanted), chunk_size):
+            ids = wanted[start:start + chunk_size]
+            rows = (await conn.execute(
+                select(Requirement.id, Requirement.title, Requirement.description)
+                .where(Requirement.id.in_(ids))
+                .order_by(Requirement.id)
+            )).all()
+            chunk = []
+            for req_id, title, description in rows:
+                text = training_text(title, description)
+                if text:
+                    label, source = labels[req_id]
+                    chunk.append(LabeledText(req_id, text, label, source))
+            if chunk:
+                yield chunk
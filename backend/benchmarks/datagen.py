@@ -0,0 +1,273 @@
+"""
+Synthetic data for the API benchmarks
+
+Fills a database with one benchmark user and a set of projects whose sizes
+follow a preset (or explicit counts): requirements, test cases, test runs,
+executions, bug reports and classifications, with timestamps spread over the
+last 180 days. Rows are bulk-inserted in batches with explicit ids, so a
+million requirements take minutes, not hours.
+
+The schema is created with the Alembic migrations (the same schema the app
+verifies at startup). Everything the runner needs (token, credentials,
+project ids, row counts) is written to a small JSON file.
+
+Presets (requirements in the largest project):
+    small   10k      medium  100k      large  1M
+
+Usage:
+    cd backend
+    DATABASE_URL=sqlite+aiosqlite:///bench.db python benchmarks/datagen.py --size small
+    python benchmarks/datagen.py --requirements 50000 --projects 3 --meta bench_meta.json
+    python benchmarks/datagen.py --size medium --seed 7     # Postgres: uses DATABASE_URL
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+PRESETS = {"small": 10_000, "medium": 100_000, "large": 1_000_000}
+
+BENCH_EMAIL = "bench@example.com"
+# Login replaces all tokens of a user, so the login scenario gets its own user
+LOGIN_EMAIL = "bench-login@example.com"
+BENCH_PASSWORD = "bench-password"
+
+WORDS = (
+    "login password reset user account session token email search filter export import report "
+    "dashboard payment invoice checkout cart order refund admin role permission audit log upload "
+    "download notification timeout retry cache api mobile browser validation error profile settings"
+).split()
+CATEGORIES = ("functional", "security", "performance", "usability", "compliance")
+RISK_LEVELS = ("low", "medium", "high", "critical")
+PRIORITIES = ("low", "medium", "high", "critical")
+RESULTS = ("passed", "passed", "passed", "passed", "failed", "blocked", "skipped")
+BUG_STATUSES = ("open", "open", "in_progress", "resolved", "closed")
+BRANCHES = ("main", "main", "main", "release/1.4", "feature/search")
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+class IdBlock:
+    """Hands out explicit primary keys after the current max(id) of a table."""
+
+    def __init__(self, start: int):
+        self.next = start + 1
+
+    def take(self) -> int:
+        value = self.next
+        self.next += 1
+        return value
+
+
+async def _next_ids(conn, tables) -> dict[str, IdBlock]:
+    from sqlalchemy import func, select
+
+    blocks = {}
+    for table in tables:
+        current = (await conn.execute(select(func.max(table.c.id)))).scalar() or 0
+        blocks[table.name] = IdBlock(current)
+    return blocks
+
+
+async def _flush(conn, table, rows: list[dict]) -> None:
+    if rows:
+        await conn.execute(table.insert(), rows)
+        rows.clear()
+
+
+async def generate(args) -> dict:
+    from sqlalchemy import select, text
+
+    from app.db import engine
+    from app.models import (
+        BugReport, ClassifyRequirement, Project, Requirement, Role, TestCase, TestExecution, TestRun, Token, User,
+    )
+    from app.security import hash_password, new_token
+
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc)
+    # Insertion order: parents before children
+    t = {m.__tablename__: m.__table__ for m in (
+        Project, Requirement, TestCase, TestRun, TestExecution, BugReport, ClassifyRequirement,
+    )}
+
+    # Project sizes: the first (benchmark) project gets the full count, the others shrink
+    sizes = [max(args.requirements // (4 ** i), 10) for i in range(args.projects)]
+    counts = {name: 0 for name in t}
+
+    async with engine.begin() as conn:
+        role_id = (await conn.execute(select(Role.id).where(Role.name == "tester"))).scalar()
+        if role_id is None:
+            role_id = (await conn.execute(Role.__table__.insert().values(name="tester", is_admin=False))).inserted_primary_key[0]
+        for email in (LOGIN_EMAIL, BENCH_EMAIL):
+            user_id = (await conn.execute(select(User.id).where(User.email == email))).scalar()
+            if user_id is None:
+                user_id = (await conn.execute(User.__table__.insert().values(
+                    email=email, hashed_password=hash_password(BENCH_PASSWORD), name="Benchmark", role_id=role_id,
+                ))).inserted_primary_key[0]
+        token = new_token()
+        await conn.execute(Token.__table__.insert().values(
+            user_id=user_id, token=token, expires_at=now + timedelta(days=365),
+        ))
+
+    all_started = time.perf_counter()
+    async with engine.connect() as conn:
+        ids = await _next_ids(conn, t.values())
+
+    project_ids: list[int] = []
+    bench_run_ids: list[int] = []
+    for n_req in sizes:
+        started = time.perf_counter()
+        buffers: dict[str, list[dict]] = {name: [] for name in t}
+
+        async def put(name: str, row: dict) -> None:
+            buffers[name].append(row)
+            counts[name] += 1
+            if len(buffers[name]) >= args.batch_size:
+                # parents before children, so foreign keys always resolve
+                for table_name in t:
+                    await _flush(conn, t[table_name], buffers[table_name])
+
+        async with engine.begin() as conn:
+            pid = ids["projects"].take()
+            project_ids.append(pid)
+            await put("projects", {"id": pid, "name": f"Bench project {pid}", "owner_user_id": user_id,
+                                   "created_at": now - timedelta(days=200)})
+            await _flush(conn, t["projects"], buffers["projects"])
+
+            run_ids = []
+            for r in range(args.runs):
+                run_id = ids["test_runs"].take()
+                run_ids.append(run_id)
+                await put("test_runs", {"id": run_id, "project_id": pid, "name": f"Nightly {r + 1}",
+                                        "triggered_by": "scheduled",
+                                        "created_at": now - timedelta(days=args.runs - r)})
+            # Empty run for the "create execution" scenario
+            bench_run = ids["test_runs"].take()
+            bench_run_ids.append(bench_run)
+            await put("test_runs", {"id": bench_run, "project_id": pid, "name": "Benchmark run",
+                                    "triggered_by": "manual", "created_at": now})
+            await _flush(conn, t["test_runs"], buffers["test_runs"])
+
+            for i in range(n_req):
+                req_id = ids["requirements"].take()
+                created = now - timedelta(days=rng.uniform(0, 180))
+                await put("requirements", {
+                    "id": req_id, "project_id": pid, "created_by_user_id": user_id,
+                    "title": f"REQ-{i + 1} {_sentence(rng, 5)}", "description": _sentence(rng, 30),
+                    "acceptance_criteria": _sentence(rng, 12), "source": "import",
+                    "external_id": f"REQ-{i + 1}", "created_at": created,
+                })
+                await put("classify_requirements", {
+                    "id": ids["classify_requirements"].take(), "project_id": pid, "requirement_id": req_id,
+                    "category": rng.choice(CATEGORIES), "risk_level": rng.choice(RISK_LEVELS),
+                    "confidence": round(rng.uniform(0.4, 0.99), 3), "summary": _sentence(rng, 10),
+                    "model_name": "bench", "created_at": created,
+                })
+                for _ in range(args.cases_per_requirement):
+                    tc_id = ids["test_cases"].take()
+                    await put("test_cases", {
+                        "id": tc_id, "project_id": pid, "requirement_id": req_id,
+                        "title": f"TC-{tc_id} {_sentence(rng, 4)}", "description": _sentence(rng, 12),
+                        "steps": "\n".join(_sentence(rng, 5) for _ in range(4)),
+                        "expected_result": _sentence(rng, 6), "priority": rng.choice(PRIORITIES),
+                        "status": "active", "created_at": created,
+                    })
+                    for run_id in rng.sample(run_ids, min(args.executions_per_case, len(run_ids))):
+                        started_at = created + timedelta(minutes=rng.uniform(0, 60 * 24 * 30))
+                        result = rng.choice(RESULTS)
+                        exec_id = ids["test_executions"].take()
+                        await put("test_executions", {
+                            "id": exec_id, "project_id": pid, "test_run_id": run_id, "test_case_id": tc_id,
+                            "executed_by_user_id": user_id, "status": "completed", "result": result,
+                            "started_at": started_at,
+                            "finished_at": started_at + timedelta(seconds=rng.lognormvariate(3.5, 0.8)),
+                            "branch": rng.choice(BRANCHES), "attempt": 1,
+                            "created_at": started_at, "updated_at": started_at,
+                        })
+                        if result == "failed" and rng.random() < args.bug_rate:
+                            await put("bug_reports", {
+                                "id": ids["bug_reports"].take(), "project_id": pid, "requirement_id": req_id,
+                                "test_case_id": tc_id, "test_execution_id": exec_id,
+                                "reported_by_user_id": user_id, "title": f"BUG {_sentence(rng, 5)}",
+                                "description": _sentence(rng, 25), "severity": rng.choice(PRIORITIES),
+                                "priority": rng.choice(PRIORITIES), "status": rng.choice(BUG_STATUSES),
+                                "created_at": started_at, "updated_at": started_at,
+                            })
+            for name in t:
+                await _flush(conn, t[name], buffers[name])
+
+        print(f"[datagen] project {pid}: {n_req} requirements in {time.perf_counter() - started:.1f}s")
+
+    if engine.dialect.name == "postgresql":
+        # Explicit ids leave the sequences behind; the app's own inserts would collide
+        async with engine.begin() as conn:
+            for name in t:
+                await conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), (SELECT MAX(id) FROM {name}))"
+                ))
+
+    return {
+        "database_url": engine.url.render_as_string(hide_password=True),
+        "dialect": engine.dialect.name,
+        "seed": args.seed,
+        "email": BENCH_EMAIL,
+        "login_email": LOGIN_EMAIL,
+        "password": BENCH_PASSWORD,
+        "token": token,
+        "user_id": user_id,
+        "project_ids": project_ids,
+        "bench_project_id": project_ids[0],
+        "bench_test_run_id": bench_run_ids[0],
+        "counts": counts,
+        "seconds": round(time.perf_counter() - all_started, 1),
+    }
+
+
+def migrate() -> None:
+    from alembic import command
+    from alembic.config import Config
+
+    cfg = Config(str(BACKEND_DIR / "alembic.ini"))
+    cfg.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    command.upgrade(cfg, "head")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=sorted(PRESETS), default="small")
+    parser.add_argument("--requirements", type=int, help="requirements in the largest project (overrides --size)")
+    parser.add_argument("--projects", type=int, default=3)
+    parser.add_argument("--cases-per-requirement", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=10, help="test runs per project")
+    parser.add_argument("--executions-per-case", type=int, default=2)
+    parser.add_argument("--bug-rate", type=float, default=0.3, help="share of failed executions that get a bug")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-migrate", action="store_true", help="schema already at head")
+    parser.add_argument("--meta", default="bench_meta.json", help="output for the benchmark runner")
+    args = parser.parse_args()
+    args.requirements = args.requirements or PRESETS[args.size]
+
+    os.chdir(BACKEND_DIR)
+    if not args.skip_migrate:
+        migrate()
+
+    meta = asyncio.run(generate(args))
+    Path(args.meta).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    print(f"[datagen] {json.dumps(meta['counts'])} in {meta['seconds']}s -> {args.meta}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Cold-start profile of the API
+
+Runs fresh interpreters and reports:
+    - import time of the target module (`python -X importtime`)
+    - the slowest imports (cumulative, self)
+    - heavy optional libraries that got imported eagerly (should be none)
+    - time to first request: interpreter start -> first /health response,
+      served in-process through httpx's ASGI transport (startup events are
+      skipped, so the database does not have to be reachable)
+
+Usage:
+    cd backend
+    python benchmarks/importtime.py
+    python benchmarks/importtime.py --runs 10 --top 40 --json importtime.json
+    python benchmarks/importtime.py --module app.db
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Libraries that must only load on first use
+HEAVY_MODULES = ("openai", "sklearn", "pandas", "openpyxl", "yaml", "joblib", "scipy")
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+FIRST_REQUEST_SNIPPET = """
+import asyncio, time
+t0 = time.perf_counter()
+from app import app
+import httpx
+async def main():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        r = await c.get("/health")
+        r.raise_for_status()
+asyncio.run(main())
+print(time.perf_counter() - t0)
+"""
+
+
+def _run(args: list[str], env: dict[str, str]) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+
+
+def profile_imports(module: str, env: dict[str, str]) -> dict[str, tuple[int, int]]:
+    """{module: (self_us, cumulative_us)} for one fresh interpreter."""
+    proc = _run(["-X", "importtime", "-c", f"import {module}"], env)
+    out: dict[str, tuple[int, int]] = {}
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            out[m.group(4)] = (int(m.group(1)), int(m.group(2)))
+    return out
+
+
+def time_first_request(env: dict[str, str]) -> tuple[float, float]:
+    """(seconds inside the process, seconds including interpreter start-up)."""
+    started = time.perf_counter()
+    proc = _run(["-c", FIRST_REQUEST_SNIPPET], env)
+    wall = time.perf_counter() - started
+    return float(proc.stdout.strip().splitlines()[-1]), wall
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("AI_MOCK", "1")
+
+    # warm-up: compile .pyc files so the first run is not an outlier
+    _run(["-c", f"import {args.module}"], env)
+
+    totals: list[float] = []
+    runs: list[dict[str, tuple[int, int]]] = []
+    for _ in range(args.runs):
+        prof = profile_imports(args.module, env)
+        runs.append(prof)
+        totals.append(prof.get(args.module, (0, 0))[1] / 1000.0)
+
+    # median cumulative time per module across runs
+    modules = set().union(*runs)
+    cumulative = {
+        m: statistics.median(r[m][1] for r in runs if m in r) / 1000.0 for m in modules
+    }
+    self_time = {
+        m: statistics.median(r[m][0] for r in runs if m in r) / 1000.0 for m in modules
+    }
+    slowest = sorted(cumulative.items(), key=lambda kv: kv[1], reverse=True)[: args.top]
+    eager_heavy = sorted(m for m in modules if m in HEAVY_MODULES)
+
+    first_request = [time_first_request(env) for _ in range(args.runs)]
+
+    result = {
+        "module": args.module,
+        "runs": args.runs,
+        "import_ms_median": round(statistics.median(totals), 1),
+        "import_ms_min": round(min(totals), 1),
+        "first_request_ms_median": round(statistics.median(r[0] for r in first_request) * 1000, 1),
+        "first_request_wall_ms_median": round(statistics.median(r[1] for r in first_request) * 1000, 1),
+        "eager_heavy_modules": eager_heavy,
+        "slowest": [
+            {"module": m, "cumulative_ms": round(ms, 1), "self_ms": round(self_time[m], 1)} for m, ms in slowest
+        ],
+    }
+
+    print(f"import {args.module}: median {result['import_ms_median']} ms (min {result['import_ms_min']} ms)")
+    print(
+        f"time to first request: {result['first_request_ms_median']} ms in-process, "
+        f"{result['first_request_wall_ms_median']} ms including interpreter start"
+    )
+    print(f"eagerly imported heavy modules: {', '.join(eager_heavy) or 'none'}")
+    print(f"\n{'cumulative ms':>14} {'self ms':>9}  module")
+    for row in result["slowest"]:
+        print(f"{row['cumulative_ms']:>14.1f} {row['self_ms']:>9.1f}  {row['module']}")
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(result, indent=2))
+        print(f"\nwrote {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
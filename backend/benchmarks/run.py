@@ -0,0 +1,348 @@
+"""
+API benchmark runner
+
+Replays the main endpoints against a database filled by benchmarks/datagen.py
+and reports, per scenario, throughput and p50 / p90 / p99 latency. By default
+the app is served in-process through httpx's ASGI transport (no network, no
+uvicorn); --url benchmarks a running server instead. The AI layer runs with
+AI_MOCK=1, so no OpenAI calls are made.
+
+In-process runs also report the average number of SQL statements per request
+(from app.metrics), which is what moves when an N+1 gets fixed.
+
+Results are written as JSON; --compare prints the change against an earlier
+result file and flags regressions (p99 up or throughput down by more than
+--threshold percent).
+
+The runner needs DATABASE_URL pointing at the generated database (it creates
+a fresh test run for the "create execution" scenario).
+
+Usage:
+    cd backend
+    export DATABASE_URL=sqlite+aiosqlite:///bench.db
+    python benchmarks/datagen.py --size small
+    python benchmarks/run.py --out bench_results/baseline.json
+    python benchmarks/run.py --out bench_results/after.json --compare bench_results/baseline.json
+    python benchmarks/run.py --scenarios list_bugs,dashboard_risk_counts --requests 500 --concurrency 16
+    python benchmarks/run.py --url http://127.0.0.1:8000 --out server.json
+    python benchmarks/run.py --compare-only bench_results/baseline.json bench_results/after.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Before anything imports the app: mocked AI, no per-statement log lines in the timings
+os.environ.setdefault("AI_MOCK", "1")
+os.environ.setdefault("SLOW_QUERY_MS", "0")
+os.environ.setdefault("N_PLUS_ONE_THRESHOLD", "0")
+
+PREDICT_TEXTS = (
+    "The user must be able to reset the password via an emailed link that expires after 30 minutes",
+    "Search results load within 2 seconds for projects with 100k requirements",
+    "Only admins can export the audit log",
+    "The checkout page shows the total including VAT before payment",
+)
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: Callable[["Context", int], str]
+    request: Callable[["Context", int], dict] = lambda ctx, i: {}
+    heavy: bool = False          # exports / imports: fewer requests
+    auth: bool = True
+
+
+@dataclass
+class Context:
+    meta: dict
+    project_id: int
+    test_run_id: int
+    test_case_ids: list[int]
+    import_csv: bytes
+
+
+def _execution_body(ctx: Context, i: int) -> dict:
+    n = len(ctx.test_case_ids)
+    started = datetime.now(timezone.utc) - timedelta(seconds=90)
+    return {"json": {
+        "project_id": ctx.project_id,
+        "test_run_id": ctx.test_run_id,
+        "test_case_id": ctx.test_case_ids[i % n],
+        "attempt": 1 + i // n,     # (run, case, attempt) is unique
+        "result": "failed" if i % 7 == 0 else "passed",
+        "started_at": started.isoformat(),
+        "finished_at": (started + timedelta(seconds=30 + i % 60)).isoformat(),
+    }}
+
+
+def _p(ctx: Context) -> dict:
+    return {"project_id": ctx.project_id}
+
+
+SCENARIOS = [
+    Scenario("auth_login", "POST", lambda c, i: "/auth/login",
+             lambda c, i: {"json": {"email": c.meta["login_email"], "password": c.meta["password"]}}, auth=False),
+    Scenario("auth_me", "GET", lambda c, i: "/auth/me"),
+    Scenario("list_requirements", "GET", lambda c, i: "/api/requirements", lambda c, i: {"params": _p(c)}),
+    Scenario("list_test_cases", "GET", lambda c, i: "/api/test_cases", lambda c, i: {"params": {**_p(c), "limit": 200}}),
+    Scenario("list_executions", "GET", lambda c, i: "/api/test_executions", lambda c, i: {"params": _p(c)}),
+    Scenario("list_bugs", "GET", lambda c, i: "/api/bug_reports", lambda c, i: {"params": _p(c)}),
+    Scenario("history", "GET", lambda c, i: "/api/history", lambda c, i: {"params": _p(c)}),
+    Scenario("dashboard_risk_counts", "GET", lambda c, i: "/api/classify_requirements/dashboard/risk_counts",
+             lambda c, i: {"params": _p(c)}),
+    Scenario("latest_classifications", "GET", lambda c, i: "/api/classify_requirements/latest",
+             lambda c, i: {"params": _p(c)}),
+    Scenario("traceability", "GET", lambda c, i: f"/api/projects/{c.project_id}/traceability"),
+    Scenario("test_priority", "GET", lambda c, i: f"/api/projects/{c.project_id}/test_priority",
+             lambda c, i: {"params": {"limit": 200}}),
+    Scenario("create_execution", "POST", lambda c, i: "/api/test_executions", _execution_body),
+    Scenario("predict", "POST", lambda c, i: "/api/requirements/predict",
+             lambda c, i: {"json": {"text": PREDICT_TEXTS[i % len(PREDICT_TEXTS)]}}),
+    Scenario("export_requirements_csv", "GET", lambda c, i: f"/api/projects/{c.project_id}/export/requirements",
+             lambda c, i: {"params": {"format": "csv"}}, heavy=True),
+    Scenario("export_test_cases_json", "GET", lambda c, i: f"/api/projects/{c.project_id}/export/test_cases",
+             lambda c, i: {"params": {"format": "json"}}, heavy=True),
+    Scenario("import_requirements_dry_run", "POST", lambda c, i: f"/api/projects/{c.project_id}/import/requirements",
+             lambda c, i: {"params": {"format": "csv", "dry_run": "true"},
+                           "files": {"file": ("requirements.csv", c.import_csv, "text/csv")}}, heavy=True),
+]
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+async def _prepare(meta: dict, project_id: int) -> Context:
+    from sqlalchemy import select
+
+    from app.db import engine
+    from app.models import TestCase, TestRun
+
+    async with engine.begin() as conn:
+        run_id = (await conn.execute(TestRun.__table__.insert().values(
+            project_id=project_id, name=f"Benchmark {datetime.now(timezone.utc):%Y-%m-%d %H:%M:%S}",
+            triggered_by="manual",
+        ))).inserted_primary_key[0]
+        case_ids = list((await conn.execute(
+            select(TestCase.id).where(TestCase.project_id == project_id).order_by(TestCase.id).limit(5000)
+        )).scalars())
+    await engine.dispose()
+
+    rows = ["external_id,title,description,priority"]
+    rows += [f"BENCH-IMP-{i},Imported requirement {i},Generated by the benchmark runner,medium" for i in range(200)]
+    return Context(meta, project_id, run_id, case_ids, ("\n".join(rows) + "\n").encode("utf-8"))
+
+
+async def _run_scenario(client, ctx: Context, scenario: Scenario, requests: int, concurrency: int, warmup: int) -> dict:
+    headers = {"Authorization": f"Bearer {ctx.meta['token']}"} if scenario.auth else {}
+    counter = iter(range(warmup + requests))
+    latencies: list[float] = []
+    errors = 0
+    first_error: Optional[str] = None
+
+    async def one(i: int) -> None:
+        nonlocal errors, first_error
+        started = time.perf_counter()
+        resp = await client.request(scenario.method, scenario.path(ctx, i), headers=headers, **scenario.request(ctx, i))
+        await resp.aread()
+        elapsed = time.perf_counter() - started
+        if i < warmup:
+            return
+        latencies.append(elapsed)
+        if resp.status_code >= 400:
+            errors += 1
+            if first_error is None:
+                first_error = f"{resp.status_code} {resp.text[:200]}"
+
+    async def worker() -> None:
+        for i in counter:
+            await one(i)
+
+    for i in range(warmup):
+        await one(next(counter))
+
+    registry = _metrics_registry()
+    if registry is not None:
+        registry.reset()
+    wall_started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - wall_started
+
+    result = {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+    if registry is not None:
+        total = sum(s.sql_statements.total for s in registry.routes.values())
+        statements = sum(s.sql_statements.sum for s in registry.routes.values())
+        result["sql_per_request"] = round(statements / total, 2) if total else 0.0
+    if first_error:
+        result["first_error"] = first_error
+    return result
+
+
+def _metrics_registry():
+    if "app.main" not in sys.modules:
+        return None
+    from app.metrics import registry
+
+    return registry
+
+
+def _git_sha() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run(args) -> dict:
+    import httpx
+
+    meta = json.loads(Path(args.meta).read_text(encoding="utf-8"))
+    project_id = args.project_id or meta["bench_project_id"]
+    ctx = await _prepare(meta, project_id)
+
+    selected = SCENARIOS
+    if args.scenarios:
+        names = set(args.scenarios.split(","))
+        unknown = names - {s.name for s in SCENARIOS}
+        if unknown:
+            raise SystemExit(f"Unknown scenarios: {sorted(unknown)}")
+        selected = [s for s in SCENARIOS if s.name in names]
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        from app.main import app
+
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=args.timeout)
+
+    results: dict[str, Any] = {}
+    async with client:
+        for scenario in selected:
+            requests = args.heavy_requests if scenario.heavy else args.requests
+            res = await _run_scenario(client, ctx, scenario, requests, args.concurrency, args.warmup)
+            results[scenario.name] = res
+            sql = f"  sql/req {res['sql_per_request']:>6}" if "sql_per_request" in res else ""
+            err = f"  ERRORS {res['errors']}: {res.get('first_error', '')}" if res["errors"] else ""
+            print(
+                f"{scenario.name:<30} {res['throughput_rps']:>9} rps  p50 {res['p50_ms']:>9} ms"
+                f"  p99 {res['p99_ms']:>9} ms{sql}{err}"
+            )
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_sha": _git_sha(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": args.url or "in-process",
+            "dialect": meta.get("dialect"),
+            "dataset": meta.get("counts"),
+            "project_id": project_id,
+        },
+        "config": {
+            "requests": args.requests,
+            "heavy_requests": args.heavy_requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Print the change per scenario; returns the scenarios that regressed."""
+    def pct(new: float, old: float) -> float:
+        return (new - old) / old * 100.0 if old else 0.0
+
+    regressions = []
+    print(f"\n{'scenario':<30} {'rps':>16} {'p50 ms':>18} {'p99 ms':>18}")
+    for name, new in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        d_rps = pct(new["throughput_rps"], old["throughput_rps"])
+        d_p50 = pct(new["p50_ms"], old["p50_ms"])
+        d_p99 = pct(new["p99_ms"], old["p99_ms"])
+        flag = ""
+        if d_p99 > threshold or d_rps < -threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            f"{name:<30} {new['throughput_rps']:>8} ({d_rps:+6.1f}%) {new['p50_ms']:>9} ({d_p50:+6.1f}%)"
+            f" {new['p99_ms']:>9} ({d_p99:+6.1f}%){flag}"
+        )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meta", default="bench_meta.json", help="written by benchmarks/datagen.py")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--project-id", type=int, help="defaults to the largest generated project")
+    parser.add_argument("--scenarios", help="comma-separated subset, e.g. list_bugs,predict")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--heavy-requests", type=int, default=20, help="requests for export / import scenarios")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--compare-only", nargs=2, metavar=("BASELINE", "CURRENT"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 when a scenario regressed")
+    args = parser.parse_args()
+
+    os.chdir(BACKEND_DIR)   # relative paths (models/, data/) resolve like under uvicorn
+
+    if args.compare_only:
+        baseline, current = (json.loads(Path(p).read_text(encoding="utf-8")) for p in args.compare_only)
+        regressions = compare(baseline, current, args.threshold)
+    else:
+        current = asyncio.run(run(args))
+        if args.out:
+            Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+            Path(args.out).write_text(json.dumps(current, indent=2), encoding="utf-8")
+            print(f"\nresults -> {args.out}")
+        regressions = []
+        if args.compare:
+            regressions = compare(json.loads(Path(args.compare).read_text(encoding="utf-8")), current, args.threshold)
+
+    if regressions:
+        print(f"\nregressed (> {args.threshold}%): {', '.join(regressions)}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
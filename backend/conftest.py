@@ -0,0 +1,14 @@
+"""Shared pytest fixtures for the backend."""
+
+from typing import Iterator
+
+import pytest
+
+from app.query_profiler import QueryProfile, profile_queries
+
+
+@pytest.fixture
+def query_profiler() -> Iterator[QueryProfile]:
+    """Statements run by the test; call .assert_budget(...) at the end."""
+    with profile_queries("test") as profile:
+        yield profile
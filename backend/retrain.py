@@ -0,0 +1,260 @@
+"""
+Retrain the requirement category classifier from production labels
+
+Labels come from the database (app.training_data): categories users entered
+on requirement analyses, and LLM classifications. A stable 10% of labeled
+requirements is never trained on; each candidate is scored on that holdout
+next to the promoted model, and only promoted when it is not worse (within
+--tolerance). Versions and promotion are tracked in models/registry.json
+(app.model_registry); API workers pick up a promoted model on their next
+prediction.
+
+    full          refit vectorizer + model selection on data/requirements.csv
+                  plus every DB label (train_model.py pipeline)
+    incremental   partial_fit the promoted model on labels added since it was
+                  trained (same vocabulary); needs a partial_fit model
+                  (SGD / Naive Bayes - see full --partial-fit-only)
+    status        registry and label counts
+    distill       train the local risk / bug severity / bug priority models
+                  from stored LLM judgments (app.distilled)
+    promote V     promote a saved version by hand
+    rollback      back to the previously promoted version
+
+Nightly job example:
+    python retrain.py incremental || python retrain.py full --partial-fit-only
+
+Usage:
+    cd backend
+    python retrain.py full --partial-fit-only
+    python retrain.py incremental --chunk-size 10000
+    python retrain.py full --force            # promote even without enough holdout labels
+    python retrain.py status
+    python retrain.py distill --task bug_severity
+"""
+
+import argparse
+import asyncio
+import copy
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.db import engine
+from app.distilled import TASKS as DISTILL_TASKS, collect_task_rows, train_task
+from app.model_registry import current_version, load_registry, load_version, promote, rollback, save_version
+from app.training_data import collect_labels, stream_labeled_texts
+
+
+async def _load_rows(labels, holdout, chunk_size, limit=None):
+    rows = []
+    async for chunk in stream_labeled_texts(engine, labels, chunk_size=chunk_size, holdout=holdout):
+        rows.extend(chunk)
+        if limit and len(rows) >= limit:
+            return rows[:limit]
+    return rows
+
+
+def _accuracy(clf, vectorizer, label_encoder, holdout):
+    known = set(label_encoder.classes_)
+    rows = [r for r in holdout if r.label in known]
+    if not rows:
+        return None
+    X = vectorizer.transform([r.text for r in rows])
+    y = label_encoder.transform([r.label for r in rows])
+    return float((clf.predict(X) == y).mean())
+
+
+def _gate(args, candidate, holdout):
+    """(promote?, metrics) for a candidate (clf, vectorizer, label_encoder)."""
+    metrics = {"holdout_size": len(holdout)}
+    metrics["holdout_accuracy"] = _accuracy(*candidate, holdout) if holdout else None
+
+    current = current_version()
+    if current is not None and holdout:
+        try:
+            metrics["current_holdout_accuracy"] = _accuracy(*load_version(current), holdout)
+        except FileNotFoundError:
+            metrics["current_holdout_accuracy"] = None
+    print(f"[RETRAIN] holdout: {metrics}")
+
+    if len(holdout) < args.min_holdout:
+        if args.force:
+            print(f"[RETRAIN] only {len(holdout)} holdout labels (< {args.min_holdout}); promoting because of --force")
+            return True, metrics
+        print(f"[RETRAIN] only {len(holdout)} holdout labels (< {args.min_holdout}); not promoting (use --force)")
+        return False, metrics
+
+    new_acc, cur_acc = metrics["holdout_accuracy"], metrics.get("current_holdout_accuracy")
+    if cur_acc is None or (new_acc is not None and new_acc >= cur_acc - args.tolerance):
+        return True, metrics
+    print(f"[RETRAIN] candidate {new_acc:.4f} is worse than the promoted model {cur_acc:.4f}; not promoting")
+    return args.force, metrics
+
+
+async def run_full(args) -> int:
+    from train_model import RequirementsMLModel, candidate_models
+
+    started = time.perf_counter()
+    labels, watermark = await collect_labels(engine, chunk_size=args.chunk_size)
+    train_rows = await _load_rows(labels, False, args.chunk_size)
+    holdout = await _load_rows(labels, True, args.chunk_size, limit=args.max_holdout)
+    print(f"[RETRAIN] {len(labels)} DB labels: {len(train_rows)} train, {len(holdout)} holdout")
+
+    model = RequirementsMLModel(data_path=args.data)
+    model.load_data()
+    model.preprocess_data()
+    db_df = pd.DataFrame({
+        "combined_text": [r.text for r in train_rows],
+        "req_category": [r.label for r in train_rows],
+    })
+    model.df = pd.concat([model.df[["combined_text", "req_category"]], db_df], ignore_index=True)
+
+    candidates = candidate_models(include_slow=args.include_slow)
+    if args.partial_fit_only:
+        candidates = {name: m for name, m in candidates.items() if hasattr(m, "partial_fit")}
+    model.train_category_classifier(folds=args.folds, n_jobs=args.n_jobs, candidates=candidates)
+
+    ok, metrics = _gate(args, (model.category_model, model.vectorizer, model.label_encoder), holdout)
+    metrics.update({k: v for k, v in (model.training_report or {}).items() if k in ("best_model", "cv_seconds")})
+    version = save_version(
+        model.category_model, model.vectorizer, model.label_encoder,
+        kind="full", parent=current_version(), metrics=metrics, n_samples=len(model.df), watermark=watermark,
+    )
+    print(f"[RETRAIN] saved {version} in {time.perf_counter() - started:.1f}s")
+    if ok and not args.no_promote:
+        promote(version)
+    return 0
+
+
+async def run_incremental(args) -> int:
+    started = time.perf_counter()
+    current = current_version()
+    if current is None:
+        print("[RETRAIN] no promoted model in models/registry.json; run `python retrain.py full` first")
+        return 2
+    entry = load_registry()["versions"][current]
+    clf, vectorizer, label_encoder = load_version(current)
+    if not hasattr(clf, "partial_fit"):
+        print(f"[RETRAIN] {type(clf).__name__} has no partial_fit; run `python retrain.py full --partial-fit-only`")
+        return 2
+    if not entry.get("watermark"):
+        print(f"[RETRAIN] {current} has no label watermark (not trained from the DB); run a full retrain")
+        return 2
+
+    new_labels, watermark = await collect_labels(engine, since=entry["watermark"], chunk_size=args.chunk_size)
+    if not new_labels:
+        print(f"[RETRAIN] no new labels since {current}")
+        return 0
+
+    candidate = copy.deepcopy(clf)
+    classes = np.arange(len(label_encoder.classes_))
+    known = set(label_encoder.classes_)
+    seen = skipped = 0
+    async for chunk in stream_labeled_texts(engine, new_labels, chunk_size=args.chunk_size, holdout=False):
+        rows = [r for r in chunk if r.label in known]
+        skipped += len(chunk) - len(rows)
+        if not rows:
+            continue
+        # Same vocabulary as the promoted model: new terms wait for the next full retrain
+        X = vectorizer.transform([r.text for r in rows])
+        y = label_encoder.transform([r.label for r in rows])
+        for _ in range(args.epochs):
+            candidate.partial_fit(X, y, classes=classes)
+        seen += len(rows)
+    print(f"[RETRAIN] partial_fit on {seen} new labels ({skipped} with unknown classes skipped)")
+    if not seen:
+        return 0
+
+    # The holdout is always the full one, so versions stay comparable
+    all_labels, _ = await collect_labels(engine, chunk_size=args.chunk_size)
+    holdout = await _load_rows(all_labels, True, args.chunk_size, limit=args.max_holdout)
+    ok, metrics = _gate(args, (candidate, vectorizer, label_encoder), holdout)
+    metrics["new_labels"] = seen
+    version = save_version(
+        candidate, vectorizer, label_encoder, kind="incremental", parent=current, metrics=metrics,
+        n_samples=(entry.get("n_samples") or 0) + seen, watermark=watermark,
+    )
+    print(f"[RETRAIN] saved {version} in {time.perf_counter() - started:.1f}s")
+    if ok and not args.no_promote:
+        promote(version)
+    return 0
+
+
+async def run_status(args) -> int:
+    registry = load_registry()
+    print(f"current:  {registry.get('current')}")
+    print(f"previous: {registry.get('previous')}")
+    for version, entry in sorted(registry["versions"].items())[-10:]:
+        acc = entry.get("metrics", {}).get("holdout_accuracy")
+        print(f"  {version}  {entry['kind']:<12} {entry['model']:<24} n={entry.get('n_samples')}  "
+              f"holdout_acc={acc}  promoted={entry.get('promoted_at')}")
+    labels, _ = await collect_labels(engine, chunk_size=args.chunk_size)
+    sources = pd.Series([source for _, source in labels.values()], dtype=object).value_counts().to_dict()
+    print(f"DB labels: {len(labels)} {sources}")
+    return 0
+
+
+async def run_distill(args) -> int:
+    failed = 0
+    for task in DISTILL_TASKS if args.task == "all" else (args.task,):
+        started = time.perf_counter()
+        rows = await collect_task_rows(engine, task, chunk_size=args.chunk_size)
+        print(f"[RETRAIN] {task}: {len(rows)} labeled texts")
+        try:
+            train_task(task, rows)
+        except ValueError as e:
+            print(f"[RETRAIN] {task} not trained: {e}")
+            failed += 1
+            continue
+        print(f"[RETRAIN] {task} exported in {time.perf_counter() - started:.1f}s")
+    return 2 if failed else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("full", "incremental", "status", "promote", "rollback", "distill"))
+    parser.add_argument("version", nargs="?", help="for promote")
+    parser.add_argument("--data", default="data/requirements.csv", help="seed data for full retrains")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows per DB round trip")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--include-slow", action="store_true")
+    parser.add_argument("--partial-fit-only", action="store_true",
+                        help="full: only consider models that support incremental updates")
+    parser.add_argument("--epochs", type=int, default=1, help="incremental: passes over the new labels")
+    parser.add_argument("--min-holdout", type=int, default=50, help="holdout labels needed to compare models")
+    parser.add_argument("--max-holdout", type=int, default=20000)
+    parser.add_argument("--tolerance", type=float, default=0.01, help="allowed holdout accuracy drop")
+    parser.add_argument("--force", action="store_true", help="promote even if the gate fails")
+    parser.add_argument("--no-promote", action="store_true", help="only save the new version")
+    parser.add_argument("--task", choices=("all",) + DISTILL_TASKS, default="all", help="distill: which model")
+    args = parser.parse_args()
+
+    if args.command in ("promote", "rollback"):
+        if args.command == "promote" and not args.version:
+            parser.error("promote needs a version (see `python retrain.py status`)")
+        try:
+            if args.command == "promote":
+                promote(args.version)
+            else:
+                print(f"[RETRAIN] rolled back to {rollback()}")
+        except (KeyError, ValueError, FileNotFoundError) as e:
+            print(f"[RETRAIN] {e}")
+            sys.exit(2)
+        sys.exit(0)
+
+    runner = {"full": run_full, "incremental": run_incremental, "status": run_status, "distill": run_distill}[args.command]
+
+    async def run() -> int:
+        try:
+            return await runner(args)
+        finally:
+            await engine.dispose()
+
+    sys.exit(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    main()
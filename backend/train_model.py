@@ -1,19 +1,88 @@
 """
 Machine Learning Model for Requirements and Test Cases Analysis
 Trains models to classify requirements and predict test case relationships
+
+Model selection: every candidate model is scored with stratified k-fold
+cross-validation, all (model, fold) fits in parallel. The TF-IDF vectorizer
+is fit per fold on that fold's training rows only (vocabulary, min_df/max_df
+pruning and IDF never see the held-out rows), and the fold matrices are
+computed once for all candidates and cached under models/cache by data +
+vectorizer settings + folds. The winner is refit on all data with a vectorizer
+fit on all data; the timing / accuracy table is written to
+models/training_report_latest.json.
+
+Usage:
+    python train_model.py
+    python train_model.py --folds 10 --n-jobs 4
+    python train_model.py --include-slow      # also Gradient Boosting (slow on sparse TF-IDF)
+    python train_model.py --no-cache          # re-vectorize even if the data did not change
 """
 
+import argparse
+import hashlib
+import json
+import time
+
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.model_selection import StratifiedKFold
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.naive_bayes import MultinomialNB
-from sklearn.metrics import classification_report, accuracy_score, confusion_matrix
+from sklearn.svm import LinearSVC
+from sklearn.metrics import accuracy_score, f1_score, confusion_matrix
 from sklearn.preprocessing import LabelEncoder
 import joblib
 import os
-from datetime import datetime
+
+from app.model_registry import current_version, promote, save_version
+
+
+VECTORIZER_PARAMS = {
+    'max_features': 1000,
+    'ngram_range': (1, 3),
+    'min_df': 2,
+    'max_df': 0.95,
+    'stop_words': 'english',
+}
+
+
+def candidate_models(include_slow=False):
+    """Models compared by cross-validation; all give predict_proba for the API confidence"""
+    models = {
+        'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42, max_depth=10),
+        'Naive Bayes': MultinomialNB(),
+        'Logistic Regression': LogisticRegression(C=10.0, max_iter=1000),
+        'SGD (log loss)': SGDClassifier(loss='log_loss', alpha=1e-4, max_iter=50, random_state=42),
+        'Linear SVC (calibrated)': CalibratedClassifierCV(LinearSVC(C=1.0), method='sigmoid', cv=3),
+    }
+    if include_slow:
+        models['Gradient Boosting'] = GradientBoostingClassifier(n_estimators=100, random_state=42)
+    return models
+
+
+def _fit_and_score(name, model, X_train, y_train, X_test, y_test):
+    """One (model, fold) job for joblib.Parallel"""
+    model = clone(model)
+    started = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    y_pred = model.predict(X_test)
+    predict_seconds = time.perf_counter() - started
+    return {
+        'model': name,
+        'accuracy': accuracy_score(y_test, y_pred),
+        'f1_macro': f1_score(y_test, y_pred, average='macro', zero_division=0),
+        'fit_seconds': fit_seconds,
+        'predict_seconds': predict_seconds,
+        'n_test': len(y_test),
+    }
 
 
 class RequirementsMLModel:
@@ -25,7 +94,9 @@ class RequirementsMLModel:
         self.vectorizer = None
         self.category_model = None
         self.label_encoder = None
+        self.training_report = None
         self.models_dir = 'models'
+        self.cache_dir = os.path.join(self.models_dir, 'cache')
         
         # Create models directory if it doesn't exist
         if not os.path.exists(self.models_dir):
@@ -62,86 +133,138 @@ class RequirementsMLModel:
         
         return self.df
     
-    def train_category_classifier(self):
-        """Train a model to classify requirement categories"""
+    def _cache_path(self, prefix, *extra):
+        """models/cache/<prefix>_<hash of data + vectorizer settings + extra>.joblib"""
+        key = hashlib.sha256()
+        key.update(repr(sorted(VECTORIZER_PARAMS.items())).encode('utf-8'))
+        key.update(repr(extra).encode('utf-8'))
+        for text in self.df['combined_text']:
+            key.update(text.encode('utf-8'))
+            key.update(b'\x00')
+        return os.path.join(self.cache_dir, f'{prefix}_{key.hexdigest()[:16]}.joblib')
+
+    def vectorize(self, use_cache=True):
+        """Fit the TF-IDF vectorizer on all rows (final refit) and cache (vectorizer, X)"""
+        texts = self.df['combined_text']
+        cache_path = self._cache_path('features')
+
+        if use_cache and os.path.exists(cache_path):
+            self.vectorizer, X = joblib.load(cache_path)
+            print(f"Loaded cached features from: {cache_path}")
+            return X
+
+        started = time.perf_counter()
+        self.vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS)
+        X = self.vectorizer.fit_transform(texts)
+        print(f"Vectorized {X.shape[0]} texts in {time.perf_counter() - started:.2f}s")
+        if use_cache:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            joblib.dump((self.vectorizer, X), cache_path)
+        return X
+
+    def fold_features(self, splits, use_cache=True):
+        """
+        (X_train, X_test) per CV fold, each from a vectorizer fit on the fold's
+        training rows only, so held-out rows never shape the features they are scored on
+        """
+        texts = self.df['combined_text'].to_numpy()
+        fold_key = [(train_idx.tolist(), test_idx.tolist()) for train_idx, test_idx in splits]
+        cache_path = self._cache_path('folds', hashlib.sha256(repr(fold_key).encode('utf-8')).hexdigest())
+
+        if use_cache and os.path.exists(cache_path):
+            print(f"Loaded cached fold features from: {cache_path}")
+            return joblib.load(cache_path)
+
+        started = time.perf_counter()
+        features = []
+        for train_idx, test_idx in splits:
+            vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS)
+            features.append((vectorizer.fit_transform(texts[train_idx]), vectorizer.transform(texts[test_idx])))
+        print(f"Vectorized {len(splits)} folds in {time.perf_counter() - started:.2f}s")
+        if use_cache:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            joblib.dump(features, cache_path)
+        return features
+
+    def train_category_classifier(self, folds=5, n_jobs=-1, include_slow=False, use_cache=True, candidates=None):
+        """Select the category classifier with stratified k-fold CV, candidates x folds in parallel"""
         print("\n" + "="*60)
         print("Training Requirement Category Classifier")
         print("="*60)
-        
-        # Prepare features and labels
-        X = self.df['combined_text']
-        y = self.df['req_category']
-        
+
         # Encode labels
         self.label_encoder = LabelEncoder()
-        y_encoded = self.label_encoder.fit_transform(y)
-        
+        y = self.label_encoder.fit_transform(self.df['req_category'])
         print(f"\nClasses: {self.label_encoder.classes_}")
-        
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded
-        )
-        
-        print(f"Training set size: {len(X_train)}")
-        print(f"Test set size: {len(X_test)}")
-        
-        # Vectorize text
-        self.vectorizer = TfidfVectorizer(
-            max_features=1000,
-            ngram_range=(1, 3),
-            min_df=2,
-            max_df=0.95,
-            stop_words='english'
+
+        # Every fold needs each class at least once
+        n_splits = max(2, min(folds, int(np.bincount(y).min())))
+        skf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
+        splits = list(skf.split(np.zeros(len(y)), y))
+
+        # Vectorize per fold (once; every candidate reuses the fold matrices)
+        fold_features = self.fold_features(splits, use_cache=use_cache)
+        models = candidates or candidate_models(include_slow=include_slow)
+        print(f"\nEvaluating {len(models)} models x {n_splits} folds (n_jobs={n_jobs})")
+
+        started = time.perf_counter()
+        fold_results = Parallel(n_jobs=n_jobs)(
+            delayed(_fit_and_score)(name, model, X_train, y[train_idx], X_test, y[test_idx])
+            for name, model in models.items()
+            for (train_idx, test_idx), (X_train, X_test) in zip(splits, fold_features)
         )
-        
-        X_train_vectorized = self.vectorizer.fit_transform(X_train)
-        X_test_vectorized = self.vectorizer.transform(X_test)
-        
-        print(f"\nFeature matrix shape: {X_train_vectorized.shape}")
-        
-        # Train multiple models and compare
-        models = {
-            'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42, max_depth=10),
-            'Gradient Boosting': GradientBoostingClassifier(n_estimators=100, random_state=42),
-            'Naive Bayes': MultinomialNB()
-        }
-        
-        best_model = None
-        best_score = 0
-        best_name = ""
-        
-        for name, model in models.items():
-            print(f"\n--- Training {name} ---")
-            model.fit(X_train_vectorized, y_train)
-            
-            # Predictions
-            y_pred = model.predict(X_test_vectorized)
-            
-            # Evaluation
-            accuracy = accuracy_score(y_test, y_pred)
-            print(f"Accuracy: {accuracy:.4f}")
-            
-            print("\nClassification Report:")
-            print(classification_report(
-                y_test, y_pred,
-                target_names=self.label_encoder.classes_,
-                zero_division=0
-            ))
-            
-            if accuracy > best_score:
-                best_score = accuracy
-                best_model = model
-                best_name = name
-        
+        cv_seconds = time.perf_counter() - started
+
+        rows = []
+        for name in models:
+            res = [r for r in fold_results if r['model'] == name]
+            acc = np.array([r['accuracy'] for r in res])
+            rows.append({
+                'model': name,
+                'accuracy_mean': float(acc.mean()),
+                'accuracy_std': float(acc.std()),
+                'f1_macro_mean': float(np.mean([r['f1_macro'] for r in res])),
+                'fit_seconds_mean': float(np.mean([r['fit_seconds'] for r in res])),
+                'predict_ms_per_row': float(np.sum([r['predict_seconds'] for r in res])
+                                            / np.sum([r['n_test'] for r in res]) * 1000),
+            })
+        # Best accuracy; ties go to the better macro F1, then the faster fit
+        rows.sort(key=lambda r: (-r['accuracy_mean'], -r['f1_macro_mean'], r['fit_seconds_mean']))
+
+        print(f"\n{'model':<26} {'accuracy':>16} {'f1 macro':>9} {'fit s':>8} {'ms/row':>8}")
+        for r in rows:
+            print(f"{r['model']:<26} {r['accuracy_mean']:>8.4f} +- {r['accuracy_std']:.4f} "
+                  f"{r['f1_macro_mean']:>9.4f} {r['fit_seconds_mean']:>8.3f} {r['predict_ms_per_row']:>8.3f}")
+
+        # Final model: vectorizer and classifier fit on all rows
+        X = self.vectorize(use_cache=use_cache)
+        print(f"Feature matrix shape: {X.shape}")
+        best_name = rows[0]['model']
+        started = time.perf_counter()
+        best_model = clone(models[best_name]).fit(X, y)
+        refit_seconds = time.perf_counter() - started
+
         print(f"\n{'='*60}")
-        print(f"Best Model: {best_name} with accuracy: {best_score:.4f}")
+        print(f"Best Model: {best_name} with CV accuracy: {rows[0]['accuracy_mean']:.4f} "
+              f"(cross-validation {cv_seconds:.1f}s, refit {refit_seconds:.2f}s)")
         print(f"{'='*60}")
-        
+
         self.category_model = best_model
-        
+        self.training_report = {
+            'data_path': self.data_path,
+            'n_samples': int(X.shape[0]),
+            'n_features': int(X.shape[1]),
+            'classes': [str(c) for c in self.label_encoder.classes_],
+            'folds': n_splits,
+            'n_jobs': n_jobs,
+            'cv_seconds': round(cv_seconds, 3),
+            'refit_seconds': round(refit_seconds, 3),
+            'best_model': best_name,
+            'models': rows,
+        }
+
         return best_model, self.vectorizer
-    
+
     def train_requirement_analyzer(self):
         """Train additional analysis models"""
         print("\n" + "="*60)
@@ -167,34 +290,35 @@ class RequirementsMLModel:
         
         return self.df
     
-    def save_models(self):
-        """Save trained models and preprocessors"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
+    def save_models(self, kind='train_model', promote_model=True):
+        """Save trained models as a new registry version and (by default) promote it"""
         print("\nSaving models...")
-        
-        # Save category classifier
-        model_path = os.path.join(self.models_dir, f'category_classifier_{timestamp}.joblib')
-        joblib.dump(self.category_model, model_path)
-        print(f"Saved category classifier to: {model_path}")
-        
-        # Save vectorizer
-        vectorizer_path = os.path.join(self.models_dir, f'vectorizer_{timestamp}.joblib')
-        joblib.dump(self.vectorizer, vectorizer_path)
-        print(f"Saved vectorizer to: {vectorizer_path}")
-        
-        # Save label encoder
-        encoder_path = os.path.join(self.models_dir, f'label_encoder_{timestamp}.joblib')
-        joblib.dump(self.label_encoder, encoder_path)
-        print(f"Saved label encoder to: {encoder_path}")
-        
-        # Save latest versions (without timestamp)
-        joblib.dump(self.category_model, os.path.join(self.models_dir, 'category_classifier_latest.joblib'))
-        joblib.dump(self.vectorizer, os.path.join(self.models_dir, 'vectorizer_latest.joblib'))
-        joblib.dump(self.label_encoder, os.path.join(self.models_dir, 'label_encoder_latest.joblib'))
-        print("\nSaved latest versions")
-        
-        return True
+
+        metrics = {}
+        if self.training_report is not None:
+            best = self.training_report['models'][0]
+            metrics = {'cv_accuracy': best['accuracy_mean'], 'cv_f1_macro': best['f1_macro_mean']}
+        version = save_version(
+            self.category_model, self.vectorizer, self.label_encoder,
+            kind=kind, parent=current_version(), metrics=metrics,
+            n_samples=len(self.df) if self.df is not None else None,
+        )
+        for prefix in ('category_classifier', 'vectorizer', 'label_encoder'):
+            print(f"Saved {prefix.replace('_', ' ')} to: {os.path.join(self.models_dir, f'{prefix}_{version}.joblib')}")
+
+        if self.training_report is not None:
+            report = {**self.training_report, 'timestamp': version}
+            for name in (f'training_report_{version}.json', 'training_report_latest.json'):
+                with open(os.path.join(self.models_dir, name), 'w', encoding='utf-8') as f:
+                    json.dump(report, f, indent=2)
+            print(f"Saved training report to: {os.path.join(self.models_dir, 'training_report_latest.json')}")
+
+        # Promotion writes the *_latest files and the memory-mapped flat export the API loads
+        if promote_model:
+            promote(version)
+            print("\nSaved latest versions")
+
+        return version
     
     def predict_category(self, requirement_text):
         """Predict category for a new requirement"""
@@ -241,7 +365,7 @@ class RequirementsMLModel:
             for i, idx in enumerate(indices, 1):
                 print(f"{i}. {feature_names[idx]}: {importances[idx]:.4f}")
     
-    def train_all(self):
+    def train_all(self, folds=5, n_jobs=-1, include_slow=False, use_cache=True):
         """Complete training pipeline"""
         print("="*60)
         print("Requirements ML Model Training Pipeline")
@@ -254,7 +378,7 @@ class RequirementsMLModel:
         self.preprocess_data()
         
         # Train category classifier
-        self.train_category_classifier()
+        self.train_category_classifier(folds=folds, n_jobs=n_jobs, include_slow=include_slow, use_cache=use_cache)
         
         # Train complexity analyzer
         self.train_requirement_analyzer()
@@ -272,11 +396,20 @@ class RequirementsMLModel:
 
 def main():
     """Main training function"""
+    parser = argparse.ArgumentParser(description="Train the requirement category classifier")
+    parser.add_argument('--data', default='data/requirements.csv')
+    parser.add_argument('--folds', type=int, default=5, help="stratified k-fold splits")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="parallel (model, fold) fits; -1 = all cores")
+    parser.add_argument('--include-slow', action='store_true', help="also evaluate Gradient Boosting")
+    parser.add_argument('--no-cache', action='store_true', help="do not reuse the cached feature matrix")
+    args = parser.parse_args()
+
     # Initialize model
-    model = RequirementsMLModel(data_path='data/requirements.csv')
+    model = RequirementsMLModel(data_path=args.data)
     
     # Train all models
-    model.train_all()
+    model.train_all(folds=args.folds, n_jobs=args.n_jobs, include_slow=args.include_slow,
+                    use_cache=not args.no_cache)
     
     # Test prediction with sample
     print("\n" + "="*60)